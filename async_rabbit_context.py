@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+from pika.spec import PERSISTENT_DELIVERY_MODE
+
+from exceptions import RabbitConnectionClosedError
+
+
+class AsyncRabbitContext:
+    WRITE_BUFFER_HIGH_WATER_MARK = 4 * 1024 * 1024
+    WRITE_BUFFER_POLL_INTERVAL = 0.001
+
+    def __init__(self, channels=1, **kwargs):
+        self._host = kwargs.get('host') or os.getenv('RABBITMQ_SERVICE_HOST', 'localhost')
+        self._port = kwargs.get('port') or os.getenv('RABBITMQ_SERVICE_PORT', '6672')
+        self._vhost = kwargs.get('vhost') or os.getenv('RABBITMQ_VHOST', '/')
+        self._exchange = kwargs.get('exchange') or os.getenv('RABBITMQ_EXCHANGE', '')
+        self._user = kwargs.get('user') or os.getenv('RABBITMQ_USER', 'guest')
+        self._password = kwargs.get('password') or os.getenv('RABBITMQ_PASSWORD', 'guest')
+        self.queue_name = kwargs.get('queue_name') or os.getenv('RABBITMQ_QUEUE', 'case.sample.inbound')
+        self.channel_count = channels
+        self.published_count = 0
+        self._channels = []
+
+    async def __aenter__(self):
+        await self.open_connection()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close_connection()
+
+    async def open_connection(self):
+        loop = asyncio.get_event_loop()
+        connection_opened = loop.create_future()
+        self._connection_closed = loop.create_future()
+        self._connection = AsyncioConnection(
+            pika.ConnectionParameters(self._host,
+                                      self._port,
+                                      self._vhost,
+                                      pika.PlainCredentials(self._user, self._password)),
+            on_open_callback=connection_opened.set_result,
+            on_open_error_callback=lambda _connection, error: connection_opened.set_exception(
+                RabbitConnectionClosedError(error)),
+            on_close_callback=lambda _connection, reason: self._connection_closed.set_result(reason),
+            custom_ioloop=loop)
+        await connection_opened
+        self._transport = _connection_transport(self._connection)
+
+        self._channels = [await self._open_channel() for _ in range(self.channel_count)]
+
+        if self.queue_name == 'localtest':
+            queue_declared = loop.create_future()
+            self._channels[0].queue_declare(queue=self.queue_name, callback=queue_declared.set_result)
+            await queue_declared
+
+        return self._connection
+
+    async def close_connection(self):
+        if self._connection.is_open:
+            self._connection.close()
+        if not self._connection_closed.done():
+            await self._connection_closed
+
+    async def _open_channel(self):
+        channel_opened = asyncio.get_event_loop().create_future()
+        self._connection.channel(on_open_callback=channel_opened.set_result)
+        return await channel_opened
+
+    async def publish_message(self, message: str, content_type: str, channel_index=0):
+        if not self._connection.is_open:
+            raise RabbitConnectionClosedError
+        self._channels[channel_index % self.channel_count].basic_publish(
+            exchange=self._exchange,
+            routing_key=self.queue_name,
+            body=message,
+            properties=pika.BasicProperties(content_type=content_type, delivery_mode=PERSISTENT_DELIVERY_MODE))
+        self.published_count += 1
+        await self._wait_for_write_buffer()
+
+    async def _wait_for_write_buffer(self):
+        # basic_publish only buffers the message, so yield to the event loop to let the socket write it out and
+        # hold back further publishing while the buffer is above the high water mark
+        await asyncio.sleep(0)
+        while self._transport.get_write_buffer_size() > self.WRITE_BUFFER_HIGH_WATER_MARK:
+            await asyncio.sleep(self.WRITE_BUFFER_POLL_INTERVAL)
+
+
+def _connection_transport(connection):
+    # pika's transports have a public get_write_buffer_size, but pika has no public way to get the transport of a
+    # connection, this is the only pika internal relied on
+    transport = getattr(connection, '_transport', None)
+    if transport is None or not hasattr(transport, 'get_write_buffer_size'):
+        raise RuntimeError(f'Publishing with the asyncio engine needs the write buffer of the connection\'s transport, '
+                           f'which pika {pika.__version__} does not expose')
+    return transport
@@ -0,0 +1,79 @@
+import argparse
+import csv
+import tempfile
+import time
+from pathlib import Path
+
+from case_message_encoder import CaseMessageEncoder, create_case_json
+from generate_sample_file import SampleGenerator
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Compare case message encoding rates of the compiled encoder and '
+                                                 'the csv.DictReader and json.dumps path.')
+    parser.add_argument('--sample_file_path', '-f', help='sample file to benchmark with, generated when not given',
+                        required=False)
+    parser.add_argument('--rows', '-r', help='number of rows in the generated sample file', type=int,
+                        default=1000000)
+    parser.add_argument('--treatment_code_quantities_path', '-t',
+                        help='treatment code quantities csv to scale the generated sample file from',
+                        default='treatment_code_quantities.csv', required=False)
+    return parser.parse_args()
+
+
+def encode_with_dict_reader(sample_file_path):
+    with open(sample_file_path) as sample_file:
+        for sample_row in csv.DictReader(sample_file, delimiter=','):
+            create_case_json(sample_row, 'test_ce_uuid', 'test_ap_uuid').encode()
+
+
+def encode_with_case_message_encoder(sample_file_path):
+    with open(sample_file_path) as sample_file:
+        sample_file_reader = csv.reader(sample_file, delimiter=',')
+        case_message_encoder = CaseMessageEncoder(next(sample_file_reader), 'test_ce_uuid', 'test_ap_uuid')
+        for sample_row in filter(None, sample_file_reader):
+            case_message_encoder.encode(sample_row)
+
+
+def generate_sample_file(output_directory: Path, rows, treatment_code_quantities_path):
+    treatment_code_quantities = SampleGenerator.read_treatment_code_quantities(treatment_code_quantities_path)
+    total_quantity = sum(treatment_code['quantity'] for treatment_code in treatment_code_quantities)
+
+    scaled_quantities_path = output_directory.joinpath('treatment_code_quantities.csv')
+    with open(scaled_quantities_path, 'w', newline='') as scaled_quantities_file:
+        writer = csv.writer(scaled_quantities_file)
+        writer.writerow(('Treatment Code', 'Quantity', 'Address Level'))
+        for treatment_code in treatment_code_quantities:
+            writer.writerow((treatment_code['treatment_code'],
+                             round(treatment_code['quantity'] * rows / total_quantity),
+                             treatment_code['address_level']))
+
+    sample_file_path = output_directory.joinpath('sample_file.csv')
+    SampleGenerator().generate_sample_file(sample_file_path, scaled_quantities_path, sequential_uprn=True)
+    return sample_file_path
+
+
+def benchmark(name, encode, sample_file_path, row_count):
+    start = time.perf_counter()
+    encode(sample_file_path)
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {row_count} rows in {elapsed:.2f}s, {row_count / elapsed:.0f} rows/sec')
+    return elapsed
+
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        sample_file_path = args.sample_file_path or generate_sample_file(Path(temporary_directory), args.rows,
+                                                                         args.treatment_code_quantities_path)
+        with open(sample_file_path) as sample_file:
+            row_count = sum(1 for _ in csv.reader(sample_file)) - 1
+
+        dict_reader_time = benchmark('csv.DictReader and json.dumps', encode_with_dict_reader, sample_file_path,
+                                     row_count)
+        encoder_time = benchmark('CaseMessageEncoder', encode_with_case_message_encoder, sample_file_path, row_count)
+        print(f'CaseMessageEncoder speed up: {dict_reader_time / encoder_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
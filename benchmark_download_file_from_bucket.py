@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmark_load_sample import current_commit
+from download_file_from_bucket import download_blob
+from tests.support.fake_gcs import FakeGcsServer
+
+MB = 1024 * 1024
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark downloading a sample file from a stand-in GCS server.')
+    parser.add_argument('--size-mb', help='size of the object to download in MB', type=int, default=256)
+    parser.add_argument('--workers', help='numbers of parallel chunk downloads to benchmark', type=int, nargs='+',
+                        default=[1, 4, 8, 16])
+    parser.add_argument('--chunk-size-mb', help='size of each downloaded chunk in MB', type=int, default=8)
+    parser.add_argument('--stream-bandwidth-mb', help='throughput limit of each download stream in MB/sec, standing '
+                                                      'in for the per-stream limit of real GCS',
+                        type=int, default=50)
+    parser.add_argument('--output_file_path', '-o', help='path to write the JSON benchmark results to',
+                        default='benchmark_download_file_from_bucket.json', required=False)
+    return parser.parse_args()
+
+
+def download_single_stream(client, blob, destination_path):
+    with open(destination_path, 'wb') as destination_file:
+        client.download_blob_to_file(blob, destination_file)
+
+
+def run_timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def benchmark_result(name, size, elapsed):
+    result = {'method': name, 'seconds': round(elapsed, 3), 'mb_per_sec': round(size / MB / elapsed, 1)}
+    print(f'{name}: {result["mb_per_sec"]} MB/sec')
+    return result
+
+
+def main():
+    args = parse_arguments()
+    results = {'commit': current_commit(), 'timestamp': datetime.utcnow().isoformat(), 'size_mb': args.size_mb,
+               'chunk_size_mb': args.chunk_size_mb, 'stream_bandwidth_mb': args.stream_bandwidth_mb, 'runs': []}
+
+    with tempfile.TemporaryDirectory() as temporary_directory, \
+            FakeGcsServer(stream_bytes_per_second=args.stream_bandwidth_mb * MB) as fake_gcs:
+        fake_gcs.add_blob('sample-bucket', 'sample_file.csv', os.urandom(args.size_mb * MB))
+        client = fake_gcs.client()
+        blob = client.bucket('sample-bucket').get_blob('sample_file.csv')
+        destination_path = Path(temporary_directory).joinpath('sample_file.csv')
+
+        elapsed = run_timed(download_single_stream, client, blob, destination_path)
+        results['runs'].append(benchmark_result('single stream', blob.size, elapsed))
+        for workers in args.workers:
+            destination_path.unlink()
+            elapsed = run_timed(download_blob, blob, destination_path, workers=workers,
+                                chunk_size=args.chunk_size_mb * MB)
+            results['runs'].append(benchmark_result(f'{workers} parallel chunks', blob.size, elapsed))
+
+    Path(args.output_file_path).write_text(json.dumps(results, indent=2))
+    print(f'Benchmark results written to {args.output_file_path}')
+
+
+if __name__ == '__main__':
+    main()
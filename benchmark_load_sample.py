@@ -0,0 +1,205 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmark_case_message_encoder import generate_sample_file
+from case_message_encoder import CaseMessageEncoder
+import load_sample
+from load_sample import load_sample_file
+from rabbit_context import RabbitContext
+from tests.support.fake_rabbit import FakeAmqpServer, InMemoryAsyncRabbitContext, InMemoryRabbitContext
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark loading generated sample files into a stand-in broker.')
+    parser.add_argument('--rows', '-r', help='sizes of the sample files to generate', type=int, nargs='+',
+                        default=[100000, 1000000])
+    parser.add_argument('--broker', '-b', help='in-memory publishes straight into memory, amqp publishes to a '
+                                               'loopback AMQP server through pika',
+                        choices=('in-memory', 'amqp'), default='in-memory')
+    parser.add_argument('--engine', help='publishing engine to load with', choices=('blocking', 'asyncio'),
+                        default='blocking')
+    parser.add_argument('--workers', help='number of processes to load with', type=int, default=1)
+    parser.add_argument('--confirm-window', help='publisher confirms window for the blocking engine', type=int,
+                        default=0)
+    parser.add_argument('--treatment_code_quantities_path', '-t',
+                        help='treatment code quantities csv to scale the generated sample files from',
+                        default='treatment_code_quantities.csv', required=False)
+    parser.add_argument('--output_file_path', '-o', help='path to write the JSON benchmark results to',
+                        default='benchmark_load_sample.json', required=False)
+    return parser.parse_args()
+
+
+def parse_sample_file(sample_file_path, **_kwargs):
+    with open(sample_file_path) as sample_file:
+        for _ in csv.reader(sample_file, delimiter=','):
+            pass
+
+
+def parse_and_encode_sample_file(sample_file_path, **_kwargs):
+    with open(sample_file_path) as sample_file:
+        sample_file_reader = csv.reader(sample_file, delimiter=',')
+        case_message_encoder = CaseMessageEncoder(next(sample_file_reader), 'test_ce_uuid', 'test_ap_uuid')
+        for sample_row in filter(None, sample_file_reader):
+            case_message_encoder.encode(sample_row)
+
+
+class TimedCaseMessageEncoder(CaseMessageEncoder):
+    # Adds up the time spent encoding across every encoder created in the process
+    seconds = 0.0
+
+    def encode(self, sample_row):
+        start = time.perf_counter()
+        message = super().encode(sample_row)
+        TimedCaseMessageEncoder.seconds += time.perf_counter() - start
+        return message
+
+
+class TimedRabbitContext:
+    # Wraps a rabbit context to add up the time spent publishing and waiting on the broker
+
+    def __init__(self, rabbit_context):
+        self._rabbit_context = rabbit_context
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._rabbit_context, name)
+
+    def __enter__(self):
+        self._rabbit_context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self._rabbit_context.__exit__(exc_type, exc_val, exc_tb)
+
+    def publish_message(self, message, content_type):
+        self._timed(self._rabbit_context.publish_message, message, content_type)
+
+    def wait_for_confirms(self):
+        self._timed(self._rabbit_context.wait_for_confirms)
+
+    def wait_for_flow_control(self):
+        self._timed(self._rabbit_context.wait_for_flow_control)
+
+    def _timed(self, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        self.seconds += time.perf_counter() - start
+
+
+def load_sample_file_to_broker(sample_file_path, broker, engine, workers, confirm_window, amqp_kwargs):
+    if broker == 'amqp':
+        broker_kwargs = amqp_kwargs
+    elif engine == 'asyncio':
+        broker_kwargs = {'rabbit_context': InMemoryAsyncRabbitContext()}
+    else:
+        broker_kwargs = {'rabbit_context': InMemoryRabbitContext()}
+    load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', workers=workers, engine=engine,
+                     confirm_window=confirm_window, **broker_kwargs)
+
+
+def load_sample_file_to_broker_timing_stages(sample_file_path, broker, confirm_window, amqp_kwargs):
+    # Times encoding and publishing within the one blocking load, the rest of the load time is reading and parsing
+    # the sample file. This runs in its own spawned process, so swapping the loader's encoder class affects nothing
+    # else
+    load_sample.CaseMessageEncoder = TimedCaseMessageEncoder
+    if broker == 'amqp':
+        rabbit_context = TimedRabbitContext(RabbitContext(confirm_window=confirm_window, **amqp_kwargs))
+    else:
+        rabbit_context = TimedRabbitContext(InMemoryRabbitContext())
+    start = time.perf_counter()
+    load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=rabbit_context)
+    load_time = time.perf_counter() - start
+    return {'parse': round(load_time - TimedCaseMessageEncoder.seconds - rabbit_context.seconds, 3),
+            'encode': round(TimedCaseMessageEncoder.seconds, 3),
+            'publish': round(rabbit_context.seconds, 3)}
+
+
+def run_timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    peak_rss_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return elapsed, peak_rss_kb, result
+
+
+def run_in_fresh_process(function, *args):
+    # Each stage runs in a newly spawned process so its peak RSS isn't inflated by earlier runs. It isn't a pool worker,
+    # as those are daemonic and can't start the loader's own pool of shard workers
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=send_timed_result, args=(sender, function, *args))
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    finally:
+        process.join()
+
+
+def send_timed_result(sender, function, *args):
+    sender.send(run_timed(function, *args))
+
+
+def benchmark_sample_file(sample_file_path, row_count, args, amqp_kwargs):
+    result = {'rows': row_count}
+    if args.engine == 'blocking' and args.workers == 1:
+        load_time, peak_rss_kb, stage_seconds = run_in_fresh_process(
+            load_sample_file_to_broker_timing_stages, sample_file_path, args.broker, args.confirm_window, amqp_kwargs)
+        result['stage_seconds'] = stage_seconds
+    else:
+        # The stages of a concurrent load overlap, so they can only be estimated from the differences between
+        # separate runs, which are noisy and can even come out negative
+        parse_time, _, _ = run_in_fresh_process(parse_sample_file, sample_file_path)
+        parse_and_encode_time, _, _ = run_in_fresh_process(parse_and_encode_sample_file, sample_file_path)
+        load_time, peak_rss_kb, _ = run_in_fresh_process(load_sample_file_to_broker, sample_file_path, args.broker,
+                                                         args.engine, args.workers, args.confirm_window, amqp_kwargs)
+        result['estimated_stage_seconds'] = {'parse': round(parse_time, 3),
+                                             'encode': round(parse_and_encode_time - parse_time, 3),
+                                             'publish': round(load_time - parse_and_encode_time, 3)}
+
+    result.update({'seconds': round(load_time, 3), 'rows_per_sec': round(row_count / load_time),
+                   'peak_rss_kb': peak_rss_kb})
+    stages = result.get('stage_seconds') or f'estimated {result["estimated_stage_seconds"]}'
+    print(f'{row_count} rows: {result["rows_per_sec"]} rows/sec, stages {stages}, peak RSS {peak_rss_kb} KB')
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, check=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_arguments()
+    results = {'commit': current_commit(), 'timestamp': datetime.utcnow().isoformat(), 'broker': args.broker,
+               'engine': args.engine, 'workers': args.workers, 'confirm_window': args.confirm_window, 'runs': []}
+
+    with tempfile.TemporaryDirectory() as temporary_directory, FakeAmqpServer() as amqp_server:
+        for rows in args.rows:
+            sample_file_directory = Path(temporary_directory).joinpath(str(rows))
+            sample_file_directory.mkdir()
+            sample_file_path = generate_sample_file(sample_file_directory, rows, args.treatment_code_quantities_path)
+            with open(sample_file_path) as sample_file:
+                row_count = sum(1 for _ in csv.reader(sample_file)) - 1
+
+            results['runs'].append(benchmark_sample_file(sample_file_path, row_count, args,
+                                                         amqp_server.connection_kwargs()))
+
+    Path(args.output_file_path).write_text(json.dumps(results, indent=2))
+    print(f'Benchmark results written to {args.output_file_path}')
+
+
+if __name__ == '__main__':
+    main()
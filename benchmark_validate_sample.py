@@ -0,0 +1,81 @@
+import argparse
+import csv
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_case_message_encoder import generate_sample_file
+from validate_sample import SampleValidator, find_column_validation_failures
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Compare row validation rates of the compiled validation plan, the '
+                                                 'columnar engine and running the schema one validator at a time.')
+    parser.add_argument('--sample_file_path', '-f', help='sample file to benchmark with, generated when not given',
+                        required=False)
+    parser.add_argument('--rows', '-r', help='number of rows in the generated sample file', type=int,
+                        default=3000000)
+    parser.add_argument('--treatment_code_quantities_path', '-t',
+                        help='treatment code quantities csv to scale the generated sample file from',
+                        default='treatment_code_quantities.csv', required=False)
+    return parser.parse_args()
+
+
+def validate_with_schema(sample_file_path):
+    sample_validator = SampleValidator()
+    with open(sample_file_path) as sample_file:
+        for line_number, row in enumerate(csv.DictReader(sample_file, delimiter=','), 2):
+            for column, validators in sample_validator.schema.items():
+                find_column_validation_failures(line_number, row, column, validators)
+
+
+def validate_with_compiled_plan(sample_file_path):
+    sample_validator = SampleValidator()
+    with open(sample_file_path) as sample_file:
+        for line_number, row in enumerate(csv.DictReader(sample_file, delimiter=','), 2):
+            sample_validator.find_row_validation_failures(line_number, row)
+
+
+def validate_with_columnar_engine(sample_file_path):
+    sample_validator = SampleValidator()
+    with open(sample_file_path) as sample_file:
+        sample_file_reader = csv.reader(sample_file, delimiter=',')
+        sample_validator.find_sample_validation_failures_columnar(sample_file_reader, next(sample_file_reader))
+
+
+def parse_sample_file(sample_file_path):
+    with open(sample_file_path) as sample_file:
+        for _ in csv.DictReader(sample_file, delimiter=','):
+            pass
+
+
+def benchmark(name, validate, sample_file_path, row_count, parse_time=0):
+    start = time.perf_counter()
+    validate(sample_file_path)
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {row_count} rows in {elapsed:.2f}s, {row_count / elapsed:.0f} rows/sec'
+          + (f', {row_count / (elapsed - parse_time):.0f} rows/sec excluding parsing' if parse_time else ''))
+    return elapsed
+
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        sample_file_path = args.sample_file_path or generate_sample_file(Path(temporary_directory), args.rows,
+                                                                         args.treatment_code_quantities_path)
+        with open(sample_file_path) as sample_file:
+            row_count = sum(1 for _ in csv.reader(sample_file)) - 1
+
+        parse_time = benchmark('csv.DictReader parsing only', parse_sample_file, sample_file_path, row_count)
+        schema_time = benchmark('Schema one validator at a time', validate_with_schema, sample_file_path, row_count,
+                                parse_time)
+        compiled_time = benchmark('Compiled validation plan', validate_with_compiled_plan, sample_file_path,
+                                  row_count, parse_time)
+        columnar_time = benchmark('Columnar engine', validate_with_columnar_engine, sample_file_path, row_count)
+        print(f'Compiled validation plan speed up: {schema_time / compiled_time:.2f}x, '
+              f'{(schema_time - parse_time) / (compiled_time - parse_time):.2f}x excluding parsing')
+        print(f'Columnar engine speed up: {schema_time / columnar_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
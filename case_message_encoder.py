@@ -0,0 +1,51 @@
+import json
+from json.encoder import encode_basestring_ascii
+from operator import itemgetter
+from typing import Sequence
+
+CASE_MESSAGE_COLUMNS = (('uprn', 'UPRN'), ('estabUprn', 'ESTAB_UPRN'),
+                        ('addressType', 'ADDRESS_TYPE'), ('estabType', 'ESTAB_TYPE'),
+                        ('addressLevel', 'ADDRESS_LEVEL'), ('abpCode', 'ABP_CODE'),
+                        ('organisationName', 'ORGANISATION_NAME'),
+                        ('addressLine1', 'ADDRESS_LINE1'), ('addressLine2', 'ADDRESS_LINE2'),
+                        ('addressLine3', 'ADDRESS_LINE3'), ('townName', 'TOWN_NAME'),
+                        ('postcode', 'POSTCODE'), ('latitude', 'LATITUDE'),
+                        ('longitude', 'LONGITUDE'), ('oa', 'OA'),
+                        ('lsoa', 'LSOA'), ('msoa', 'MSOA'),
+                        ('lad', 'LAD'), ('region', 'REGION'),
+                        ('htcWillingness', 'HTC_WILLINGNESS'), ('htcDigital', 'HTC_DIGITAL'),
+                        ('fieldCoordinatorId', 'FIELDCOORDINATOR_ID'),
+                        ('fieldOfficerId', 'FIELDOFFICER_ID'),
+                        ('treatmentCode', 'TREATMENT_CODE'),
+                        ('ceExpectedCapacity', 'CE_EXPECTED_CAPACITY'),
+                        ('secureEstablishment', 'CE_SECURE'),
+                        ('printBatch', 'PRINT_BATCH'))
+
+
+class CaseMessageEncoder:
+
+    def __init__(self, header: Sequence[str], collection_exercise_id, action_plan_id):
+        # The message template is rendered once from the header, the same way json.dumps renders the case dict,
+        # so each row only has its variable values escaped and substituted into it
+        column_positions = {column: position for position, column in enumerate(header)}
+        self._get_case_values = itemgetter(*(column_positions[column] for _, column in CASE_MESSAGE_COLUMNS))
+        self._row_length = len(header)
+
+        variable_fields = ', '.join(f'{json.dumps(key)}: %s' for key, _ in CASE_MESSAGE_COLUMNS)
+        constant_fields = json.dumps({'collectionExerciseId': collection_exercise_id,
+                                      'actionPlanId': action_plan_id})[1:-1].replace('%', '%%')
+        self._template = f'{{{variable_fields}, {constant_fields}}}'
+
+    def encode(self, sample_row: Sequence[str]) -> bytes:
+        if len(sample_row) < self._row_length:
+            # Missing trailing values are encoded as null, matching how csv.DictReader pads short rows
+            padded_row = [*map(encode_basestring_ascii, sample_row), *['null'] * (self._row_length - len(sample_row))]
+            return (self._template % self._get_case_values(padded_row)).encode('ascii')
+        return (self._template % tuple(map(encode_basestring_ascii, self._get_case_values(sample_row)))).encode('ascii')
+
+
+def create_case_json(sample_row, collection_exercise_id, action_plan_id) -> str:
+    create_case = {key: sample_row[column] for key, column in CASE_MESSAGE_COLUMNS}
+    create_case['collectionExerciseId'] = collection_exercise_id
+    create_case['actionPlanId'] = action_plan_id
+    return json.dumps(create_case)
@@ -1,20 +1,22 @@
 import argparse
 import csv
 
+from compressed_file import open_sample_file
+
 
 def compare_files(old_file_path, new_file_path):
     old_file_by_uprn = {}
 
     problems_found = []
 
-    with open(old_file_path) as old_file:
+    with open_sample_file(old_file_path) as old_file:
 
         old_file_reader = csv.DictReader(old_file, delimiter=',')
 
         for count, sample_row in enumerate(old_file_reader, 1):
             old_file_by_uprn[f'{sample_row["UPRN"]}'] = sample_row
 
-    with open(new_file_path) as new_file:
+    with open_sample_file(new_file_path) as new_file:
 
         new_file_reader = csv.DictReader(new_file, delimiter=',')
 
@@ -0,0 +1,126 @@
+import gzip
+import io
+import queue
+import threading
+from pathlib import Path
+
+import zstandard
+
+from gcs_sample_file import is_gcs_uri, open_gcs_blob
+
+GZIP_SUFFIX = '.gz'
+ZSTD_SUFFIX = '.zst'
+COMPRESSION_SUFFIXES = {'gzip': GZIP_SUFFIX, 'zstd': ZSTD_SUFFIX}
+
+
+def is_compressed(file_path) -> bool:
+    return Path(file_path).suffix in COMPRESSION_SUFFIXES.values()
+
+
+def strip_compression_suffix(file_path) -> Path:
+    return Path(file_path).with_suffix('') if is_compressed(file_path) else Path(file_path)
+
+
+def open_sample_file(file_path, mode='r', encoding=None, newline=None):
+    # Opens a local or gs:// file as text, decompressing or compressing it when it has a .gz or .zst suffix
+    if mode not in ('r', 'w'):
+        raise ValueError(f'Sample files can only be opened for reading or writing, not "{mode}"')
+    if is_gcs_uri(file_path):
+        if mode != 'r':
+            raise ValueError('GCS sample files can only be opened for reading')
+        binary_file = open_gcs_blob(file_path)
+    elif is_compressed(file_path):
+        binary_file = open(file_path, f'{mode}b')
+    else:
+        return open(file_path, mode, encoding=encoding, newline=newline)
+
+    if is_compressed(file_path) and mode == 'r':
+        binary_file = io.BufferedReader(_BackgroundDecompressingReader(_open_decompressed(file_path, binary_file)),
+                                        _BackgroundDecompressingReader.CHUNK_SIZE)
+    elif is_compressed(file_path):
+        binary_file = _open_compressed(file_path, binary_file)
+    return io.TextIOWrapper(binary_file, encoding=encoding, newline=newline)
+
+
+def _open_decompressed(file_path, compressed_file):
+    if Path(file_path).suffix == GZIP_SUFFIX:
+        return _ClosingGzipFile(fileobj=compressed_file, mode='rb')
+    return zstandard.ZstdDecompressor().stream_reader(compressed_file, closefd=True)
+
+
+def _open_compressed(file_path, compressed_file):
+    if Path(file_path).suffix == GZIP_SUFFIX:
+        return _ClosingGzipFile(fileobj=compressed_file, mode='wb')
+    return zstandard.ZstdCompressor().stream_writer(compressed_file, closefd=True)
+
+
+class _ClosingGzipFile(gzip.GzipFile):
+    # GzipFile leaves a file object it was given open, this closes it along with the gzip stream
+
+    def close(self):
+        compressed_file = self.fileobj
+        try:
+            super().close()
+        finally:
+            if compressed_file is not None:
+                compressed_file.close()
+
+
+class _BackgroundDecompressingReader(io.RawIOBase):
+    # Decompresses on a background thread into a bounded queue of chunks so decompression overlaps CSV parsing,
+    # zlib and zstd both release the GIL while they decompress
+    CHUNK_SIZE = 1024 * 1024
+    QUEUE_SIZE = 8
+    PUT_TIMEOUT = 0.1
+
+    def __init__(self, decompressed_file):
+        super().__init__()
+        self._decompressed_file = decompressed_file
+        self._chunks = queue.Queue(self.QUEUE_SIZE)
+        self._closing = threading.Event()
+        self._chunk = memoryview(b'')
+        self._finished = False
+        self._thread = threading.Thread(target=self._decompress, daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and not self._finished:
+            chunk = self._chunks.get()
+            if isinstance(chunk, Exception):
+                self._finished = True
+                raise chunk
+            self._finished = not chunk
+            self._chunk = memoryview(chunk)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._closing.set()
+            self._thread.join()
+            self._decompressed_file.close()
+        super().close()
+
+    def _decompress(self):
+        try:
+            while not self._closing.is_set():
+                chunk = self._decompressed_file.read(self.CHUNK_SIZE)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, item):
+        # The reader may stop early without draining the queue, so keep checking whether it has been closed
+        while not self._closing.is_set():
+            try:
+                self._chunks.put(item, timeout=self.PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
@@ -1,28 +1,168 @@
 import argparse
+import base64
+import hashlib
+import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 
+import google_crc32c
 from google.cloud import storage
 
+from exceptions import SampleDownloadChecksumError
+from sample_cache import SampleCache
 
-def load_bucket_sample_file(sample_file):
+CHUNK_SIZE = 32 * 1024 * 1024
+WORKERS = 8
+CHECKSUM_BUFFER_SIZE = 1024 * 1024
+CACHE_DIRECTORY = os.getenv('SAMPLE_CACHE_DIRECTORY', os.path.join('sample_files', '.sample_cache'))
+CACHE_MAX_GB = float(os.getenv('SAMPLE_CACHE_MAX_GB', '20'))
+
+
+def load_bucket_sample_file(sample_file, workers=WORKERS, chunk_size=CHUNK_SIZE, sample_cache: SampleCache = None):
     client = storage.Client()
 
-    bucket = client.get_bucket(os.getenv('SAMPLE_BUCKET'))
-    blob = storage.Blob(sample_file, bucket)
+    blob = client.bucket(os.getenv('SAMPLE_BUCKET')).get_blob(sample_file)
+    if blob is None:
+        raise FileNotFoundError(f'No such file {sample_file} in gcp bucket {os.getenv("SAMPLE_BUCKET")}')
+    destination_path = Path("sample_files").joinpath(sample_file)
 
-    with open(os.path.join("sample_files", sample_file), 'wb+') as file_obj:
-        client.download_blob_to_file(blob, file_obj)
+    if not sample_cache or not sample_cache.can_cache(blob):
+        download_blob(blob, destination_path, workers, chunk_size)
+    elif sample_cache.get(blob):
+        _copy_cached_file(sample_cache.object_path(blob), destination_path)
+        print(f'using cached copy of file {sample_file} from gcp bucket {os.getenv("SAMPLE_BUCKET")}')
+        return
+    else:
+        sample_cache.reserve(blob)
+        download_blob(blob, sample_cache.object_path(blob), workers, chunk_size)
+        sample_cache.add(blob)
+        _copy_cached_file(sample_cache.object_path(blob), destination_path)
 
     print(f'downloaded file {sample_file} from gcp bucket {os.getenv("SAMPLE_BUCKET")}')
 
 
+def _copy_cached_file(cached_path: Path, destination_path: Path):
+    # The cached file is copied rather than linked so editing the sample file can't change the cached copy. Any old
+    # sample file is unlinked first as it may be a hard link into the cache made by an older version of the loader
+    _unlink_if_exists(destination_path)
+    shutil.copyfile(cached_path, destination_path)
+
+
+def download_blob(blob: storage.Blob, destination_path: Path, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    # Chunks are downloaded in parallel straight into their offsets in a preallocated .part file. Completed chunks are
+    # recorded in a progress file next to it, so an interrupted download only fetches the missing chunks when re-run
+    part_path = destination_path.with_name(f'{destination_path.name}.part')
+    completed_chunk_starts = _read_download_progress(part_path, blob, chunk_size)
+
+    with open(part_path, 'r+b' if completed_chunk_starts else 'wb') as part_file:
+        part_file.truncate(blob.size)
+        missing_chunk_starts = [start for start in range(0, blob.size, chunk_size)
+                                if start not in completed_chunk_starts]
+        with ThreadPoolExecutor(workers) as executor:
+            downloads = {executor.submit(_download_chunk, blob, part_file.fileno(), start,
+                                         min(start + chunk_size, blob.size) - 1): start
+                         for start in missing_chunk_starts}
+            # After a failure the queued chunks are cancelled, but chunks already downloading are still recorded if
+            # they complete so they aren't fetched again on resume
+            failure = None
+            for download in as_completed(downloads):
+                if download.cancelled():
+                    continue
+                if download.exception():
+                    failure = failure or download.exception()
+                    for queued_download in downloads:
+                        queued_download.cancel()
+                    continue
+                completed_chunk_starts.add(downloads[download])
+                _write_download_progress(part_path, blob, chunk_size, completed_chunk_starts)
+            if failure:
+                raise failure
+
+    _verify_checksum(blob, part_path)
+    os.replace(part_path, destination_path)
+    _unlink_if_exists(_progress_path(part_path))
+
+
+def _download_chunk(blob: storage.Blob, file_descriptor, start, end):
+    # Every chunk is pinned to the generation first read so an object overwritten mid-download fails rather than
+    # mixing two versions. Ranged download_as_bytes with generation preconditions needs the google-cloud-storage version
+    # pinned as the minimum in the Pipfile
+    chunk = blob.download_as_bytes(start=start, end=end, raw_download=True, if_generation_match=blob.generation)
+    os.pwrite(file_descriptor, chunk, start)
+
+
+def _unlink_if_exists(path: Path):
+    # Path.unlink only takes missing_ok from Python 3.8
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _progress_path(part_path: Path) -> Path:
+    return part_path.with_name(f'{part_path.name}.progress')
+
+
+def _read_download_progress(part_path: Path, blob: storage.Blob, chunk_size) -> set:
+    # Progress is only resumed from if it was recorded for the same version of the object with the same chunking
+    try:
+        progress = json.loads(_progress_path(part_path).read_text())
+    except FileNotFoundError:
+        return set()
+    if (not part_path.exists()
+            or (progress['generation'], progress['size'], progress['chunk_size'])
+            != (blob.generation, blob.size, chunk_size)):
+        return set()
+    return set(progress['completed_chunk_starts'])
+
+
+def _write_download_progress(part_path: Path, blob: storage.Blob, chunk_size, completed_chunk_starts):
+    # Write to a temporary file and rename it over the old progress so a crash mid write can't corrupt it
+    progress_path = _progress_path(part_path)
+    temporary_path = progress_path.with_name(f'{progress_path.name}.tmp')
+    temporary_path.write_text(json.dumps({'generation': blob.generation, 'size': blob.size, 'chunk_size': chunk_size,
+                                          'completed_chunk_starts': sorted(completed_chunk_starts)}))
+    os.replace(temporary_path, progress_path)
+
+
+def _verify_checksum(blob: storage.Blob, part_path: Path):
+    # Composite objects have no MD5, so CRC32C is checked whenever the object has one
+    if blob.crc32c:
+        expected_checksum, checksum = blob.crc32c, google_crc32c.Checksum()
+    elif blob.md5_hash:
+        expected_checksum, checksum = blob.md5_hash, hashlib.md5()
+    else:
+        return
+
+    with open(part_path, 'rb') as part_file:
+        for block in iter(lambda: part_file.read(CHECKSUM_BUFFER_SIZE), b''):
+            checksum.update(block)
+
+    actual_checksum = base64.b64encode(checksum.digest()).decode()
+    if actual_checksum != expected_checksum:
+        part_path.unlink()
+        _unlink_if_exists(_progress_path(part_path))
+        raise SampleDownloadChecksumError(f'Downloaded {blob.name} has checksum {actual_checksum}, '
+                                          f'expected {expected_checksum}')
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Download sample file from bucket')
     parser.add_argument('--sample_file',
                         required=True)
+    parser.add_argument('--workers', help='number of chunks to download in parallel', type=int, default=WORKERS)
+    parser.add_argument('--chunk-size-mb', help='size of each downloaded chunk in MB', type=int,
+                        default=CHUNK_SIZE // (1024 * 1024))
+    parser.add_argument('--cache-dir', help='directory to cache downloaded sample files in', default=CACHE_DIRECTORY)
+    parser.add_argument('--cache-max-gb', help='disk budget for the sample file cache in GB', type=float,
+                        default=CACHE_MAX_GB)
+    parser.add_argument('--no-cache', help='always download the sample file', action='store_true')
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_arguments()
-    load_bucket_sample_file(args.sample_file)
+    cache = None if args.no_cache else SampleCache(args.cache_dir, int(args.cache_max_gb * 1024 ** 3))
+    load_bucket_sample_file(args.sample_file, args.workers, args.chunk_size_mb * 1024 * 1024, cache)
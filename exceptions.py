@@ -1,2 +1,22 @@
 class RabbitConnectionClosedError(Exception):
     pass
+
+
+class RabbitDeliveryNotConfirmedError(Exception):
+    pass
+
+
+class SampleCheckpointError(Exception):
+    pass
+
+
+class SampleValidationError(Exception):
+    pass
+
+
+class SampleDownloadChecksumError(Exception):
+    pass
+
+
+class SampleUploadChecksumError(Exception):
+    pass
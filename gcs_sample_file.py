@@ -0,0 +1,103 @@
+import io
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from google.api_core.exceptions import PreconditionFailed
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+GCS_URI_PREFIX = 'gs://'
+
+
+def is_gcs_uri(file_path) -> bool:
+    return str(file_path).startswith(GCS_URI_PREFIX)
+
+
+def parse_gcs_uri(gcs_uri):
+    bucket_name, _, blob_name = str(gcs_uri)[len(GCS_URI_PREFIX):].partition('/')
+    if not bucket_name or not blob_name:
+        raise ValueError(f'Invalid GCS URI "{gcs_uri}", expected gs://<bucket>/<object>')
+    return bucket_name, blob_name
+
+
+def local_file_path(file_path):
+    # Files written alongside a GCS sample file go in the working directory instead
+    return Path(parse_gcs_uri(file_path)[1]).name if is_gcs_uri(file_path) else file_path
+
+
+def open_gcs_blob(gcs_uri, client: storage.Client = None, chunk_size=None, read_ahead=None):
+    bucket_name, blob_name = parse_gcs_uri(gcs_uri)
+    blob = (client or storage.Client()).bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise FileNotFoundError(f'No such GCS object {gcs_uri}')
+    reader = GcsBlobReader(blob, chunk_size or GcsBlobReader.CHUNK_SIZE, read_ahead or GcsBlobReader.READ_AHEAD)
+    return io.BufferedReader(reader, GcsBlobReader.BUFFER_SIZE)
+
+
+class GcsBlobReader(io.RawIOBase):
+    # Streams a blob as consecutive ranged downloads, keeping up to READ_AHEAD chunks in flight on a thread pool
+    # so reading from the first chunk can start while the following ones are still downloading
+    CHUNK_SIZE = 8 * 1024 * 1024
+    READ_AHEAD = 4
+    BUFFER_SIZE = 1024 * 1024
+    MAX_RANGE_ATTEMPTS = 3
+
+    def __init__(self, blob: storage.Blob, chunk_size=CHUNK_SIZE, read_ahead=READ_AHEAD):
+        super().__init__()
+        self._blob = blob
+        self._chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(read_ahead)
+        self._downloads = deque()
+        self._next_start = 0
+        self._chunk = memoryview(b'')
+        for _ in range(read_ahead):
+            self._request_next_chunk()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._chunk:
+            if not self._downloads:
+                return 0
+            self._chunk = memoryview(self._downloads.popleft().result())
+            self._request_next_chunk()
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            for download in self._downloads:
+                download.cancel()
+            self._executor.shutdown()
+        super().close()
+
+    def _request_next_chunk(self):
+        if self._next_start >= self._blob.size:
+            return
+        end = min(self._next_start + self._chunk_size, self._blob.size) - 1
+        self._downloads.append(self._executor.submit(self._download_range, self._next_start, end))
+        self._next_start = end + 1
+
+    def _download_range(self, start, end):
+        # Every range is pinned to the generation first read so an object overwritten mid-load fails rather than
+        # mixing two versions, raw downloads keep the stored bytes for compressed objects. Ranged download_as_bytes
+        # with generation preconditions needs the google-cloud-storage version pinned as the minimum in the Pipfile.
+        # Each range is retried on its own, except when the object was overwritten as retrying can't help
+        for attempt in range(1, self.MAX_RANGE_ATTEMPTS + 1):
+            try:
+                return self._blob.download_as_bytes(start=start, end=end, raw_download=True,
+                                                    if_generation_match=self._blob.generation)
+            except PreconditionFailed:
+                raise
+            except Exception as error:
+                if attempt == self.MAX_RANGE_ATTEMPTS:
+                    raise
+                logger.warning(f'Retrying download of bytes {start}-{end} of {self._blob.name} after attempt '
+                               f'{attempt} failed: {error}')
@@ -3,6 +3,8 @@ import csv
 import random
 from pathlib import Path
 
+from compressed_file import open_sample_file
+
 
 class SampleGenerator:
     FIELDNAMES = ('UPRN', 'ESTAB_UPRN', 'ADDRESS_TYPE', 'ESTAB_TYPE', 'ADDRESS_LEVEL', 'ABP_CODE',
@@ -173,7 +175,7 @@ class SampleGenerator:
         self.read_words()
         treatment_code_quantities = self.read_treatment_code_quantities(treatment_code_quantities_path)
 
-        with open(output_file_path, 'w', newline='') as output_file:
+        with open_sample_file(output_file_path, 'w', newline='') as output_file:
             writer = csv.DictWriter(output_file, fieldnames=self.FIELDNAMES)
             writer.writeheader()
 
@@ -255,7 +257,7 @@ def parse_arguments():
                         help='Path to treatment code quantities csv config file',
                         default='treatment_code_quantities.csv', required=False)
     parser.add_argument('--output_file_path', '-o',
-                        help='Path write generated sample file to',
+                        help='Path write generated sample file to, compressed if it ends with .gz or .zst',
                         default='sample_file.csv', required=False)
     return parser.parse_args()
 
@@ -1,13 +1,27 @@
 import argparse
+import asyncio
+import contextlib
 import csv
+import itertools
 import json
 import logging
+import multiprocessing
 import os
 import sys
 import uuid
+from pathlib import Path
 from typing import Iterable
 
+from async_rabbit_context import AsyncRabbitContext
+from case_message_encoder import CaseMessageEncoder
+from compressed_file import is_compressed, open_sample_file
+from gcs_sample_file import is_gcs_uri, local_file_path
+from exceptions import SampleValidationError
 from rabbit_context import RabbitContext
+from rate_limiter import RateProfile, TokenBucketRateLimiter, read_rate_profile
+from sample_checkpoint import read_checkpoint, start_checkpoint, write_checkpoint
+from sample_unit_store import JsonlSampleUnitStore, RedisSampleUnitStore
+from validate_sample import SampleValidator, ValidationFailure, chunk_byte_ranges
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -15,77 +29,420 @@ logger.addHandler(logging.NullHandler())
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Load a sample file into response management.')
-    parser.add_argument('sample_file_path', help='path to the sample file', type=str)
+    parser.add_argument('sample_file_path', help='path to the sample file, or a gs://<bucket>/<object> URI to stream '
+                                                 'it from GCS', type=str)
     parser.add_argument('collection_exercise_id', help='collection exercise ID', type=str)
     parser.add_argument('action_plan_id', help='action plan ID', type=str)
+    parser.add_argument('--confirm-window', help='maximum number of unconfirmed messages to keep in flight, '
+                                                 'enables publisher confirms when set', type=int, default=0)
+    parser.add_argument('--workers', help='number of processes to load the sample file with, '
+                                          'each loading a separate shard of the file', type=int, default=1)
+    parser.add_argument('--engine', help='publishing engine, asyncio overlaps reading, encoding and publishing',
+                        choices=('blocking', 'asyncio'), default='blocking')
+    parser.add_argument('--channels', help='number of channels to publish on concurrently with the asyncio engine',
+                        type=int, default=1)
+    parser.add_argument('--queue-high-water-mark', help='pause publishing while the queue holds at least this many '
+                                                        'messages, 0 disables queue depth checks',
+                        type=int, default=0)
+    parser.add_argument('--rate', help='target number of messages to publish per second', type=float, default=0)
+    parser.add_argument('--rate-profile', help='path to a rate profile csv of ramp, steady and burst phases to '
+                                               'pace publishing with', type=Path)
+    parser.add_argument('--sample-unit-store', help='stream the loaded sample units to redis or to a JSON lines file',
+                        choices=('redis', 'jsonl'))
+    parser.add_argument('--sample-unit-file', help='path of the JSON lines file to append loaded sample units to',
+                        type=Path, default=Path('sample_units.jsonl'))
+    parser.add_argument('--validate', help='validate each row while loading, only publishing valid rows',
+                        action='store_true')
+    parser.add_argument('--reject-file', help='path to write invalid rows and their validation failures to, '
+                                              'defaults to <sample_file_path>.rejects.csv', type=Path)
+    parser.add_argument('--max-rejects', help='abort the load once more than this many rows are invalid',
+                        type=int)
+    parser.add_argument('--checkpoint-frequency', help='number of sample units to load between saving a checkpoint '
+                                                       'next to the sample file, requires --confirm-window',
+                        type=int, default=0)
+    parser.add_argument('--resume', help='resume loading from the last checkpoint saved next to the sample file',
+                        action='store_true')
     return parser.parse_args()
 
 
 def load_sample_file(sample_file_path, collection_exercise_id, action_plan_id,
-                     store_loaded_sample_units=False, **kwargs):
-    with open(sample_file_path) as sample_file:
+                     store_loaded_sample_units=False, workers=1, checkpoint_frequency=0, resume=False, **kwargs):
+    _check_load_options(workers, checkpoint_frequency or resume, _is_streamed(sample_file_path), **kwargs)
+    if checkpoint_frequency or resume:
+        return _load_sample_file_checkpointed(sample_file_path, collection_exercise_id, action_plan_id,
+                                              store_loaded_sample_units, checkpoint_frequency, resume, **kwargs)
+    if workers > 1:
+        return _load_sample_file_sharded(sample_file_path, collection_exercise_id, action_plan_id,
+                                         store_loaded_sample_units, workers, **kwargs)
+    with open_sample_file(sample_file_path) as sample_file:
         return load_sample(sample_file, collection_exercise_id, action_plan_id, store_loaded_sample_units, **kwargs)
 
 
+def _is_streamed(sample_file_path):
+    return is_compressed(sample_file_path) or is_gcs_uri(sample_file_path)
+
+
+def _check_load_options(workers, checkpointed, streamed, engine='blocking', rate_profile=None, sample_unit_store=None,
+                        sample_validator=None, confirm_window=0, **_kwargs):
+    single_worker_options = {'Checkpoints': checkpointed, 'Paced loading': rate_profile,
+                             'Sample unit stores': sample_unit_store, 'Validating while loading': sample_validator}
+    blocking_engine_options = {'Checkpoints': checkpointed, 'Paced loading': rate_profile}
+    for option, enabled in single_worker_options.items():
+        if enabled and workers > 1:
+            raise ValueError(f'{option} are only supported when loading with a single worker')
+    for option, enabled in blocking_engine_options.items():
+        if enabled and engine != 'blocking':
+            raise ValueError(f'{option} are only supported when loading with the blocking engine')
+    if streamed and (checkpointed or workers > 1):
+        # Shards and checkpoints are byte offsets into the sample file, which can't be seeked to in a compressed or
+        # GCS stream
+        raise ValueError('Compressed and GCS sample files can only be loaded with a single worker and without '
+                         'checkpoints')
+    if confirm_window and engine != 'blocking':
+        # The asyncio engine publishes without confirms, so a confirm window would silently not be honoured
+        raise ValueError('Publisher confirms are only supported when loading with the blocking engine')
+    if checkpointed and not confirm_window:
+        # Without confirms a checkpoint could only record what was handed to the socket, so a crash could lose
+        # published sample units which the broker never received and resuming would skip them
+        raise ValueError('Checkpoints are only supported with publisher confirms, set a confirm window')
+
+
 def load_sample(sample_file: Iterable[str], collection_exercise_id: str, action_plan_id: str,
-                store_loaded_sample_units=False, **kwargs):
-    sample_file_reader = csv.DictReader(sample_file, delimiter=',')
+                store_loaded_sample_units=False, engine='blocking', **kwargs):
+    sample_file_reader = csv.reader(sample_file, delimiter=',')
+    return _load_sample_rows(action_plan_id, collection_exercise_id, sample_file_reader, store_loaded_sample_units,
+                             engine, **kwargs)
+
+
+def _load_sample_rows(action_plan_id: str, collection_exercise_id: str, sample_file_reader: Iterable[str],
+                      store_loaded_sample_units, engine, sample_validator: SampleValidator = None,
+                      reject_file_path=None, max_rejects=None, resumed_file_row_count=0, **kwargs):
+    if sample_validator:
+        validated_sample_file_reader = _validate_sample_rows(sample_file_reader, sample_validator, reject_file_path,
+                                                             max_rejects, resumed_file_row_count)
+        with contextlib.closing(validated_sample_file_reader):
+            return _load_sample_rows(action_plan_id, collection_exercise_id, validated_sample_file_reader,
+                                     store_loaded_sample_units, engine, **kwargs)
+    if engine == 'asyncio':
+        return asyncio.run(_load_sample_units_async(action_plan_id, collection_exercise_id, sample_file_reader,
+                                                    store_loaded_sample_units, **kwargs))
     return _load_sample_units(action_plan_id, collection_exercise_id, sample_file_reader, store_loaded_sample_units,
                               **kwargs)
 
 
 def _load_sample_units(action_plan_id: str, collection_exercise_id: str, sample_file_reader: Iterable[str],
-                       store_loaded_sample_units=False, sample_unit_log_frequency=5000, **kwargs):
+                       store_loaded_sample_units=False, sample_unit_log_frequency=5000, confirm_window=0,
+                       checkpoint_callback=None, checkpoint_frequency=0, flow_control_check_frequency=1000,
+                       rate_profile: RateProfile = None, rabbit_context=None, sample_unit_store=None, **kwargs):
     sample_units = {}
+    store_sample_unit = _sample_unit_writer(sample_units, store_loaded_sample_units, sample_unit_store)
+    count = 0
+    rate_limiter = TokenBucketRateLimiter(rate_profile) if rate_profile else None
+    header = next(sample_file_reader)
+    case_message_encoder = CaseMessageEncoder(header, collection_exercise_id, action_plan_id)
 
-    with RabbitContext(**kwargs) as rabbit:
+    with rabbit_context or RabbitContext(confirm_window=confirm_window, **kwargs) as rabbit:
         logger.info(f'Loading sample units to queue {rabbit.queue_name}')
 
-        for count, sample_row in enumerate(sample_file_reader, 1):
-            sample_unit_id = uuid.uuid4()
-
-            rabbit.publish_message(_create_case_json(sample_row, collection_exercise_id=collection_exercise_id,
-                                                     action_plan_id=action_plan_id),
-                                   content_type='application/json')
+        for count, sample_row in enumerate(filter(None, sample_file_reader), 1):
+            if rate_limiter:
+                rate_limiter.acquire()
+            rabbit.publish_message(case_message_encoder.encode(sample_row), content_type='application/json')
 
-            if store_loaded_sample_units:
-                sample_unit = {
-                    f'sampleunit:{sample_unit_id}': _create_sample_unit_json(sample_unit_id, sample_row)}
-                sample_units.update(sample_unit)
+            if store_sample_unit:
+                sample_unit_id = uuid.uuid4()
+                store_sample_unit(f'sampleunit:{sample_unit_id}',
+                                  _create_sample_unit_json(sample_unit_id, dict(zip(header, sample_row))))
 
             if count % sample_unit_log_frequency == 0:
-                logger.info(f'{count} sample units loaded')
+                _log_sample_units_loaded(rabbit, count)
+
+            if count % flow_control_check_frequency == 0:
+                rabbit.wait_for_flow_control()
 
-        if count % sample_unit_log_frequency:
-            logger.info(f'{count} sample units loaded')
+            if checkpoint_callback and count % checkpoint_frequency == 0:
+                _persist_loaded_sample_units(rabbit, sample_unit_store, checkpoint_callback, count)
+
+        _persist_loaded_sample_units(rabbit, sample_unit_store, checkpoint_callback, count)
+        if count % sample_unit_log_frequency or confirm_window:
+            _log_sample_units_loaded(rabbit, count)
 
     logger.info(f'All sample units have been added to the queue {rabbit.queue_name}')
 
     return sample_units
 
 
-def _create_case_json(sample_row, collection_exercise_id, action_plan_id) -> str:
-    create_case = {'uprn': sample_row['UPRN'], 'estabUprn': sample_row['ESTAB_UPRN'],
-                   'addressType': sample_row['ADDRESS_TYPE'], 'estabType': sample_row['ESTAB_TYPE'],
-                   'addressLevel': sample_row['ADDRESS_LEVEL'], 'abpCode': sample_row['ABP_CODE'],
-                   'organisationName': sample_row['ORGANISATION_NAME'],
-                   'addressLine1': sample_row['ADDRESS_LINE1'], 'addressLine2': sample_row['ADDRESS_LINE2'],
-                   'addressLine3': sample_row['ADDRESS_LINE3'], 'townName': sample_row['TOWN_NAME'],
-                   'postcode': sample_row['POSTCODE'], 'latitude': sample_row['LATITUDE'],
-                   'longitude': sample_row['LONGITUDE'], 'oa': sample_row['OA'],
-                   'lsoa': sample_row['LSOA'], 'msoa': sample_row['MSOA'],
-                   'lad': sample_row['LAD'], 'region': sample_row['REGION'],
-                   'htcWillingness': sample_row['HTC_WILLINGNESS'], 'htcDigital': sample_row['HTC_DIGITAL'],
-                   'fieldCoordinatorId': sample_row['FIELDCOORDINATOR_ID'],
-                   'fieldOfficerId': sample_row['FIELDOFFICER_ID'],
-                   'treatmentCode': sample_row['TREATMENT_CODE'],
-                   'ceExpectedCapacity': sample_row['CE_EXPECTED_CAPACITY'],
-                   'secureEstablishment': sample_row['CE_SECURE'],
-                   'printBatch': sample_row['PRINT_BATCH'],
-                   'collectionExerciseId': collection_exercise_id,
-                   'actionPlanId': action_plan_id}
-
-    return json.dumps(create_case)
+def _validate_sample_rows(sample_file_reader, sample_validator: SampleValidator, reject_file_path,
+                          max_rejects=None, resumed_file_row_count=0):
+    # Yields the header and only the valid rows after it, writing invalid rows and their failures to the reject file.
+    # Rejects are numbered by their row in the sample file like the validator numbers its failures, with the header as
+    # row 1 and blank lines skipped, so a row with quoted line breaks is one row. When a load is resumed the reader
+    # starts again from the header, so the row numbers carry on from the rows before the checkpoint, and only the
+    # rejects from before the checkpoint are kept
+    header = next(sample_file_reader)
+    header_failure = sample_validator.find_header_validation_failures(header)
+    if header_failure:
+        raise SampleValidationError(f'Invalid sample file header: {header_failure.description}')
+    yield header
+
+    resumed_rejects = _read_rejects_before(reject_file_path, resumed_file_row_count) if resumed_file_row_count else []
+    row_number = max(resumed_file_row_count, 1)
+    reject_count = len(resumed_rejects)
+    with open(reject_file_path, 'w', newline='') as reject_file:
+        reject_writer = csv.writer(reject_file)
+        reject_writer.writerow([*header, 'ROW_NUMBER', 'VALIDATION_FAILURES'])
+        reject_writer.writerows(resumed_rejects)
+
+        for sample_row in filter(None, sample_file_reader):
+            row_number += 1
+            failures = _find_row_validation_failures(sample_validator, row_number, header, sample_row)
+            if not failures:
+                yield sample_row
+                continue
+
+            reject_count += 1
+            reject_writer.writerow([*sample_row, row_number,
+                                    '; '.join(f'{failure.column}: {failure.description}' for failure in failures)])
+            if max_rejects is not None and reject_count > max_rejects:
+                raise SampleValidationError(f'Aborting load, more than {max_rejects} invalid rows, '
+                                            f'see {reject_file_path}')
+
+    if reject_count:
+        logger.warning(f'{reject_count} invalid rows were not loaded, see {reject_file_path}')
+
+
+def _read_rejects_before(reject_file_path, file_row_count):
+    # Rows rejected after the checkpoint are dropped, as they are validated again when the load resumes
+    try:
+        with open(reject_file_path, newline='') as reject_file:
+            reject_reader = csv.reader(reject_file)
+            next(reject_reader, None)
+            return [reject for reject in reject_reader if int(reject[-2]) <= file_row_count]
+    except FileNotFoundError:
+        return []
+
+
+def _find_row_validation_failures(sample_validator: SampleValidator, line_number, header, sample_row):
+    if len(sample_row) != len(header):
+        return [ValidationFailure(line_number, None, f'Row has {len(sample_row)} values, expected {len(header)}')]
+    return sample_validator.find_row_validation_failures(line_number, dict(zip(header, sample_row)))
+
+
+async def _load_sample_units_async(action_plan_id: str, collection_exercise_id: str,
+                                   sample_file_reader: Iterable[str], store_loaded_sample_units=False,
+                                   sample_unit_log_frequency=5000, rabbit_context=None, channels=1, queue_size=1000,
+                                   sample_unit_store=None, **kwargs):
+    sample_units = {}
+    store_sample_unit = _sample_unit_writer(sample_units, store_loaded_sample_units, sample_unit_store)
+    header = next(sample_file_reader)
+    case_message_encoder = CaseMessageEncoder(header, collection_exercise_id, action_plan_id)
+    row_queue = asyncio.Queue(maxsize=queue_size)
+    message_queue = asyncio.Queue(maxsize=queue_size)
+
+    async with rabbit_context or AsyncRabbitContext(channels=channels, **kwargs) as rabbit:
+        logger.info(f'Loading sample units to queue {rabbit.queue_name} on {channels} channels')
+
+        publishers = [asyncio.ensure_future(_publish_messages(rabbit, message_queue, channel_index,
+                                                              sample_unit_log_frequency))
+                      for channel_index in range(channels)]
+        stages = [asyncio.ensure_future(_read_sample_rows(sample_file_reader, row_queue, queue_size)),
+                  asyncio.ensure_future(_encode_sample_rows(row_queue, message_queue, case_message_encoder, header,
+                                                            store_sample_unit, channels))]
+        try:
+            await asyncio.gather(*stages, *publishers)
+        finally:
+            for task in (*stages, *publishers):
+                task.cancel()
+
+        if sample_unit_store:
+            sample_unit_store.flush()
+        logger.info(f'{rabbit.published_count} sample units loaded')
+
+    logger.info(f'All sample units have been added to the queue {rabbit.queue_name}')
+
+    return sample_units
+
+
+async def _read_sample_rows(sample_file_reader, row_queue: asyncio.Queue, yield_frequency):
+    for count, sample_row in enumerate(filter(None, sample_file_reader), 1):
+        if row_queue.full() or count % yield_frequency == 0:
+            await row_queue.put(sample_row)
+        else:
+            row_queue.put_nowait(sample_row)
+    await row_queue.put(None)
+
+
+async def _encode_sample_rows(row_queue: asyncio.Queue, message_queue: asyncio.Queue,
+                              case_message_encoder: CaseMessageEncoder, header, store_sample_unit, publisher_count):
+    while True:
+        sample_row = await row_queue.get()
+        if sample_row is None:
+            break
+        await message_queue.put(case_message_encoder.encode(sample_row))
+        if store_sample_unit:
+            sample_unit_id = uuid.uuid4()
+            store_sample_unit(f'sampleunit:{sample_unit_id}',
+                              _create_sample_unit_json(sample_unit_id, dict(zip(header, sample_row))))
+
+    for _ in range(publisher_count):
+        await message_queue.put(None)
+
+
+async def _publish_messages(rabbit, message_queue: asyncio.Queue, channel_index, sample_unit_log_frequency):
+    while True:
+        message = await message_queue.get()
+        if message is None:
+            return
+        await rabbit.publish_message(message, content_type='application/json', channel_index=channel_index)
+        if rabbit.published_count % sample_unit_log_frequency == 0:
+            logger.info(f'{rabbit.published_count} sample units loaded')
+
+
+def _load_sample_file_checkpointed(sample_file_path, collection_exercise_id, action_plan_id,
+                                   store_loaded_sample_units, checkpoint_frequency, resume, engine='blocking',
+                                   **kwargs):
+    with open(sample_file_path, 'rb') as sample_file:
+        header = sample_file.readline().decode()
+        checkpoint = start_checkpoint(sample_file_path, sample_file.tell(), collection_exercise_id, action_plan_id)
+        if resume:
+            checkpoint = read_checkpoint(sample_file_path, collection_exercise_id, action_plan_id)
+            logger.info(f'Resuming load after {checkpoint.row_count} sample units from byte {checkpoint.byte_offset}')
+
+        sample_file.seek(checkpoint.byte_offset)
+        sample_file_lines = _SampleFileLines(sample_file, checkpoint.byte_offset)
+        sample_file_reader = _SampleFileRows(csv.reader(itertools.chain([header], sample_file_lines), delimiter=','))
+
+        def save_checkpoint(count):
+            # The header is read again on resuming, so it is only counted in the checkpoint the load started from
+            write_checkpoint(sample_file_path, checkpoint._replace(
+                byte_offset=sample_file_lines.position, row_count=checkpoint.row_count + count,
+                file_row_count=checkpoint.file_row_count + sample_file_reader.row_count - 1))
+
+        return _load_sample_rows(action_plan_id, collection_exercise_id, sample_file_reader,
+                                 store_loaded_sample_units, engine, checkpoint_callback=save_checkpoint,
+                                 checkpoint_frequency=checkpoint_frequency or 10000,
+                                 resumed_file_row_count=checkpoint.file_row_count if resume else 0, **kwargs)
+
+
+class _SampleFileLines:
+
+    def __init__(self, sample_file, start, end=None):
+        self._sample_file = sample_file
+        # Byte position in the sample file just after the last line read
+        self.position = start
+        self._end = end
+
+    def __iter__(self):
+        while self._end is None or self.position < self._end:
+            line = self._sample_file.readline()
+            if not line:
+                return
+            self.position += len(line)
+            yield line.decode()
+
+
+class _SampleFileRows:
+    # Counts the rows read from a csv reader, skipping blank lines as validation does when it numbers rows
+
+    def __init__(self, sample_file_reader):
+        self._sample_file_reader = sample_file_reader
+        self.row_count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._sample_file_reader)
+        if row:
+            self.row_count += 1
+        return row
+
+
+def _load_sample_file_sharded(sample_file_path, collection_exercise_id, action_plan_id,
+                              store_loaded_sample_units, workers, engine='blocking', progress_log_interval=10,
+                              **kwargs):
+    shards = chunk_byte_ranges(sample_file_path, workers)
+    logger.info(f'Loading sample file in {len(shards)} shards')
+
+    loaded_count = multiprocessing.Value('L', 0)
+    shard_args = [(sample_file_path, start, end, collection_exercise_id, action_plan_id,
+                   store_loaded_sample_units, kwargs, engine) for start, end in shards]
+
+    with multiprocessing.Pool(len(shards), initializer=_init_shard_worker, initargs=(loaded_count,)) as pool:
+        shard_results = pool.starmap_async(_load_sample_shard, shard_args)
+        while not shard_results.ready():
+            shard_results.wait(progress_log_interval)
+            logger.info(f'{loaded_count.value} sample units loaded across all shards')
+        shard_sample_units = shard_results.get()
+
+    sample_units = {}
+    for shard in shard_sample_units:
+        sample_units.update(shard)
+
+    logger.info(f'All {loaded_count.value} sample units have been loaded')
+    return sample_units
+
+
+_shard_loaded_count = None
+
+
+def _init_shard_worker(loaded_count):
+    global _shard_loaded_count
+    _shard_loaded_count = loaded_count
+
+
+def _load_sample_shard(sample_file_path, start, end, collection_exercise_id, action_plan_id,
+                       store_loaded_sample_units, rabbit_kwargs, engine='blocking'):
+    with open(sample_file_path, 'rb') as sample_file:
+        header = sample_file.readline().decode()
+        sample_file.seek(start)
+        sample_file_reader = csv.reader(itertools.chain([header], _SampleFileLines(sample_file, start, end)),
+                                        delimiter=',')
+        return _load_sample_rows(action_plan_id, collection_exercise_id, _count_shard_rows(sample_file_reader),
+                                 store_loaded_sample_units, engine, **rabbit_kwargs)
+
+
+def _count_shard_rows(sample_file_reader, update_frequency=1000):
+    yield next(sample_file_reader)
+    unreported = 0
+    for sample_row in filter(None, sample_file_reader):
+        yield sample_row
+        unreported += 1
+        if unreported == update_frequency:
+            _add_to_shard_loaded_count(unreported)
+            unreported = 0
+    _add_to_shard_loaded_count(unreported)
+
+
+def _add_to_shard_loaded_count(count):
+    if _shard_loaded_count is not None:
+        with _shard_loaded_count.get_lock():
+            _shard_loaded_count.value += count
+
+
+def _log_sample_units_loaded(rabbit: RabbitContext, count: int):
+    if rabbit.confirm_window:
+        logger.info(f'{rabbit.confirmed_count} sample units loaded, {count} published')
+    else:
+        logger.info(f'{count} sample units loaded')
+
+
+def _persist_loaded_sample_units(rabbit: RabbitContext, sample_unit_store, checkpoint_callback, count):
+    # A checkpoint is only saved once every sample unit before it has been confirmed and stored
+    rabbit.wait_for_confirms()
+    if sample_unit_store:
+        sample_unit_store.flush()
+    if checkpoint_callback:
+        checkpoint_callback(count)
+
+
+def _sample_unit_writer(sample_units, store_loaded_sample_units, sample_unit_store):
+    # Sample units are streamed to the store when there is one, otherwise they are collected to be returned
+    if sample_unit_store:
+        return sample_unit_store.add
+    if store_loaded_sample_units:
+        return sample_units.__setitem__
+    return None
 
 
 def _create_sample_unit_json(sample_unit_id, sample_unit) -> str:
@@ -96,10 +453,52 @@ def _create_sample_unit_json(sample_unit_id, sample_unit) -> str:
 def main():
     log_level = os.getenv('LOG_LEVEL')
     logging.basicConfig(handlers=[logging.StreamHandler(sys.stdout)], level=log_level or logging.ERROR)
-    logger.setLevel(log_level or logging.INFO)
+    for module_logger in (logger, logging.getLogger('gcs_sample_file'), logging.getLogger('rabbit_context'),
+                          logging.getLogger('rate_limiter')):
+        module_logger.setLevel(log_level or logging.INFO)
     args = parse_arguments()
-    load_sample_file(args.sample_file_path, args.collection_exercise_id, args.action_plan_id,
-                     store_loaded_sample_units=False)
+    with _sample_unit_store(args) as sample_unit_store:
+        load_sample_file(args.sample_file_path, args.collection_exercise_id, args.action_plan_id,
+                         store_loaded_sample_units=False, workers=args.workers, engine=args.engine,
+                         resume=args.resume, rate_profile=_rate_profile(args), sample_unit_store=sample_unit_store,
+                         **_validation_options(args), **_engine_options(args))
+
+
+def _engine_options(args):
+    # RabbitContext falls back to RABBITMQ_CONFIRM_WINDOW itself, it is read here too so the load options are checked
+    # against the confirm window that will actually be used
+    confirm_window = args.confirm_window or int(os.getenv('RABBITMQ_CONFIRM_WINDOW', 0))
+    if args.engine == 'asyncio':
+        return {'channels': args.channels, 'confirm_window': confirm_window}
+    options = {'confirm_window': confirm_window, 'queue_high_water_mark': args.queue_high_water_mark}
+    if args.workers == 1 and not _is_streamed(args.sample_file_path):
+        options['checkpoint_frequency'] = args.checkpoint_frequency
+    return options
+
+
+def _validation_options(args):
+    if not args.validate:
+        return {}
+    default_reject_file_path = Path(f'{local_file_path(args.sample_file_path)}.rejects.csv')
+    return {'sample_validator': SampleValidator(),
+            'reject_file_path': args.reject_file or default_reject_file_path,
+            'max_rejects': args.max_rejects}
+
+
+def _sample_unit_store(args):
+    if args.sample_unit_store == 'redis':
+        return RedisSampleUnitStore()
+    if args.sample_unit_store == 'jsonl':
+        return JsonlSampleUnitStore(args.sample_unit_file)
+    return contextlib.nullcontext()
+
+
+def _rate_profile(args):
+    if args.rate_profile:
+        return read_rate_profile(args.rate_profile)
+    if args.rate:
+        return RateProfile.constant(args.rate)
+    return None
 
 
 if __name__ == "__main__":
@@ -1,12 +1,23 @@
+import logging
 import os
+import time
+from collections import OrderedDict, namedtuple
 
 import pika
-from pika.spec import PERSISTENT_DELIVERY_MODE
+from pika.spec import PERSISTENT_DELIVERY_MODE, Basic
 
-from exceptions import RabbitConnectionClosedError
+from exceptions import RabbitConnectionClosedError, RabbitDeliveryNotConfirmedError
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+PendingMessage = namedtuple('PendingMessage', ('body', 'content_type', 'attempts'))
 
 
 class RabbitContext:
+    MAX_PUBLISH_ATTEMPTS = 3
+    QUEUE_LOW_WATER_MARK_RATIO = 0.8
+    FLOW_CONTROL_POLL_INTERVAL = 1
 
     def __init__(self, **kwargs):
         self._host = kwargs.get('host') or os.getenv('RABBITMQ_SERVICE_HOST', 'localhost')
@@ -16,6 +27,19 @@ class RabbitContext:
         self._user = kwargs.get('user') or os.getenv('RABBITMQ_USER', 'guest')
         self._password = kwargs.get('password') or os.getenv('RABBITMQ_PASSWORD', 'guest')
         self.queue_name = kwargs.get('queue_name') or os.getenv('RABBITMQ_QUEUE', 'case.sample.inbound')
+        self.confirm_window = int(kwargs.get('confirm_window') or os.getenv('RABBITMQ_CONFIRM_WINDOW', 0))
+        self.queue_high_water_mark = int(kwargs.get('queue_high_water_mark')
+                                         or os.getenv('RABBITMQ_QUEUE_HIGH_WATER_MARK', 0))
+        self.connection_blocked = False
+        self._connection_blocked_time = None
+        self.published_count = 0
+        self.confirmed_count = 0
+        self._delivery_tag = 0
+        self._unconfirmed = OrderedDict()
+        self._returned_delivery_tags = set()
+        self._republish_queue = []
+        self._confirm_selected = False
+        self._wake_condition = None
 
     def __enter__(self):
         self.open_connection()
@@ -35,10 +59,15 @@ class RabbitContext:
                                       self._vhost,
                                       pika.PlainCredentials(self._user, self._password)))
         self._channel = self._connection.channel()
+        self._connection.add_on_connection_blocked_callback(self._on_connection_blocked)
+        self._connection.add_on_connection_unblocked_callback(self._on_connection_unblocked)
 
         if self.queue_name == 'localtest':
             self._channel.queue_declare(queue=self.queue_name)
 
+        if self.confirm_window:
+            self._enable_publisher_confirms()
+
         return self._connection
 
     def close_connection(self):
@@ -49,8 +78,145 @@ class RabbitContext:
     def publish_message(self, message: str, content_type: str):
         if not self._connection.is_open:
             raise RabbitConnectionClosedError
+        if not self.confirm_window:
+            self._basic_publish(message, content_type)
+            self.published_count += 1
+            return
+
+        body = message.encode() if isinstance(message, str) else message
+        self._publish_pending_message(PendingMessage(body, content_type, attempts=1))
+        self.published_count += 1
+        self._wait_for_unconfirmed_below(self.confirm_window)
+
+    def wait_for_confirms(self):
+        if self.confirm_window:
+            self._wait_for_unconfirmed_below(1)
+
+    def queue_depth(self):
+        return self._channel.queue_declare(queue=self.queue_name, passive=True).method.message_count
+
+    def wait_for_flow_control(self):
+        # Blocked and unblocked notifications are only dispatched while the blocking connection processes events
+        self._connection.process_data_events(time_limit=0)
+        while self.connection_blocked:
+            self._connection.sleep(self.FLOW_CONTROL_POLL_INTERVAL)
+
+        if self.queue_high_water_mark:
+            self._wait_for_queue_below_high_water_mark()
+
+    def _wait_for_queue_below_high_water_mark(self):
+        queue_depth = self.queue_depth()
+        if queue_depth < self.queue_high_water_mark:
+            return
+
+        logger.warning(f'Queue {self.queue_name} depth {queue_depth} reached high water mark '
+                       f'{self.queue_high_water_mark}, pausing publishing')
+        low_water_mark = int(self.queue_high_water_mark * self.QUEUE_LOW_WATER_MARK_RATIO)
+        while queue_depth > low_water_mark:
+            self._connection.sleep(self.FLOW_CONTROL_POLL_INTERVAL)
+            queue_depth = self.queue_depth()
+        logger.info(f'Queue {self.queue_name} depth {queue_depth} is below {low_water_mark}, resuming publishing')
+
+    def _on_connection_blocked(self, _connection, method_frame):
+        self.connection_blocked = True
+        self._connection_blocked_time = time.monotonic()
+        logger.warning(f'Connection blocked by the broker: {method_frame.method.reason}')
+
+    def _on_connection_unblocked(self, _connection, _method_frame):
+        self.connection_blocked = False
+        logger.warning(f'Connection unblocked by the broker after '
+                       f'{time.monotonic() - self._connection_blocked_time:.1f} seconds')
+
+    def _basic_publish(self, body, content_type, **kwargs):
         self._channel.basic_publish(exchange=self._exchange,
                                     routing_key=self.queue_name,
-                                    body=message,
+                                    body=body,
                                     properties=pika.BasicProperties(content_type=content_type,
-                                                                    delivery_mode=PERSISTENT_DELIVERY_MODE))
+                                                                    delivery_mode=PERSISTENT_DELIVERY_MODE),
+                                    **kwargs)
+
+    def _enable_publisher_confirms(self):
+        # The blocking channel's own confirm mode waits for every single confirm, so the asynchronous
+        # channel underneath it is put into confirm mode with its public confirm_delivery instead and
+        # confirms are consumed from the window
+        channel = _asynchronous_channel(self._channel)
+        channel.confirm_delivery(ack_nack_callback=self._on_delivery_confirmation,
+                                 callback=self._on_confirm_select_ok)
+        channel.add_on_return_callback(self._on_message_returned)
+        self._wait_for(lambda: self._confirm_selected)
+
+    def _wait_for(self, condition):
+        # Callbacks on the asynchronous channel aren't blocking connection events, so they don't end
+        # process_data_events themselves. Once one of them meets the condition it schedules a no-op with
+        # add_callback_threadsafe, which is a blocking connection event
+        self._wake_condition = condition
+        try:
+            while not condition():
+                self._connection.process_data_events(time_limit=None)
+        finally:
+            self._wake_condition = None
+
+    def _wake_if_waited_for(self):
+        if self._wake_condition is not None and self._wake_condition():
+            self._connection.add_callback_threadsafe(lambda: None)
+
+    def _on_confirm_select_ok(self, _method_frame):
+        self._confirm_selected = True
+        self._wake_if_waited_for()
+
+    def _publish_pending_message(self, pending_message: PendingMessage):
+        self._delivery_tag += 1
+        self._unconfirmed[self._delivery_tag] = pending_message
+        self._basic_publish(pending_message.body, pending_message.content_type, mandatory=True)
+
+    def _wait_for_unconfirmed_below(self, max_unconfirmed):
+        while True:
+            self._republish_rejected_messages()
+            if len(self._unconfirmed) < max_unconfirmed:
+                return
+            self._wait_for(lambda: len(self._unconfirmed) < max_unconfirmed or self._republish_queue)
+
+    def _republish_rejected_messages(self):
+        while self._republish_queue:
+            rejected_message = self._republish_queue.pop(0)
+            if rejected_message.attempts >= self.MAX_PUBLISH_ATTEMPTS:
+                raise RabbitDeliveryNotConfirmedError(
+                    f'Message was not confirmed after {rejected_message.attempts} attempts: {rejected_message.body}')
+            self._publish_pending_message(rejected_message._replace(attempts=rejected_message.attempts + 1))
+
+    def _on_delivery_confirmation(self, method_frame):
+        confirmation = method_frame.method
+        if confirmation.multiple:
+            while self._unconfirmed and next(iter(self._unconfirmed)) <= confirmation.delivery_tag:
+                self._confirm_delivery(next(iter(self._unconfirmed)), confirmation)
+        elif confirmation.delivery_tag in self._unconfirmed:
+            self._confirm_delivery(confirmation.delivery_tag, confirmation)
+        self._wake_if_waited_for()
+
+    def _confirm_delivery(self, delivery_tag, confirmation):
+        pending_message = self._unconfirmed.pop(delivery_tag)
+        if isinstance(confirmation, Basic.Nack) or delivery_tag in self._returned_delivery_tags:
+            self._returned_delivery_tags.discard(delivery_tag)
+            logger.warning(f'Message with delivery tag {delivery_tag} was rejected by the broker, republishing')
+            self._republish_queue.append(pending_message)
+        else:
+            self.confirmed_count += 1
+
+    def _on_message_returned(self, _channel, method, _properties, body):
+        # The broker sends the return before the ack of the same message, so the returned message is the oldest
+        # unconfirmed one with the same body that has not been returned yet
+        for delivery_tag, pending_message in self._unconfirmed.items():
+            if pending_message.body == body and delivery_tag not in self._returned_delivery_tags:
+                logger.warning(f'Message with delivery tag {delivery_tag} was returned by the broker: '
+                               f'{method.reply_code} {method.reply_text}')
+                self._returned_delivery_tags.add(delivery_tag)
+                return
+
+
+def _asynchronous_channel(blocking_channel):
+    # pika has no public way to get the channel a blocking channel wraps, this is the only pika internal relied on
+    try:
+        return blocking_channel._impl
+    except AttributeError:
+        raise RuntimeError(f'Windowed publisher confirms need the channel underneath pika\'s blocking channel, '
+                           f'which pika {pika.__version__} does not expose') from None
@@ -0,0 +1,104 @@
+import csv
+import logging
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Sequence
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+RatePhase = namedtuple('RatePhase', ('phase', 'duration', 'start_rate', 'end_rate'))
+
+PHASES = {'ramp', 'steady', 'burst'}
+
+
+class RateProfile:
+
+    def __init__(self, phases: Sequence[RatePhase]):
+        if not phases:
+            raise ValueError('Rate profile must have at least one phase')
+        self.phases = phases
+
+    @classmethod
+    def constant(cls, rate):
+        return cls([RatePhase('steady', float('inf'), rate, rate)])
+
+    def rate_at(self, elapsed):
+        # Once the profile has finished the final rate is kept until the sample file runs out
+        phase_start = 0
+        for phase in self.phases:
+            if elapsed < phase_start + phase.duration:
+                progress = (elapsed - phase_start) / phase.duration
+                return phase, phase.start_rate + (phase.end_rate - phase.start_rate) * progress
+            phase_start += phase.duration
+        return self.phases[-1], self.phases[-1].end_rate
+
+
+def read_rate_profile(rate_profile_path: Path) -> RateProfile:
+    phases = []
+    with open(rate_profile_path) as rate_profile_file:
+        for line_number, row in enumerate(csv.DictReader(rate_profile_file), 2):
+            phase = row['Phase'].strip().lower()
+            if phase not in PHASES:
+                raise ValueError(f'Unknown rate profile phase "{phase}" on line {line_number}, '
+                                 f'expected one of {sorted(PHASES)}')
+            if phase == 'ramp' and not row['End Rate']:
+                raise ValueError(f'Ramp phase on line {line_number} must have an end rate')
+            start_rate = float(row['Start Rate'])
+            end_rate = float(row['End Rate']) if phase == 'ramp' else start_rate
+            if float(row['Duration']) <= 0 or start_rate <= 0 or end_rate <= 0:
+                raise ValueError(f'Rate profile phase on line {line_number} must have a positive duration and rates')
+            phases.append(RatePhase(phase, float(row['Duration']), start_rate, end_rate))
+    return RateProfile(phases)
+
+
+class TokenBucketRateLimiter:
+    BUCKET_SECONDS = 0.01
+
+    def __init__(self, rate_profile: RateProfile, log_interval=10, clock=time.monotonic, sleep=time.sleep):
+        self._rate_profile = rate_profile
+        self._log_interval = log_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._start = None
+
+    def acquire(self):
+        now = self._clock()
+        if self._start is None:
+            self._start_bucket(now)
+
+        # Tokens accrue continuously at the current target rate and the bucket holds up to BUCKET_SECONDS of them,
+        # so short stalls are caught up on without bursting and sleeps are long enough to be accurate
+        phase, rate = self._add_tokens(now)
+        if self._tokens < 1:
+            self._sleep((1 - self._tokens) / rate)
+            now = self._clock()
+            phase, rate = self._add_tokens(now)
+        self._tokens = max(self._tokens - 1, 0)
+
+        if now - self._interval_start >= self._log_interval:
+            self._log_interval_rate(now, phase)
+        self._interval_count += 1
+
+    def _start_bucket(self, now):
+        self._start = self._last = self._interval_start = now
+        self._tokens = 1
+        self._interval_count = 0
+        self._interval_target = 0
+
+    def _add_tokens(self, now):
+        phase, rate = self._rate_profile.rate_at(now - self._start)
+        new_tokens = (now - self._last) * rate
+        self._tokens = min(self._tokens + new_tokens, max(rate * self.BUCKET_SECONDS, 1))
+        self._interval_target += new_tokens
+        self._last = now
+        return phase, rate
+
+    def _log_interval_rate(self, now, phase):
+        elapsed = now - self._interval_start
+        logger.info(f'Achieved {self._interval_count / elapsed:.0f} msgs/sec against target '
+                    f'{self._interval_target / elapsed:.0f} msgs/sec in {phase.phase} phase')
+        self._interval_start = now
+        self._interval_count = 0
+        self._interval_target = 0
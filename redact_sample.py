@@ -6,6 +6,7 @@ import sys
 from typing import Iterable
 from pathlib import Path
 
+from compressed_file import COMPRESSION_SUFFIXES, open_sample_file, strip_compression_suffix
 from generate_sample_file import SampleGenerator
 
 logger = logging.getLogger(__name__)
@@ -28,11 +29,12 @@ def parse_arguments():
     parser.add_argument('sample_file_path', help='path to the sample file', type=str)
     parser.add_argument('--redact-htc-only', help="redact HTC values only", default=False, action='store_true',
                         required=False)
+    parser.add_argument('--compress', help='compress the redacted file', choices=COMPRESSION_SUFFIXES.keys())
     return parser.parse_args()
 
 
 def redact_sample_file(sample_file_path: int, output_file_path: Path,  redact_htc_only: bool):
-    with open(sample_file_path) as sample_file:
+    with open_sample_file(sample_file_path) as sample_file:
         _redact_sample(sample_file, output_file_path, redact_htc_only)
 
 
@@ -44,7 +46,7 @@ def _redact_sample(sample_file: Iterable[str], output_file_path: Path, redact_ht
 def _redact_sample_units(sample_file_reader: Iterable[str], output_file_path: Path, redact_htc_only: bool):
     logger.info('Redacting sample...')
 
-    with open(output_file_path, 'w', newline='') as output_file:
+    with open_sample_file(output_file_path, 'w', newline='') as output_file:
         writer = csv.DictWriter(output_file, fieldnames=SampleGenerator.FIELDNAMES)
         writer.writeheader()
 
@@ -106,9 +108,11 @@ def _write_row(writer: csv.DictWriter, sample_row: dict):
         'PRINT_BATCH': sample_row['PRINT_BATCH']})
 
 
-def create_output_path(sample_file_path: Path, redact_htc_only: bool) -> Path:
+def create_output_path(sample_file_path: Path, redact_htc_only: bool, compression: str = None) -> Path:
     file_name_suffix = '_redacted.csv' if not redact_htc_only else '_redacted_htc_only.csv'
-    redacted_file_name = f'{Path(sample_file_path).stem}{file_name_suffix}'
+    if compression:
+        file_name_suffix += COMPRESSION_SUFFIXES[compression]
+    redacted_file_name = f'{strip_compression_suffix(sample_file_path).stem}{file_name_suffix}'
     output_file_path = Path('sample_files').joinpath(redacted_file_name)
     return output_file_path
 
@@ -118,7 +122,7 @@ def main():
     logging.basicConfig(handlers=[logging.StreamHandler(sys.stdout)], level=log_level or logging.ERROR)
     logger.setLevel(log_level or logging.INFO)
     args = parse_arguments()
-    output_file_path = create_output_path(args.sample_file_path, args.redact_htc_only)
+    output_file_path = create_output_path(args.sample_file_path, args.redact_htc_only, args.compress)
     redact_sample_file(args.sample_file_path, output_file_path, args.redact_htc_only)
 
 
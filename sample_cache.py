@@ -0,0 +1,102 @@
+import base64
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import google_crc32c
+from google.cloud import storage
+
+
+class SampleCache:
+    # Keeps downloaded sample files on the persistent volume keyed by their size and checksum, so the same object is
+    # only downloaded once however it is named. The index records when each file was last used and the least
+    # recently used files are evicted to keep the cache within max_bytes
+    INDEX_FILE_NAME = 'index.json'
+    LOCK_FILE_NAME = 'index.lock'
+    CHECKSUM_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, cache_directory, max_bytes, clock=time.time):
+        self.cache_directory = Path(cache_directory)
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._objects_directory = self.cache_directory.joinpath('objects')
+        self._objects_directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def cache_key(blob: storage.Blob):
+        if not blob.crc32c:
+            return None
+        return f'{blob.size}-crc32c-{base64.b64decode(blob.crc32c).hex()}'
+
+    def can_cache(self, blob: storage.Blob) -> bool:
+        return self.cache_key(blob) is not None and blob.size <= self.max_bytes
+
+    def object_path(self, blob: storage.Blob) -> Path:
+        return self._objects_directory.joinpath(self.cache_key(blob))
+
+    def get(self, blob: storage.Blob):
+        # A cached file that is missing or no longer matches the size and checksum of its key is dropped as a miss
+        key = self.cache_key(blob)
+        with self._index() as index:
+            if key not in index:
+                return None
+            if not self._is_intact(blob):
+                self._remove(index, key)
+                return None
+            index[key]['last_used'] = self._clock()
+            return self.object_path(blob)
+
+    def reserve(self, blob: storage.Blob):
+        # Called before the object is downloaded to object_path, so the space it needs is freed before it is used
+        key = self.cache_key(blob)
+        with self._index() as index:
+            index.pop(key, None)
+            self._evict(index, self.max_bytes - blob.size)
+
+    def add(self, blob: storage.Blob):
+        # Called once the object has been downloaded to object_path
+        key = self.cache_key(blob)
+        with self._index() as index:
+            index[key] = {'bucket': blob.bucket.name, 'name': blob.name, 'generation': blob.generation,
+                          'size': blob.size, 'last_used': self._clock()}
+
+    def _evict(self, index, max_bytes):
+        cached_bytes = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda cached_key: index[cached_key]['last_used']):
+            if cached_bytes <= max_bytes:
+                return
+            cached_bytes -= self._remove(index, key)['size']
+
+    def _remove(self, index, key):
+        # Path.unlink only takes missing_ok from Python 3.8
+        try:
+            self._objects_directory.joinpath(key).unlink()
+        except FileNotFoundError:
+            pass
+        return index.pop(key)
+
+    def _is_intact(self, blob: storage.Blob) -> bool:
+        object_path = self.object_path(blob)
+        if not object_path.exists() or object_path.stat().st_size != blob.size:
+            return False
+        checksum = google_crc32c.Checksum()
+        with open(object_path, 'rb') as object_file:
+            for block in iter(lambda: object_file.read(self.CHECKSUM_BUFFER_SIZE), b''):
+                checksum.update(block)
+        return base64.b64encode(checksum.digest()).decode() == blob.crc32c
+
+    @contextmanager
+    def _index(self):
+        # The index is locked so loader pods sharing the volume can't interleave updates, and written to a temporary
+        # file then renamed into place so a crash mid write can't corrupt it
+        index_path = self.cache_directory.joinpath(self.INDEX_FILE_NAME)
+        with open(self.cache_directory.joinpath(self.LOCK_FILE_NAME), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = json.loads(index_path.read_text()) if index_path.exists() else {}
+            yield index
+            temporary_path = index_path.with_name(f'{index_path.name}.tmp')
+            temporary_path.write_text(json.dumps(index, indent=2))
+            os.replace(temporary_path, index_path)
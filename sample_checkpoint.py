@@ -0,0 +1,54 @@
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from exceptions import SampleCheckpointError
+
+# row_count is the number of sample units loaded and file_row_count the number of rows of the sample file before the
+# byte offset, counting the header and skipping blank lines. The size and modification time of the sample file tie a
+# checkpoint to the file contents it was saved for, checkpoints saved without them are never resumed from
+Checkpoint = namedtuple('Checkpoint', ('byte_offset', 'row_count', 'file_row_count', 'collection_exercise_id',
+                                       'action_plan_id', 'file_size', 'file_modified_time_ns'), defaults=(None, None))
+
+
+def checkpoint_path(sample_file_path) -> Path:
+    sample_file_path = Path(sample_file_path)
+    return sample_file_path.with_name(f'{sample_file_path.name}.checkpoint')
+
+
+def start_checkpoint(sample_file_path, byte_offset, collection_exercise_id, action_plan_id) -> Checkpoint:
+    # The header is the first row counted
+    return Checkpoint(byte_offset, 0, 1, collection_exercise_id, action_plan_id, *_file_fingerprint(sample_file_path))
+
+
+def read_checkpoint(sample_file_path, collection_exercise_id, action_plan_id) -> Checkpoint:
+    try:
+        checkpoint = Checkpoint(**json.loads(checkpoint_path(sample_file_path).read_text()))
+    except FileNotFoundError:
+        raise SampleCheckpointError(f'No checkpoint found to resume loading {sample_file_path} from')
+    except TypeError:
+        raise SampleCheckpointError(f'Checkpoint for {sample_file_path} was saved by a different version of the loader')
+    if (checkpoint.collection_exercise_id, checkpoint.action_plan_id) != (collection_exercise_id, action_plan_id):
+        raise SampleCheckpointError(f'Checkpoint for {sample_file_path} belongs to collection exercise '
+                                    f'{checkpoint.collection_exercise_id} and action plan {checkpoint.action_plan_id}')
+    if (checkpoint.file_size, checkpoint.file_modified_time_ns) != _file_fingerprint(sample_file_path):
+        raise SampleCheckpointError(f'{sample_file_path} has changed since its checkpoint was saved, '
+                                    f'refusing to resume from byte {checkpoint.byte_offset}')
+    if checkpoint.byte_offset > os.path.getsize(sample_file_path):
+        raise SampleCheckpointError(f'Checkpoint byte offset {checkpoint.byte_offset} is beyond the end of '
+                                    f'{sample_file_path}')
+    return checkpoint
+
+
+def write_checkpoint(sample_file_path, checkpoint: Checkpoint):
+    # Write to a temporary file and rename it over the old checkpoint so a crash mid write can't corrupt it
+    path = checkpoint_path(sample_file_path)
+    temporary_path = path.with_name(f'{path.name}.tmp')
+    temporary_path.write_text(json.dumps(checkpoint._asdict()))
+    os.replace(temporary_path, path)
+
+
+def _file_fingerprint(sample_file_path):
+    file_stat = os.stat(sample_file_path)
+    return file_stat.st_size, file_stat.st_mtime_ns
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import math
+from collections import Counter
+from itertools import compress, repeat
+from operator import eq
+
+PROFILE_COLUMNS = ('TREATMENT_CODE', 'ADDRESS_TYPE', 'ADDRESS_LEVEL', 'REGION', 'LAD', 'PRINT_BATCH',
+                   'CE_EXPECTED_CAPACITY', 'POSTCODE', 'UPRN')
+
+
+class DistinctCountSketch:
+    # A HyperLogLog sketch estimating the number of distinct values added to it, to within about 1% with the default
+    # 16384 registers of a byte each. Values are hashed with a 64 bit BLAKE2b, which unlike hash() is the same in every
+    # process so the sketches of worker processes can be merged. With 64 bits of hash, collisions are too rare to need
+    # the large range correction of 32 bit HyperLogLog however many distinct values there are
+    PRECISION = 14
+
+    def __init__(self, precision=PRECISION):
+        self.registers = bytearray(2 ** precision)
+        self._index_shift = 64 - precision
+
+    def add_values(self, values):
+        # Each value sets its register, picked by the top bits of its hash, to at least the position of the first set
+        # bit in the rest of the hash
+        registers, index_shift, rank_mask = self.registers, self._index_shift, (1 << self._index_shift) - 1
+        for value in values:
+            value_hash = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+            rank = index_shift + 1 - (value_hash & rank_mask).bit_length()
+            if rank > registers[value_hash >> index_shift]:
+                registers[value_hash >> index_shift] = rank
+
+    def update(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        register_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = alpha * register_count ** 2 / math.fsum(2.0 ** -rank for rank in self.registers)
+        empty_register_count = self.registers.count(0)
+        if estimate <= 2.5 * register_count and empty_register_count:
+            # Small counts are estimated more accurately from the number of registers still empty
+            estimate = register_count * math.log(register_count / empty_register_count)
+        return round(estimate)
+
+
+class SampleProfile:
+    # Counts of the rows of a sample file used to size the case service and print runs, built up while it is validated.
+    # Rows are added as tuples of their PROFILE_COLUMNS values and counted in batches a column at a time, so most of
+    # the counting runs in C
+    BATCH_SIZE = 1000
+
+    def __init__(self):
+        self.row_count = 0
+        self.treatment_codes = Counter()
+        self.address_types = Counter()
+        self.regions = Counter()
+        self.lads = Counter()
+        self.print_batches = Counter()
+        self.ce_expected_capacity_by_address_level = Counter()
+        self.ce_expected_capacity_by_treatment_code = Counter()
+        self.postcodes = DistinctCountSketch()
+        self.uprns = DistinctCountSketch()
+        self._pending_rows = []
+
+    def add(self, row_values):
+        self._pending_rows.append(row_values)
+        if len(self._pending_rows) >= self.BATCH_SIZE:
+            self.flush()
+
+    def add_rows(self, rows_values):
+        self._pending_rows.extend(rows_values)
+        if len(self._pending_rows) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._pending_rows:
+            return
+        (treatment_codes, address_types, address_levels, regions, lads, print_batches, ce_expected_capacities,
+         postcodes, uprns) = zip(*self._pending_rows)
+        self._pending_rows = []
+        self.row_count += len(treatment_codes)
+        self.treatment_codes.update(treatment_codes)
+        self.address_types.update(zip(address_types, address_levels))
+        self.regions.update(regions)
+        self.lads.update(lads)
+        self.print_batches.update(print_batches)
+        # Only the few CE rows are looked at one at a time
+        for address_level, treatment_code, ce_expected_capacity in compress(
+                zip(address_levels, treatment_codes, ce_expected_capacities), map(eq, address_types, repeat('CE'))):
+            if ce_expected_capacity and ce_expected_capacity.isdigit():
+                self.ce_expected_capacity_by_address_level[address_level] += int(ce_expected_capacity)
+                self.ce_expected_capacity_by_treatment_code[treatment_code] += int(ce_expected_capacity)
+        # Postcodes repeat across the rows of a batch, so each is only hashed once
+        self.postcodes.add_values(set(filter(None, postcodes)))
+        self.uprns.add_values(filter(None, uprns))
+
+    def update(self, other):
+        self.flush()
+        other.flush()
+        self.row_count += other.row_count
+        self.treatment_codes.update(other.treatment_codes)
+        self.address_types.update(other.address_types)
+        self.regions.update(other.regions)
+        self.lads.update(other.lads)
+        self.print_batches.update(other.print_batches)
+        self.ce_expected_capacity_by_address_level.update(other.ce_expected_capacity_by_address_level)
+        self.ce_expected_capacity_by_treatment_code.update(other.ce_expected_capacity_by_treatment_code)
+        self.postcodes.update(other.postcodes)
+        self.uprns.update(other.uprns)
+
+    def to_dict(self) -> dict:
+        self.flush()
+        address_types = {}
+        for (address_type, address_level), count in _sorted_items(self.address_types):
+            address_types.setdefault(address_type, {})[address_level] = count
+        return {
+            'row_count': self.row_count,
+            'treatment_codes': _sorted_counts(self.treatment_codes),
+            'address_types': address_types,
+            'regions': _sorted_counts(self.regions),
+            'lads': _sorted_counts(self.lads),
+            'print_batches': _sorted_counts(self.print_batches),
+            'ce_expected_capacity': {
+                'total': sum(self.ce_expected_capacity_by_address_level.values()),
+                'by_address_level': _sorted_counts(self.ce_expected_capacity_by_address_level),
+                'by_treatment_code': _sorted_counts(self.ce_expected_capacity_by_treatment_code)},
+            'approximate_distinct_postcodes': self.postcodes.estimate(),
+            'approximate_distinct_uprns': self.uprns.estimate()}
+
+    def write(self, profile_file_path):
+        with open(profile_file_path, 'w') as profile_file:
+            json.dump(self.to_dict(), profile_file, indent=2)
+            profile_file.write('\n')
+
+
+def _sorted_counts(counter) -> dict:
+    return dict(_sorted_items(counter))
+
+
+def _sorted_items(counter):
+    # Rows with missing values count them as None, which can't be sorted with strings
+    return sorted(counter.items(), key=lambda item: str(item[0]))
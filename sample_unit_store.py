@@ -0,0 +1,58 @@
+import os
+from pathlib import Path
+
+import redis
+
+
+class RedisSampleUnitStore:
+
+    def __init__(self, batch_size=1000, redis_client=None, **kwargs):
+        self._host = kwargs.get('host') or os.getenv('REDIS_SERVICE_HOST', 'localhost')
+        self._port = kwargs.get('port') or os.getenv('REDIS_SERVICE_PORT', '6379')
+        self._db = kwargs.get('db') or os.getenv('REDIS_DB', '0')
+        self._redis = redis_client
+        self._batch_size = batch_size
+        self._batch = {}
+        self.stored_count = 0
+
+    def __enter__(self):
+        if self._redis is None:
+            self._redis = redis.Redis(host=self._host, port=int(self._port), db=int(self._db))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, key, sample_unit_json):
+        self._batch[key] = sample_unit_json
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        # Each batch is written with a single MSET so there is one round trip per batch rather than per sample unit
+        if self._batch:
+            self._redis.mset(self._batch)
+            self.stored_count += len(self._batch)
+            self._batch = {}
+
+
+class JsonlSampleUnitStore:
+
+    def __init__(self, sample_unit_file_path: Path):
+        self._sample_unit_file_path = sample_unit_file_path
+        self.stored_count = 0
+
+    def __enter__(self):
+        self._sample_unit_file = open(self._sample_unit_file_path, 'a')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._sample_unit_file.close()
+
+    def add(self, _key, sample_unit_json):
+        self._sample_unit_file.write(sample_unit_json + '\n')
+        self.stored_count += 1
+
+    def flush(self):
+        self._sample_unit_file.flush()
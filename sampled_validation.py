@@ -0,0 +1,139 @@
+import csv
+import io
+import math
+import os
+import random
+from collections import namedtuple
+
+READ_SIZE = 8 * 1024
+# The z score of a 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+FailureRateEstimate = namedtuple('FailureRateEstimate', ('column', 'failing_rows', 'rate', 'lower', 'upper',
+                                                         'example'))
+
+
+def read_rows_at_random_offsets(sample_file_path, row_count, field_count, random_generator=random):
+    # Yields the csv values and length in bytes of the row at each of row_count random byte offsets, in file order so
+    # the reads move forward through the file. Rows that can't be parsed from their offset, such as when it lands in
+    # a quoted line break, are yielded as None
+    with open(sample_file_path, 'rb') as sample_file:
+        sample_file.readline()
+        data_start = sample_file.tell()
+        file_size = os.fstat(sample_file.fileno()).st_size
+        if file_size <= data_start:
+            return
+        for offset in sorted(random_generator.randrange(data_start, file_size) for _ in range(row_count)):
+            yield _read_row_containing(sample_file, offset, data_start, field_count)
+
+
+def _read_row_containing(sample_file, offset, data_start, field_count):
+    # Backs up to the line break before the offset, then reads lines until the quotes balance
+    row_start = offset
+    while row_start > data_start:
+        window_start = max(data_start, row_start - READ_SIZE)
+        sample_file.seek(window_start)
+        line_break = sample_file.read(row_start - window_start).rfind(b'\n')
+        if line_break != -1:
+            row_start = window_start + line_break + 1
+            break
+        row_start = window_start
+
+    sample_file.seek(row_start)
+    row_bytes = sample_file.readline()
+    while row_bytes.count(b'"') % 2:
+        line = sample_file.readline()
+        if not line:
+            return None
+        row_bytes += line
+
+    try:
+        row = next(csv.reader(io.StringIO(row_bytes.decode('utf-8'), newline=''), delimiter=','), None)
+    except (UnicodeDecodeError, csv.Error):
+        return None
+    if not row or len(row) != field_count:
+        return None
+    return row, len(row_bytes)
+
+
+class FailureRateEstimator:
+    # A row is read with a probability proportional to its length in bytes, so each row is weighted by the inverse of
+    # its length to estimate the share of rows failing. The confidence intervals are Wilson score intervals over the
+    # effective sample size of the weights
+    ANY_COLUMN = 'any column'
+
+    def __init__(self, columns, data_size):
+        self.data_size = data_size
+        self.sampled_row_count = 0
+        self.skipped_row_count = 0
+        self._total_weight = 0.0
+        self._total_squared_weight = 0.0
+        self._failing_rows = dict.fromkeys((self.ANY_COLUMN, *columns), 0)
+        self._failing_weights = dict.fromkeys((self.ANY_COLUMN, *columns), 0.0)
+        self._examples = {}
+
+    def add(self, row_length, failures):
+        weight = 1 / row_length
+        self.sampled_row_count += 1
+        self._total_weight += weight
+        self._total_squared_weight += weight * weight
+        failing_columns = {failure.column for failure in failures}
+        if failing_columns:
+            failing_columns.add(self.ANY_COLUMN)
+        for failure in failures:
+            self._examples.setdefault(failure.column, str(failure.description))
+        for column in failing_columns:
+            self._failing_rows[column] += 1
+            self._failing_weights[column] += weight
+
+    @property
+    def failing_row_count(self):
+        return self._failing_rows[self.ANY_COLUMN]
+
+    def add_skipped_row(self):
+        self.skipped_row_count += 1
+
+    def estimated_row_count(self):
+        # The mean inverse length of rows sampled by length estimates the number of rows per byte
+        if not self.sampled_row_count:
+            return 0
+        return round(self.data_size * self._total_weight / self.sampled_row_count)
+
+    def estimates(self) -> list:
+        # The estimated failure rate of every column with failures, then of rows failing in any column
+        if not self.sampled_row_count:
+            return []
+        effective_sample_size = self._total_weight ** 2 / self._total_squared_weight
+        estimates = []
+        for column, failing_weight in self._failing_weights.items():
+            if column != self.ANY_COLUMN and not failing_weight:
+                continue
+            rate = failing_weight / self._total_weight
+            estimates.append(FailureRateEstimate(column, self._failing_rows[column], rate,
+                                                 *wilson_interval(rate, effective_sample_size),
+                                                 self._examples.get(column)))
+        return estimates[1:] + estimates[:1]
+
+    def summary_lines(self) -> list:
+        lines = [f'Sampled {self.sampled_row_count} rows of an estimated {self.estimated_row_count()}'
+                 + (f', skipped {self.skipped_row_count} which could not be read from their offset'
+                    if self.skipped_row_count else '')]
+        for estimate in self.estimates():
+            lines.append(f'{estimate.column}: {estimate.failing_rows} sampled row(s) failed, estimated failure rate '
+                         f'{estimate.rate:.3%} (95% CI {estimate.lower:.3%} - {estimate.upper:.3%})'
+                         + (f', e.g. {estimate.example}' if estimate.example else ''))
+        return lines
+
+
+def wilson_interval(rate, sample_size, z=CONFIDENCE_Z):
+    denominator = 1 + z * z / sample_size
+    centre = (rate + z * z / (2 * sample_size)) / denominator
+    half_width = z / denominator * math.sqrt(rate * (1 - rate) / sample_size + z * z / (4 * sample_size ** 2))
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def sample_data_size(sample_file_path):
+    # The size of the sample file after its header row
+    with open(sample_file_path, 'rb') as sample_file:
+        sample_file.readline()
+        return os.fstat(sample_file.fileno()).st_size - sample_file.tell()
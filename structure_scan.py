@@ -0,0 +1,160 @@
+import mmap
+import os
+from collections import namedtuple
+from itertools import repeat
+
+ENCODING_RULE = 'encoding'
+FIELD_COUNT_RULE = 'field_count'
+QUOTES_RULE = 'quotes'
+LINE_ENDING_RULE = 'line_ending'
+
+# Small enough for each block and the structure left of it to stay in the CPU cache
+BLOCK_SIZE = 256 * 1024
+# A quoted field still open after this many lines is taken to be missing its closing quote, rather than reading the
+# rest of the file as one row
+MAX_ROW_LINES = 100
+
+CARRIAGE_RETURN = b'\r'
+NOT_STRUCTURE_BYTES = bytes(byte for byte in range(256) if byte not in b'",\r\n')
+
+StructureFailure = namedtuple('StructureFailure', ('line_number', 'byte_offset', 'description', 'rule'))
+
+
+def scan_sample_file(sample_file_path, block_size=BLOCK_SIZE, max_row_lines=MAX_ROW_LINES):
+    # Yields a StructureFailure for every row of the file which isn't utf-8, has a different number of fields to the
+    # header, has a quoted field which is never closed, or doesn't end with the header's line ending. Rows are numbered
+    # as the validator numbers them, from 1 for the header and skipping blank lines, and the byte offset is that of the
+    # failing byte in the file
+    with open(sample_file_path, 'rb') as sample_file:
+        if not os.fstat(sample_file.fileno()).st_size:
+            return
+        with mmap.mmap(sample_file.fileno(), 0, access=mmap.ACCESS_READ) as sample_data:
+            yield from _StructureScanner(sample_data, block_size, max_row_lines).scan()
+
+
+class _StructureScanner:
+    # Blocks of whole lines are first checked all at once with bytes methods that run in C. Every byte but quotes,
+    # commas and line breaks is dropped from a block, then the quoted text, which leaves the same run of commas and
+    # line ending for every row of a block with no failures. Only blocks that don't pass are scanned a row at a time
+    # to find their failures, and to follow quoted line breaks which carry a row on into the next block
+
+    def __init__(self, sample_data, block_size, max_row_lines):
+        self.sample_data = sample_data
+        self.block_size = block_size
+        self.max_row_lines = max_row_lines
+        self.row_number = 1
+        self.field_count = None
+        self.line_ending = None
+        self.row_structure = None
+
+    def scan(self):
+        sample_data = self.sample_data
+        header_end = self._line_end(0)
+        header = sample_data[:header_end]
+        self.line_ending = b'\r\n' if header.endswith(b'\r\n') else b'\n'
+        self.field_count = _count_unquoted_commas(header) + 1
+        self.row_structure = b',' * (self.field_count - 1) + self.line_ending
+        yield from self._find_row_failures(0, header, header_end)
+
+        position = header_end
+        while position < len(sample_data):
+            block_end = sample_data.rfind(b'\n', position, position + self.block_size) + 1 or self._line_end(position)
+            row_count = self._count_valid_rows(sample_data[position:block_end])
+            if row_count is not None:
+                self.row_number += row_count
+                position = block_end
+                continue
+            position = yield from self._scan_rows(position, block_end)
+
+    def _count_valid_rows(self, block):
+        # The number of rows in the block, or None if it has any failures or ends in a quoted field
+        if not block.isascii():
+            try:
+                block.decode('utf-8')
+            except UnicodeDecodeError:
+                return None
+        structure = block.translate(None, NOT_STRUCTURE_BYTES)
+        if b'"' in structure:
+            quote_parts = structure.split(b'"')
+            if not len(quote_parts) % 2:
+                return None
+            structure = b''.join(quote_parts[::2])
+        row_count, remainder = divmod(len(structure), len(self.row_structure))
+        if remainder or structure != self.row_structure * row_count:
+            return None
+        return row_count
+
+    def _scan_rows(self, position, block_end):
+        # Scans the rows from position until one ends at or after the end of the block, and returns where it ended
+        sample_data = self.sample_data
+        while position < block_end:
+            row_end, quote_count, line_count = position, 0, 0
+            while True:
+                line_start, row_end = row_end, self._line_end(row_end)
+                quote_count += sample_data[line_start:row_end].count(b'"')
+                line_count += 1
+                if not quote_count % 2 or row_end == len(sample_data) or line_count == self.max_row_lines:
+                    break
+            if quote_count % 2:
+                # Carry on from the next line, so one missing quote doesn't hide the failures of the rows after it
+                self.row_number += 1
+                yield StructureFailure(self.row_number, position,
+                                       f'Quoted field is not closed within {line_count} line(s)', QUOTES_RULE)
+                position = self._line_end(position)
+                continue
+            row = sample_data[position:row_end]
+            if row.strip(b'\r\n'):
+                self.row_number += 1
+                yield from self._find_row_failures(position, row, row_end)
+            position = row_end
+        return position
+
+    def _find_row_failures(self, row_start, row, row_end):
+        try:
+            row.decode('utf-8')
+        except UnicodeDecodeError as err:
+            yield StructureFailure(self.row_number, row_start + err.start,
+                                   f'Invalid file encoding, requires utf-8, byte 0x{row[err.start]:02x} at byte offset '
+                                   f'{row_start + err.start} is not valid utf-8', ENCODING_RULE)
+
+        line_ending = b'\r\n' if row.endswith(b'\r\n') else b'\n' if row.endswith(b'\n') else b''
+        carriage_return = _find_unquoted_carriage_return(row[:len(row) - len(line_ending)])
+        if carriage_return != -1:
+            yield StructureFailure(self.row_number, row_start + carriage_return,
+                                   f'Line break {_describe_line_ending(CARRIAGE_RETURN)} at byte offset '
+                                   f'{row_start + carriage_return}, expected '
+                                   f'{_describe_line_ending(self.line_ending)} like the header', LINE_ENDING_RULE)
+        elif line_ending and line_ending != self.line_ending:
+            yield StructureFailure(self.row_number, row_end - len(line_ending),
+                                   f'Line ends with {_describe_line_ending(line_ending)} at byte offset '
+                                   f'{row_end - len(line_ending)}, expected {_describe_line_ending(self.line_ending)} '
+                                   f'like the header', LINE_ENDING_RULE)
+
+        field_count = _count_unquoted_commas(row) + 1
+        if field_count != self.field_count:
+            yield StructureFailure(self.row_number, row_start,
+                                   f'Row has {field_count} field(s), expected {self.field_count} like the header',
+                                   FIELD_COUNT_RULE)
+
+    def _line_end(self, position) -> int:
+        return self.sample_data.find(b'\n', position) + 1 or len(self.sample_data)
+
+
+def _count_unquoted_commas(row) -> int:
+    # Quotes in a field are escaped by doubling them, so the text outside quotes is every other part between quotes
+    if b'"' not in row:
+        return row.count(b',')
+    return sum(map(bytes.count, row.split(b'"')[::2], repeat(b',')))
+
+
+def _find_unquoted_carriage_return(row) -> int:
+    position = 0
+    for index, part in enumerate(row.split(b'"')):
+        if not index % 2 and CARRIAGE_RETURN in part:
+            return position + part.index(CARRIAGE_RETURN)
+        position += len(part) + 1
+    return -1
+
+
+def _describe_line_ending(line_ending):
+    return repr(line_ending.decode())
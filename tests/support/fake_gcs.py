@@ -0,0 +1,274 @@
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, unquote, urlparse
+
+import google_crc32c
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import storage
+
+BUCKET_PATH = re.compile(r'^/storage/v1/b/(?P<bucket>[^/]+)$')
+OBJECT_PATH = re.compile(r'^(?:/download)?/storage/v1/b/(?P<bucket>[^/]+)/o/(?P<name>[^/]+)$')
+UPLOAD_PATH = re.compile(r'^/upload/storage/v1/b/(?P<bucket>[^/]+)/o$')
+COMPOSE_PATH = re.compile(r'^/storage/v1/b/(?P<bucket>[^/]+)/o/(?P<name>[^/]+)/compose$')
+CONTENT_RANGE_HEADER = re.compile(r'^bytes (?:(?P<start>\d+)-(?P<end>\d+)|\*)/(?P<total>\d+|\*)$')
+RANGE_HEADER = re.compile(r'^bytes=(?P<start>\d+)-(?P<end>\d*)$')
+
+
+class FakeGcsServer:
+    # A loopback HTTP server speaking just enough of the GCS JSON API for the storage client to fetch object
+    # metadata, download objects whole or by byte range, upload, compose and delete objects, objects are held in
+    # memory. Each download can be throttled to stream_bytes_per_second to stand in for the per-stream throughput limit
+    # of real GCS
+
+    def __init__(self, host='127.0.0.1', port=0, stream_bytes_per_second=None):
+        self._server = ThreadingHTTPServer((host, port), _FakeGcsRequestHandler)
+        self._server.daemon_threads = True
+        self._server.fake_gcs_server = self
+        self.host, self.port = self._server.server_address
+        self.blobs = {}
+        self.composite_blobs = set()
+        self.content_types = {}
+        self.download_ranges = []
+        self.upload_attempts = []
+        self.resumable_uploads = {}
+        self.stream_bytes_per_second = stream_bytes_per_second
+        self._failing_range_starts = Counter()
+        self._failing_uploads = set()
+        self._corrupting_uploads = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def endpoint(self):
+        return f'http://{self.host}:{self.port}'
+
+    def client(self):
+        return storage.Client(project='test', credentials=AnonymousCredentials(),
+                              client_options={'api_endpoint': self.endpoint})
+
+    @contextlib.contextmanager
+    def emulator_environment(self):
+        # Points storage clients created without arguments at this server. Older storage clients only take the
+        # endpoint from STORAGE_EMULATOR_HOST and still look for default credentials, so anonymous ones are given
+        with patch.dict(os.environ, {'STORAGE_EMULATOR_HOST': self.endpoint}), \
+                patch('google.auth.default', return_value=(AnonymousCredentials(), 'test')):
+            yield
+
+    def add_blob(self, bucket_name, blob_name, data: bytes, content_type=None):
+        self.blobs[(bucket_name, blob_name)] = data
+        self.composite_blobs.discard((bucket_name, blob_name))
+        self.content_types[(bucket_name, blob_name)] = content_type
+
+    def fail_next_download_from(self, start, times=1):
+        self._failing_range_starts[start] += times
+
+    def fail_next_upload_of(self, blob_name):
+        self._failing_uploads.add(blob_name)
+
+    def corrupt_next_upload_of(self, blob_name):
+        self._corrupting_uploads.add(blob_name)
+
+    def stored_upload_data(self, blob_name, data):
+        # Flips a bit of the uploaded data if the upload should be stored corrupted
+        with self._lock:
+            if blob_name not in self._corrupting_uploads or not data:
+                return data
+            self._corrupting_uploads.remove(blob_name)
+            return bytes([data[0] ^ 1]) + data[1:]
+
+    def record_upload(self, blob_name):
+        # Returns False if the upload should fail instead
+        with self._lock:
+            self.upload_attempts.append(blob_name)
+            if blob_name in self._failing_uploads:
+                self._failing_uploads.remove(blob_name)
+                return False
+            return True
+
+    def record_download(self, blob_name, start, end):
+        # Returns False if the download should fail instead
+        with self._lock:
+            if self._failing_range_starts[start]:
+                self._failing_range_starts[start] -= 1
+                return False
+            self.download_ranges.append((blob_name, start, end))
+            return True
+
+
+class _FakeGcsRequestHandler(BaseHTTPRequestHandler):
+    GENERATION = '1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        bucket_match = BUCKET_PATH.match(url.path)
+        if bucket_match:
+            return self._send_json(200, {'name': bucket_match['bucket']})
+        match = OBJECT_PATH.match(url.path)
+        data = match and self.server.fake_gcs_server.blobs.get((match['bucket'], unquote(match['name'])))
+        if data is None:
+            return self._send_not_found()
+        if parse_qs(url.query).get('alt') == ['media']:
+            return self._send_media(unquote(match['name']), data)
+        self._send_object(match['bucket'], unquote(match['name']))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        upload_match = UPLOAD_PATH.match(url.path)
+        compose_match = COMPOSE_PATH.match(url.path)
+        if upload_match and query.get('uploadType') == ['multipart']:
+            metadata, data, content_type = self._parse_multipart(body)
+            return self._complete_upload(upload_match['bucket'], metadata['name'], data, content_type)
+        if upload_match and query.get('uploadType') == ['resumable']:
+            return self._start_resumable_upload(upload_match['bucket'], json.loads(body or b'{}').get('name')
+                                                or query['name'][0], self.headers.get('X-Upload-Content-Type'))
+        if compose_match:
+            return self._compose(compose_match['bucket'], unquote(compose_match['name']), json.loads(body))
+        self._send_not_found()
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        upload = self.server.fake_gcs_server.resumable_uploads.get(parse_qs(url.query).get('upload_id', [''])[0])
+        if upload is None:
+            return self._send_not_found()
+        upload['data'] += body
+        total = CONTENT_RANGE_HEADER.match(self.headers['Content-Range'])['total']
+        if total == '*' or len(upload['data']) < int(total):
+            self.send_response(308)
+            if upload['data']:
+                self.send_header('Range', f'bytes=0-{len(upload["data"]) - 1}')
+            self.send_header('Content-Length', '0')
+            return self.end_headers()
+        self._complete_upload(upload['bucket'], upload['name'], upload['data'], upload['content_type'])
+
+    def do_DELETE(self):
+        match = OBJECT_PATH.match(urlparse(self.path).path)
+        fake_gcs_server = self.server.fake_gcs_server
+        if not match or fake_gcs_server.blobs.pop((match['bucket'], unquote(match['name'])), None) is None:
+            return self._send_not_found()
+        fake_gcs_server.composite_blobs.discard((match['bucket'], unquote(match['name'])))
+        fake_gcs_server.content_types.pop((match['bucket'], unquote(match['name'])), None)
+        self.send_response(204)
+        self.end_headers()
+
+    def _start_resumable_upload(self, bucket_name, blob_name, content_type):
+        upload_id = uuid.uuid4().hex
+        upload = {'bucket': bucket_name, 'name': blob_name, 'data': b'', 'content_type': content_type}
+        self.server.fake_gcs_server.resumable_uploads[upload_id] = upload
+        self.send_response(200)
+        self.send_header('Location', f'{self.server.fake_gcs_server.endpoint}/upload/storage/v1/b/{bucket_name}/o'
+                                     f'?uploadType=resumable&upload_id={upload_id}')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _complete_upload(self, bucket_name, blob_name, data, content_type):
+        if not self.server.fake_gcs_server.record_upload(blob_name):
+            return self._send_json(400, {'error': {'code': 400, 'message': 'Simulated upload failure'}})
+        self.server.fake_gcs_server.add_blob(bucket_name, blob_name,
+                                             self.server.fake_gcs_server.stored_upload_data(blob_name, data),
+                                             content_type)
+        self._send_object(bucket_name, blob_name)
+
+    def _compose(self, bucket_name, blob_name, request):
+        blobs = self.server.fake_gcs_server.blobs
+        source_names = [source['name'] for source in request['sourceObjects']]
+        if any((bucket_name, source_name) not in blobs for source_name in source_names):
+            return self._send_not_found()
+        # Like real GCS, the composed object only has the content type given in the request
+        self.server.fake_gcs_server.add_blob(
+            bucket_name, blob_name, b''.join(blobs[(bucket_name, source_name)] for source_name in source_names),
+            request.get('destination', {}).get('contentType'))
+        self.server.fake_gcs_server.composite_blobs.add((bucket_name, blob_name))
+        self._send_object(bucket_name, blob_name)
+
+    def _send_object(self, bucket_name, blob_name):
+        # Like real GCS, composite objects only have a CRC32C
+        data = self.server.fake_gcs_server.blobs[(bucket_name, blob_name)]
+        resource = {'bucket': bucket_name, 'name': blob_name, 'size': str(len(data)), 'generation': self.GENERATION,
+                    'crc32c': _encoded_crc32c(data)}
+        if (bucket_name, blob_name) not in self.server.fake_gcs_server.composite_blobs:
+            resource['md5Hash'] = _encoded_md5(data)
+        if self.server.fake_gcs_server.content_types.get((bucket_name, blob_name)):
+            resource['contentType'] = self.server.fake_gcs_server.content_types[(bucket_name, blob_name)]
+        self._send_json(200, resource)
+
+    def _parse_multipart(self, body):
+        boundary = self.headers['Content-Type'].split('boundary=')[1].strip('"').encode()
+        (_, metadata_part), (data_headers, data_part) = (part[2:-2].split(b'\r\n\r\n', 1)
+                                                         for part in body.split(b'--' + boundary)[1:-1])
+        content_type = re.search(rb'(?im)^content-type: *(.+)$', data_headers)
+        return json.loads(metadata_part), data_part, content_type and content_type[1].strip().decode()
+
+    def _send_media(self, name, data):
+        range_match = RANGE_HEADER.match(self.headers.get('Range', ''))
+        start = int(range_match['start']) if range_match else 0
+        end = int(range_match['end']) if range_match and range_match['end'] else len(data) - 1
+        if not self.server.fake_gcs_server.record_download(name, start, end):
+            return self._send_json(400, {'error': {'code': 400, 'message': 'Simulated download failure'}})
+        body = data[start:end + 1]
+        self.send_response(206 if range_match else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-goog-generation', self.GENERATION)
+        if range_match:
+            self.send_header('Content-Range', f'bytes {start}-{start + len(body) - 1}/{len(data)}')
+        else:
+            self.send_header('x-goog-hash', f'crc32c={_encoded_crc32c(data)},md5={_encoded_md5(data)}')
+        self.end_headers()
+        self._write_throttled(body)
+
+    def _write_throttled(self, body):
+        bytes_per_second = self.server.fake_gcs_server.stream_bytes_per_second
+        if not bytes_per_second:
+            return self.wfile.write(body)
+        piece_size = max(bytes_per_second // 100, 1)
+        for piece_start in range(0, len(body), piece_size):
+            self.wfile.write(body[piece_start:piece_start + piece_size])
+            time.sleep(piece_size / bytes_per_second)
+
+    def _send_not_found(self):
+        self._send_json(404, {'error': {'code': 404, 'message': 'No such object'}})
+
+    def _send_json(self, status, body):
+        encoded_body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def log_message(self, *_args):
+        pass
+
+
+def _encoded_md5(data):
+    return base64.b64encode(hashlib.md5(data).digest()).decode()
+
+
+def _encoded_crc32c(data):
+    return base64.b64encode(google_crc32c.Checksum(data).digest()).decode()
@@ -0,0 +1,196 @@
+import asyncio
+import socketserver
+import threading
+from collections import Counter
+
+from pika import frame, spec
+from pika.spec import FRAME_END_SIZE, FRAME_HEADER_SIZE
+
+SERVER_CAPABILITIES = {'publisher_confirms': True, 'basic.nack': True, 'connection.blocked': True}
+
+
+class InMemoryRabbitContext:
+    # Stands in for RabbitContext, keeping published messages in memory instead of sending them to a broker
+
+    def __init__(self, queue_name='in.memory', store_messages=False, **_kwargs):
+        self.queue_name = queue_name
+        self.confirm_window = 0
+        self.published_count = 0
+        self.confirmed_count = 0
+        self.published_bytes = 0
+        self.messages = [] if store_messages else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def publish_message(self, message, content_type):
+        self.published_count += 1
+        self.published_bytes += len(message)
+        if self.messages is not None:
+            self.messages.append((message, content_type))
+
+    def wait_for_confirms(self):
+        pass
+
+    def wait_for_flow_control(self):
+        pass
+
+
+class InMemoryAsyncRabbitContext(InMemoryRabbitContext):
+    # Stands in for AsyncRabbitContext, yielding to the event loop on every publish like the real one does
+
+    def __init__(self, queue_name='in.memory', store_messages=False, **_kwargs):
+        super().__init__(queue_name, store_messages)
+        self.channel_published_counts = Counter()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def publish_message(self, message, content_type, channel_index=0):
+        super().publish_message(message, content_type)
+        self.channel_published_counts[channel_index] += 1
+        await asyncio.sleep(0)
+
+
+class FakeAmqpServer:
+    # A loopback TCP server speaking just enough AMQP 0-9-1 for pika to connect, open channels, enable publisher
+    # confirms, declare queues and publish, every published message is acked and counted then dropped. Publishes with
+    # a delivery tag in nack_delivery_tags are nacked instead, to exercise republishing over a real connection
+
+    def __init__(self, host='127.0.0.1', port=0, store_messages=False, nack_delivery_tags=()):
+        self._server = _ThreadingTCPServer((host, port), _FakeAmqpConnectionHandler)
+        self._server.fake_amqp_server = self
+        self.host, self.port = self._server.server_address
+        self.published_count = 0
+        self.published_bytes = 0
+        self.messages = [] if store_messages else None
+        self.nack_delivery_tags = set(nack_delivery_tags)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def connection_kwargs(self):
+        return {'host': self.host, 'port': self.port}
+
+    def record_message(self, routing_key, properties, body):
+        with self._lock:
+            self.published_count += 1
+            self.published_bytes += len(body)
+            if self.messages is not None:
+                self.messages.append((routing_key, properties, body))
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _FakeAmqpConnectionHandler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self._buffer = bytearray()
+        self._confirm_channels = {}
+        self._publishing = {}
+        self._closed = False
+
+    def handle(self):
+        while not self._closed:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            self._buffer += data
+            # Frames are decoded from a copy of just their own bytes, and the decoded frames are dropped from the
+            # buffer once per receive, so decoding doesn't copy the rest of the buffer for every frame
+            responses, offset = [], 0
+            while not self._closed:
+                frame_end = _frame_end(self._buffer, offset)
+                if frame_end is None:
+                    break
+                _consumed, received_frame = frame.decode_frame(bytes(self._buffer[offset:frame_end]))
+                offset = frame_end
+                responses.extend(self._handle_frame(received_frame))
+            del self._buffer[:offset]
+            if responses:
+                self.request.sendall(b''.join(response.marshal() for response in responses))
+
+    def _handle_frame(self, received_frame):
+        if isinstance(received_frame, frame.ProtocolHeader):
+            return [frame.Method(0, spec.Connection.Start(server_properties={'capabilities': SERVER_CAPABILITIES},
+                                                          mechanisms='PLAIN', locales='en_US'))]
+        if isinstance(received_frame, frame.Method):
+            return self._handle_method(received_frame.channel_number, received_frame.method)
+        if isinstance(received_frame, frame.Header):
+            self._publishing[received_frame.channel_number].extend((received_frame.properties,
+                                                                    received_frame.body_size, []))
+            return self._complete_publish(received_frame.channel_number)
+        if isinstance(received_frame, frame.Body):
+            self._publishing[received_frame.channel_number][3].append(received_frame.fragment)
+            return self._complete_publish(received_frame.channel_number)
+        return []
+
+    def _handle_method(self, channel_number, method):
+        if isinstance(method, spec.Connection.StartOk):
+            return [frame.Method(0, spec.Connection.Tune(channel_max=2047, frame_max=131072, heartbeat=0))]
+        if isinstance(method, spec.Connection.Open):
+            return [frame.Method(0, spec.Connection.OpenOk())]
+        if isinstance(method, spec.Connection.Close):
+            self._closed = True
+            return [frame.Method(0, spec.Connection.CloseOk())]
+        if isinstance(method, spec.Channel.Open):
+            return [frame.Method(channel_number, spec.Channel.OpenOk())]
+        if isinstance(method, spec.Channel.Close):
+            return [frame.Method(channel_number, spec.Channel.CloseOk())]
+        if isinstance(method, spec.Confirm.Select):
+            self._confirm_channels[channel_number] = 0
+            return [] if method.nowait else [frame.Method(channel_number, spec.Confirm.SelectOk())]
+        if isinstance(method, spec.Queue.Declare):
+            return [frame.Method(channel_number, spec.Queue.DeclareOk(queue=method.queue, message_count=0,
+                                                                      consumer_count=0))]
+        if isinstance(method, spec.Basic.Publish):
+            self._publishing[channel_number] = [method.routing_key]
+        return []
+
+    def _complete_publish(self, channel_number):
+        routing_key, properties, body_size, fragments = self._publishing[channel_number]
+        if sum(map(len, fragments)) < body_size:
+            return []
+        del self._publishing[channel_number]
+        self.server.fake_amqp_server.record_message(routing_key, properties, b''.join(fragments))
+
+        if channel_number not in self._confirm_channels:
+            return []
+        self._confirm_channels[channel_number] += 1
+        delivery_tag = self._confirm_channels[channel_number]
+        if delivery_tag in self.server.fake_amqp_server.nack_delivery_tags:
+            return [frame.Method(channel_number, spec.Basic.Nack(delivery_tag=delivery_tag))]
+        return [frame.Method(channel_number, spec.Basic.Ack(delivery_tag=delivery_tag))]
+
+
+def _frame_end(buffer, offset):
+    # The end of the frame starting at offset, or None if the buffer doesn't hold all of it yet. Apart from the protocol
+    # header opening a connection, a frame is a 7 byte header ending in the payload size, the payload and an end byte
+    if buffer.startswith(b'AMQP', offset):
+        frame_end = offset + 8
+    elif len(buffer) - offset >= FRAME_HEADER_SIZE:
+        frame_end = offset + FRAME_HEADER_SIZE + int.from_bytes(buffer[offset + 3:offset + 7], 'big') + FRAME_END_SIZE
+    else:
+        return None
+    return frame_end if frame_end <= len(buffer) else None
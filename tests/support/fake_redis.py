@@ -0,0 +1,10 @@
+class FakeRedis:
+    # Stands in for a redis client, keeping the values written with mset in memory and the size of each write
+
+    def __init__(self):
+        self.store = {}
+        self.mset_sizes = []
+
+    def mset(self, mapping):
+        self.mset_sizes.append(len(mapping))
+        self.store.update(mapping)
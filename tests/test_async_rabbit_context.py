@@ -0,0 +1,104 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import patch
+
+from async_rabbit_context import AsyncRabbitContext
+from exceptions import RabbitConnectionClosedError
+from tests.support.fake_rabbit import FakeAmqpServer
+
+
+@patch('async_rabbit_context.pika')
+@patch('async_rabbit_context.AsyncioConnection')
+class TestAsyncRabbitContext(TestCase):
+
+    def test_context_manager_opens_connection_and_channels(self, patch_connection, _patch_pika):
+        open_connection_and_channels(patch_connection)
+
+        async def run():
+            async with AsyncRabbitContext(channels=3) as rabbit:
+                self.assertEqual(len(rabbit._channels), 3)
+
+        asyncio.run(run())
+
+        patch_connection.assert_called_once()
+        self.assertEqual(patch_connection.return_value.channel.call_count, 3)
+        patch_connection.return_value.close.assert_called_once()
+
+    def test_publish_message_round_robins_channels(self, patch_connection, patch_pika):
+        open_connection_and_channels(patch_connection)
+        patch_connection.return_value._transport.get_write_buffer_size.return_value = 0
+
+        async def run():
+            async with AsyncRabbitContext(channels=2) as rabbit:
+                for channel_index in range(4):
+                    await rabbit.publish_message('Test message body', 'text', channel_index=channel_index)
+                return rabbit
+
+        rabbit = asyncio.run(run())
+
+        patched_channel = patch_connection.return_value.channel.return_value
+        self.assertEqual(patched_channel.basic_publish.call_count, 4)
+        patched_channel.basic_publish.assert_called_with(exchange=rabbit._exchange,
+                                                         routing_key=rabbit.queue_name,
+                                                         body='Test message body',
+                                                         properties=patch_pika.BasicProperties.return_value)
+        patch_pika.BasicProperties.assert_called_with(content_type='text', delivery_mode=2)
+        self.assertEqual(rabbit.published_count, 4)
+
+    def test_publish_waits_while_write_buffer_is_full(self, patch_connection, _patch_pika):
+        open_connection_and_channels(patch_connection)
+        patch_connection.return_value._transport.get_write_buffer_size.side_effect = [
+            AsyncRabbitContext.WRITE_BUFFER_HIGH_WATER_MARK + 1, AsyncRabbitContext.WRITE_BUFFER_HIGH_WATER_MARK, 0]
+
+        async def run():
+            async with AsyncRabbitContext() as rabbit:
+                await rabbit.publish_message('Test message body', 'text')
+
+        asyncio.run(run())
+
+        self.assertEqual(patch_connection.return_value._transport.get_write_buffer_size.call_count, 2)
+
+    def test_attempt_to_publish_message_with_closed_connection_raises_correct_exception(
+            self, patch_connection, _patch_pika):
+        open_connection_and_channels(patch_connection)
+
+        async def run():
+            async with AsyncRabbitContext() as rabbit:
+                rabbit._connection.close()
+                await rabbit.publish_message('This should raise an exception', 'text')
+
+        with self.assertRaises(RabbitConnectionClosedError):
+            asyncio.run(run())
+
+
+class TestAsyncRabbitContextOverSocket(TestCase):
+    # The write buffer backpressure reads the transport of a real pika connection, which a mocked connection can't
+    # check is still there
+
+    def test_publish_messages(self):
+        async def run():
+            async with AsyncRabbitContext(channels=2, **fake_amqp_server.connection_kwargs()) as rabbit:
+                for message_number in range(10):
+                    await rabbit.publish_message(f'message {message_number}', 'text', channel_index=message_number)
+            return rabbit
+
+        with FakeAmqpServer() as fake_amqp_server:
+            rabbit = asyncio.run(run())
+
+        self.assertEqual(rabbit.published_count, 10)
+        self.assertEqual(fake_amqp_server.published_count, 10)
+
+
+def open_connection_and_channels(patch_connection):
+    def connect(_parameters, on_open_callback, on_open_error_callback, on_close_callback, custom_ioloop):
+        patch_connection.return_value.channel.side_effect = lambda on_open_callback: on_open_callback(
+            patch_connection.return_value.channel.return_value)
+        patch_connection.return_value.close.side_effect = lambda: close(on_close_callback)
+        custom_ioloop.call_soon(on_open_callback, patch_connection.return_value)
+        return patch_connection.return_value
+
+    def close(on_close_callback):
+        patch_connection.return_value.is_open = False
+        on_close_callback(patch_connection.return_value, None)
+
+    patch_connection.side_effect = connect
@@ -0,0 +1,54 @@
+import csv
+from pathlib import Path
+from unittest import TestCase
+
+from case_message_encoder import CaseMessageEncoder, create_case_json
+
+RESOURCE_FILE_PATH = Path(__file__).parent.joinpath('resources')
+
+
+class TestCaseMessageEncoder(TestCase):
+
+    def setUp(self):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_file_reader = csv.reader(sample_file)
+            self.header = next(sample_file_reader)
+            self.sample_rows = list(sample_file_reader)
+
+    def test_encoded_messages_match_case_json(self):
+        encoder = CaseMessageEncoder(self.header, 'test_ce_uuid', 'test_ap_uuid')
+
+        for sample_row in self.sample_rows:
+            self.assertEqual(encoder.encode(sample_row),
+                             create_case_json(dict(zip(self.header, sample_row)), 'test_ce_uuid',
+                                              'test_ap_uuid').encode())
+
+    def test_encoded_messages_match_case_json_with_reordered_columns(self):
+        reordered_header = list(reversed(self.header))
+        encoder = CaseMessageEncoder(reordered_header, 'test_ce_uuid', 'test_ap_uuid')
+        sample_row = list(reversed(self.sample_rows[0]))
+
+        self.assertEqual(encoder.encode(sample_row),
+                         create_case_json(dict(zip(reordered_header, sample_row)), 'test_ce_uuid',
+                                          'test_ap_uuid').encode())
+
+    def test_encoded_messages_escape_values(self):
+        encoder = CaseMessageEncoder(self.header, 'test_ce_uuid_%s', '"test_ap_uuid"')
+        sample_row = list(self.sample_rows[0])
+        sample_row[self.header.index('ADDRESS_LINE1')] = 'Flat "1", 100% Café \\ Road\t\U0001F3E0'
+
+        self.assertEqual(encoder.encode(sample_row),
+                         create_case_json(dict(zip(self.header, sample_row)), 'test_ce_uuid_%s',
+                                          '"test_ap_uuid"').encode())
+
+    def test_short_row_values_encoded_as_null(self):
+        encoder = CaseMessageEncoder(self.header, 'test_ce_uuid', 'test_ap_uuid')
+        short_row = self.sample_rows[0][:-2]
+
+        self.assertEqual(encoder.encode(short_row),
+                         create_case_json(next(csv.DictReader([','.join(self.header), ','.join(short_row)])),
+                                          'test_ce_uuid', 'test_ap_uuid').encode())
+
+    def test_missing_column_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            CaseMessageEncoder(self.header[1:], 'test_ce_uuid', 'test_ap_uuid')
@@ -0,0 +1,68 @@
+import gzip
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from compressed_file import is_compressed, open_sample_file, strip_compression_suffix, \
+    _BackgroundDecompressingReader
+
+SAMPLE_TEXT = ''.join(f'{line_number},Flat {line_number},Windleybury\n' for line_number in range(20000))
+
+
+class TestCompressedFile(TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_is_compressed(self):
+        self.assertTrue(is_compressed('sample.csv.gz'))
+        self.assertTrue(is_compressed(Path('sample.csv.zst')))
+        self.assertFalse(is_compressed('sample.csv'))
+
+    def test_strip_compression_suffix(self):
+        self.assertEqual(strip_compression_suffix('files/sample.csv.gz'), Path('files/sample.csv'))
+        self.assertEqual(strip_compression_suffix('files/sample.csv'), Path('files/sample.csv'))
+
+    def test_uncompressed_file_round_trip(self):
+        self.assert_round_trip(self.temp_dir.joinpath('sample.csv'))
+
+    def test_gzip_file_round_trip(self):
+        sample_file_path = self.temp_dir.joinpath('sample.csv.gz')
+
+        self.assert_round_trip(sample_file_path)
+
+        with gzip.open(sample_file_path, 'rt') as sample_file:
+            self.assertEqual(sample_file.read(), SAMPLE_TEXT)
+
+    def test_zstd_file_round_trip(self):
+        self.assert_round_trip(self.temp_dir.joinpath('sample.csv.zst'))
+
+    def test_corrupt_gzip_file_raises_on_read(self):
+        sample_file_path = self.temp_dir.joinpath('sample.csv.gz')
+        sample_file_path.write_bytes(b'not gzip data')
+
+        with self.assertRaises(OSError):
+            with open_sample_file(sample_file_path) as sample_file:
+                sample_file.read()
+
+    def test_closing_before_end_of_file_stops_decompressing(self):
+        decompressed_file = io.BytesIO(SAMPLE_TEXT.encode() * 100)
+        reader = _BackgroundDecompressingReader(decompressed_file)
+
+        reader.read(10)
+        reader.close()
+
+        self.assertTrue(decompressed_file.closed)
+        self.assertFalse(reader._thread.is_alive())
+
+    def assert_round_trip(self, sample_file_path):
+        with open_sample_file(sample_file_path, 'w', newline='') as sample_file:
+            sample_file.write(SAMPLE_TEXT)
+
+        with open_sample_file(sample_file_path) as sample_file:
+            self.assertEqual(list(sample_file), SAMPLE_TEXT.splitlines(keepends=True))
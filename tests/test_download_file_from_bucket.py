@@ -1,11 +1,16 @@
 import shutil
-from functools import partial
 from pathlib import Path
-from unittest.mock import patch
 
 import pytest
+from google.api_core.exceptions import BadRequest
 
-from download_file_from_bucket import load_bucket_sample_file
+from download_file_from_bucket import download_blob, load_bucket_sample_file
+from exceptions import SampleDownloadChecksumError
+from sample_cache import SampleCache
+from tests.support.fake_gcs import FakeGcsServer
+
+SAMPLE_DATA = b''.join(b'%d,Flat %d,Windleybury\n' % (line_number, line_number) for line_number in range(5000))
+CHUNK_SIZE = 10000
 
 
 @pytest.fixture
@@ -15,26 +20,107 @@ def create_dir():
     shutil.rmtree("sample_files")
 
 
-@patch('download_file_from_bucket.storage')
-def test_download_file_from_bucket_happy_path(patched_storage, create_dir):
+@pytest.fixture
+def fake_gcs():
+    with FakeGcsServer() as fake_gcs_server:
+        fake_gcs_server.add_blob('sample-bucket', 'sample_file.csv', SAMPLE_DATA)
+        yield fake_gcs_server
+
+
+def test_download_file_from_bucket_happy_path(create_dir, fake_gcs, monkeypatch):
     # Given
     sample_file = "sample_file.csv"
+    monkeypatch.setenv('SAMPLE_BUCKET', 'sample-bucket')
+
+    # When
+    with fake_gcs.emulator_environment():
+        load_bucket_sample_file(sample_file)
+
+    # Then
+    created_file = Path("sample_files").joinpath(sample_file).read_bytes()
+
+    assert created_file == SAMPLE_DATA
+    assert list(Path("sample_files").iterdir()) == [Path("sample_files").joinpath(sample_file)]
+
+
+def test_download_file_from_bucket_cache_hit_skips_download(create_dir, fake_gcs, monkeypatch, tmp_path):
+    # Given
+    monkeypatch.setenv('SAMPLE_BUCKET', 'sample-bucket')
+    sample_cache = SampleCache(tmp_path.joinpath('cache'), max_bytes=len(SAMPLE_DATA))
+    with fake_gcs.emulator_environment():
+        load_bucket_sample_file("sample_file.csv", sample_cache=sample_cache)
+    Path("sample_files").joinpath("sample_file.csv").unlink()
+    fake_gcs.download_ranges.clear()
+
+    # When
+    with fake_gcs.emulator_environment():
+        load_bucket_sample_file("sample_file.csv", sample_cache=sample_cache)
+
+    # Then
+    assert Path("sample_files").joinpath("sample_file.csv").read_bytes() == SAMPLE_DATA
+    assert fake_gcs.download_ranges == []
+
+
+def test_download_file_from_bucket_edited_file_leaves_cache_intact(create_dir, fake_gcs, monkeypatch, tmp_path):
+    # Given
+    monkeypatch.setenv('SAMPLE_BUCKET', 'sample-bucket')
+    sample_cache = SampleCache(tmp_path.joinpath('cache'), max_bytes=len(SAMPLE_DATA))
+    with fake_gcs.emulator_environment():
+        load_bucket_sample_file("sample_file.csv", sample_cache=sample_cache)
+    with open(Path("sample_files").joinpath("sample_file.csv"), 'r+b') as sample_file:
+        sample_file.write(b'edited')
+    fake_gcs.download_ranges.clear()
+
+    # When
+    with fake_gcs.emulator_environment():
+        load_bucket_sample_file("sample_file.csv", sample_cache=sample_cache)
+
+    # Then
+    assert Path("sample_files").joinpath("sample_file.csv").read_bytes() == SAMPLE_DATA
+    assert fake_gcs.download_ranges == []
+
+
+def test_download_blob_in_parallel_chunks(tmp_path, fake_gcs):
+    # Given
+    blob = fake_gcs.client().bucket('sample-bucket').get_blob('sample_file.csv')
+
+    # When
+    download_blob(blob, tmp_path.joinpath('sample_file.csv'), workers=4, chunk_size=CHUNK_SIZE)
+
+    # Then
+    assert tmp_path.joinpath('sample_file.csv').read_bytes() == SAMPLE_DATA
+    assert sorted(start for _, start, _ in fake_gcs.download_ranges) == list(range(0, len(SAMPLE_DATA), CHUNK_SIZE))
+
+
+def test_download_blob_resumes_only_missing_chunks(tmp_path, fake_gcs):
+    # Given
+    blob = fake_gcs.client().bucket('sample-bucket').get_blob('sample_file.csv')
+    fake_gcs.fail_next_download_from(3 * CHUNK_SIZE)
+    with pytest.raises(BadRequest):
+        download_blob(blob, tmp_path.joinpath('sample_file.csv'), workers=1, chunk_size=CHUNK_SIZE)
+    downloaded_before_failure = {start for _, start, _ in fake_gcs.download_ranges}
+    fake_gcs.download_ranges.clear()
 
-    patched_storage.Client.return_value.download_blob_to_file.side_effect = partial(mock_download_blob,
-                                                                                    mock_data=(
-                                                                                        b'header_1,header_2\n'
-                                                                                        b'value1,value2\n'))
     # When
-    load_bucket_sample_file(sample_file)
+    download_blob(blob, tmp_path.joinpath('sample_file.csv'), workers=1, chunk_size=CHUNK_SIZE)
 
     # Then
-    created_file = Path("sample_files").joinpath(sample_file).read_text()
+    assert tmp_path.joinpath('sample_file.csv').read_bytes() == SAMPLE_DATA
+    resumed_chunk_starts = {start for _, start, _ in fake_gcs.download_ranges}
+    assert 3 * CHUNK_SIZE in resumed_chunk_starts
+    assert downloaded_before_failure.isdisjoint(resumed_chunk_starts)
+    assert downloaded_before_failure | resumed_chunk_starts == set(range(0, len(SAMPLE_DATA), CHUNK_SIZE))
+    assert list(tmp_path.iterdir()) == [tmp_path.joinpath('sample_file.csv')]
 
-    assert patched_storage.Client.return_value.download_blob_to_file.call_count == 1
 
-    assert created_file == ('header_1,header_2\n'
-                            'value1,value2\n')
+def test_download_blob_checksum_mismatch(tmp_path, fake_gcs):
+    # Given
+    blob = fake_gcs.client().bucket('sample-bucket').get_blob('sample_file.csv')
+    blob._properties['crc32c'] = 'AAAAAA=='
 
+    # When
+    with pytest.raises(SampleDownloadChecksumError):
+        download_blob(blob, tmp_path.joinpath('sample_file.csv'), workers=4, chunk_size=CHUNK_SIZE)
 
-def mock_download_blob(_source_blob, destination_file, mock_data):
-    destination_file.write(mock_data)
+    # Then
+    assert list(tmp_path.iterdir()) == []
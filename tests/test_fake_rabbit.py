@@ -0,0 +1,64 @@
+import asyncio
+import json
+from pathlib import Path
+from unittest import TestCase
+
+from async_rabbit_context import AsyncRabbitContext
+from load_sample import load_sample_file
+from rabbit_context import RabbitContext
+from tests.support.fake_rabbit import FakeAmqpServer
+
+RESOURCE_FILE_PATH = Path(__file__).parent.joinpath('resources')
+
+
+class TestFakeAmqpServer(TestCase):
+
+    def setUp(self):
+        self.fake_amqp_server = FakeAmqpServer(store_messages=True)
+        self.fake_amqp_server.start()
+
+    def tearDown(self):
+        self.fake_amqp_server.stop()
+
+    def test_rabbit_context_publishes_to_fake_amqp_server(self):
+        with RabbitContext(queue_name='localtest', **self.fake_amqp_server.connection_kwargs()) as rabbit:
+            rabbit.publish_message('Test message body', 'text')
+            self.assertEqual(rabbit.queue_depth(), 0)
+
+        self.assertEqual(self.fake_amqp_server.published_count, 1)
+        routing_key, properties, body = self.fake_amqp_server.messages[0]
+        self.assertEqual(routing_key, 'localtest')
+        self.assertEqual(properties.content_type, 'text')
+        self.assertEqual(properties.delivery_mode, 2)
+        self.assertEqual(body, b'Test message body')
+
+    def test_rabbit_context_publisher_confirms_from_fake_amqp_server(self):
+        with RabbitContext(confirm_window=5, **self.fake_amqp_server.connection_kwargs()) as rabbit:
+            for message_number in range(20):
+                rabbit.publish_message(f'message {message_number}', 'text')
+            rabbit.wait_for_confirms()
+
+        self.assertEqual(rabbit.confirmed_count, 20)
+        self.assertEqual(self.fake_amqp_server.published_count, 20)
+
+    def test_async_rabbit_context_publishes_to_fake_amqp_server(self):
+        async def publish_messages():
+            async with AsyncRabbitContext(channels=2, **self.fake_amqp_server.connection_kwargs()) as rabbit:
+                for channel_index in range(4):
+                    await rabbit.publish_message('Test message body', 'text', channel_index=channel_index)
+
+        asyncio.run(publish_messages())
+
+        self.assertEqual(self.fake_amqp_server.published_count, 4)
+
+    def test_load_sample_file_with_workers_to_fake_amqp_server(self):
+        sample_file_path = RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')
+
+        load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', workers=2,
+                         **self.fake_amqp_server.connection_kwargs())
+
+        with open(sample_file_path) as sample_file:
+            expected_row_count = len(sample_file.readlines()) - 1
+        self.assertEqual(self.fake_amqp_server.published_count, expected_row_count)
+        self.assertEqual({json.loads(body)['collectionExerciseId'] for _, _, body in self.fake_amqp_server.messages},
+                         {'test_ce_uuid'})
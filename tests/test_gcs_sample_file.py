@@ -0,0 +1,67 @@
+import gzip
+from unittest import TestCase
+
+from google.api_core.exceptions import BadRequest
+
+from compressed_file import open_sample_file
+from gcs_sample_file import GcsBlobReader, open_gcs_blob, parse_gcs_uri
+from tests.support.fake_gcs import FakeGcsServer
+
+SAMPLE_DATA = b''.join(b'%d,Flat %d,Windleybury\n' % (line_number, line_number) for line_number in range(20000))
+
+
+class TestGcsSampleFile(TestCase):
+
+    def setUp(self):
+        self.fake_gcs = FakeGcsServer()
+        self.fake_gcs.start()
+        self.addCleanup(self.fake_gcs.stop)
+        self.fake_gcs.add_blob('sample-bucket', 'samples/sample.csv', SAMPLE_DATA)
+
+    def test_parse_gcs_uri(self):
+        self.assertEqual(parse_gcs_uri('gs://sample-bucket/samples/sample.csv'),
+                         ('sample-bucket', 'samples/sample.csv'))
+
+    def test_parse_gcs_uri_without_object_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            parse_gcs_uri('gs://sample-bucket')
+
+    def test_open_gcs_blob_reads_whole_blob_in_ranges(self):
+        with open_gcs_blob('gs://sample-bucket/samples/sample.csv', self.fake_gcs.client(), chunk_size=100000) as blob:
+            self.assertEqual(blob.read(), SAMPLE_DATA)
+
+        self.assertEqual(sorted(start for _, start, _ in self.fake_gcs.download_ranges),
+                         list(range(0, len(SAMPLE_DATA), 100000)))
+        self.assertTrue(all(end - start < 100000 for _, start, end in self.fake_gcs.download_ranges))
+
+    def test_open_gcs_blob_retries_failed_range(self):
+        self.fake_gcs.fail_next_download_from(100000, times=2)
+
+        with open_gcs_blob('gs://sample-bucket/samples/sample.csv', self.fake_gcs.client(), chunk_size=100000) as blob:
+            self.assertEqual(blob.read(), SAMPLE_DATA)
+
+    def test_open_gcs_blob_raises_when_range_keeps_failing(self):
+        self.fake_gcs.fail_next_download_from(100000, times=GcsBlobReader.MAX_RANGE_ATTEMPTS)
+
+        with open_gcs_blob('gs://sample-bucket/samples/sample.csv', self.fake_gcs.client(), chunk_size=100000) as blob:
+            with self.assertRaises(BadRequest):
+                blob.read()
+
+    def test_open_gcs_blob_only_reads_ahead_of_first_chunk(self):
+        with open_gcs_blob('gs://sample-bucket/samples/sample.csv', self.fake_gcs.client(), chunk_size=10000,
+                           read_ahead=2) as blob:
+            first_line = blob.readline()
+
+            self.assertEqual(first_line, b'0,Flat 0,Windleybury\n')
+            self.assertLessEqual(len(self.fake_gcs.download_ranges), 3)
+
+    def test_open_missing_gcs_blob_raises_file_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            open_gcs_blob('gs://sample-bucket/samples/missing.csv', self.fake_gcs.client())
+
+    def test_open_compressed_gcs_sample_file(self):
+        self.fake_gcs.add_blob('sample-bucket', 'samples/sample.csv.gz', gzip.compress(SAMPLE_DATA))
+
+        with self.fake_gcs.emulator_environment():
+            with open_sample_file('gs://sample-bucket/samples/sample.csv.gz') as sample_file:
+                self.assertEqual(sample_file.read(), SAMPLE_DATA.decode())
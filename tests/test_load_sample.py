@@ -1,8 +1,23 @@
 import csv
+import gzip
 import json
+import shutil
+import tempfile
+from pathlib import Path
 from unittest import TestCase
 from unittest.mock import patch
-from load_sample import load_sample
+
+from exceptions import RabbitConnectionClosedError, SampleCheckpointError, SampleValidationError
+from load_sample import load_sample, load_sample_file, main, _load_sample_shard
+from rate_limiter import RateProfile
+from sample_checkpoint import read_checkpoint
+from sample_unit_store import RedisSampleUnitStore
+from tests.support.fake_gcs import FakeGcsServer
+from tests.support.fake_rabbit import InMemoryAsyncRabbitContext, InMemoryRabbitContext
+from tests.support.fake_redis import FakeRedis
+from validate_sample import SampleValidator, chunk_byte_ranges
+
+RESOURCE_FILE_PATH = Path(__file__).parent.joinpath('resources')
 
 
 @patch('load_sample.RabbitContext')
@@ -60,3 +75,420 @@ class TestLoadSample(TestCase):
             message_contents = json.loads(publish_message_call_args[row_number][0][0])
             self.assertEqual(sample_row['UPRN'], message_contents['uprn'])
             self.assertEqual(sample_row['ADDRESS_LINE1'], message_contents['addressLine1'])
+
+
+class TestShardedLoadSample(TestCase):
+    SAMPLE_HEADER = ('UPRN,ESTAB_UPRN,ADDRESS_TYPE,ESTAB_TYPE,ADDRESS_LEVEL,ABP_CODE,ORGANISATION_NAME,ADDRESS_LINE1,'
+                     'ADDRESS_LINE2,ADDRESS_LINE3,TOWN_NAME,POSTCODE,LATITUDE,LONGITUDE,OA,LSOA,MSOA,LAD,REGION,'
+                     'HTC_WILLINGNESS,HTC_DIGITAL,FIELDCOORDINATOR_ID,FIELDOFFICER_ID,TREATMENT_CODE,'
+                     'CE_EXPECTED_CAPACITY,CE_SECURE,PRINT_BATCH')
+
+    def setUp(self):
+        self.sample_file_path = Path(tempfile.mkdtemp()).joinpath('sample.csv')
+        rows = [f'{uprn},{uprn},HH,Household,U,RD06,,Flat {uprn},Commercial Road,,Windleybury,XX1 0XX,51.4463421,'
+                f'-2.5924477,E00073438,E01014540,E02003043,E06000023,E12000009,1,5,1,2,HH_LF3R2E,3,0,2'
+                for uprn in range(100, 125)]
+        self.sample_file_path.write_text('\n'.join([self.SAMPLE_HEADER, *rows]) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.sample_file_path.parent)
+
+    def test_shard_byte_ranges_cover_every_row_once(self):
+        shards = chunk_byte_ranges(self.sample_file_path, 4)
+
+        self.assertEqual(len(shards), 4)
+        self.assertEqual(shards[0][0], len(self.SAMPLE_HEADER) + 1)
+        self.assertEqual(shards[-1][1], self.sample_file_path.stat().st_size)
+        file_bytes = self.sample_file_path.read_bytes()
+        shard_rows = []
+        for start, end in shards:
+            self.assertEqual(file_bytes[start - 1:start], b'\n')
+            shard_rows.extend(file_bytes[start:end].decode().splitlines())
+        self.assertEqual(shard_rows, self.sample_file_path.read_text().splitlines()[1:])
+
+    def test_shard_byte_ranges_more_shards_than_rows(self):
+        self.sample_file_path.write_text(self.sample_file_path.read_text().splitlines()[0] + '\n1,2\n')
+
+        self.assertEqual(len(chunk_byte_ranges(self.sample_file_path, 4)), 1)
+
+    @patch('load_sample.RabbitContext')
+    def test_load_sample_shard_publishes_only_shard_rows(self, patch_rabbit):
+        start, end = chunk_byte_ranges(self.sample_file_path, 3)[1]
+
+        sample_units = _load_sample_shard(self.sample_file_path, start, end, 'test_ce_uuid', 'test_ap_uuid',
+                                          True, {})
+
+        expected_rows = list(csv.DictReader([self.SAMPLE_HEADER,
+                                             *self.sample_file_path.read_bytes()[start:end].decode().splitlines()]))
+        published_cases = [json.loads(call[0][0]) for call in
+                           patch_rabbit.return_value.__enter__.return_value.publish_message.call_args_list]
+        self.assertEqual(len(sample_units), len(expected_rows))
+        self.assertEqual([case['uprn'] for case in published_cases], [row['UPRN'] for row in expected_rows])
+        self.assertEqual(published_cases[0]['addressLine1'], expected_rows[0]['ADDRESS_LINE1'])
+
+    @patch('load_sample.RabbitContext')
+    def test_load_sample_shards_keep_quoted_line_breaks_in_one_row(self, patch_rabbit):
+        rows = [f'{uprn},{uprn},HH,Household,U,RD06,,"Flat {uprn}\nFirst Floor",Commercial Road,,Windleybury,XX1 0XX,'
+                f'51.4463421,-2.5924477,E00073438,E01014540,E02003043,E06000023,E12000009,1,5,1,2,HH_LF3R2E,3,0,2'
+                for uprn in range(100, 125)]
+        self.sample_file_path.write_text('\n'.join([self.SAMPLE_HEADER, *rows]) + '\n')
+
+        for start, end in chunk_byte_ranges(self.sample_file_path, 7):
+            _load_sample_shard(self.sample_file_path, start, end, 'test_ce_uuid', 'test_ap_uuid', False, {})
+
+        published_cases = [json.loads(call[0][0]) for call in
+                           patch_rabbit.return_value.__enter__.return_value.publish_message.call_args_list]
+        self.assertEqual([case['uprn'] for case in published_cases], [str(uprn) for uprn in range(100, 125)])
+        self.assertEqual({case['addressLine1'] for case in published_cases},
+                         {f'Flat {uprn}\nFirst Floor' for uprn in range(100, 125)})
+
+
+class TestAsyncLoadSample(TestCase):
+
+    def test_async_load_sample_publishes_every_case(self):
+        fake_rabbit = InMemoryAsyncRabbitContext(store_messages=True)
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_units = load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', store_loaded_sample_units=True,
+                                       engine='asyncio', rabbit_context=fake_rabbit, channels=3, queue_size=4)
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_rows = list(csv.DictReader(sample_file))
+        published_cases = [json.loads(message) for message, _ in fake_rabbit.messages]
+        self.assertEqual(len(sample_units), len(sample_rows))
+        self.assertEqual(sorted(case['uprn'] for case in published_cases), sorted(row['UPRN'] for row in sample_rows))
+        self.assertTrue(all(case['collectionExerciseId'] == 'test_ce_uuid' for case in published_cases))
+        self.assertEqual(set(fake_rabbit.channel_published_counts), {0, 1, 2})
+        self.assertEqual({content_type for _, content_type in fake_rabbit.messages}, {'application/json'})
+
+    def test_async_load_sample_empty_file(self):
+        fake_rabbit = InMemoryAsyncRabbitContext(store_messages=True)
+
+        sample_units = load_sample([TestShardedLoadSample.SAMPLE_HEADER], 'test_ce_uuid', 'test_ap_uuid',
+                                   engine='asyncio', rabbit_context=fake_rabbit)
+
+        self.assertEqual(sample_units, {})
+        self.assertEqual(fake_rabbit.published_count, 0)
+
+    def test_async_load_sample_with_confirm_window_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            load_sample_file(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), 'test_ce_uuid',
+                             'test_ap_uuid', engine='asyncio', confirm_window=10,
+                             rabbit_context=InMemoryAsyncRabbitContext())
+
+    @patch.dict('os.environ', {'RABBITMQ_CONFIRM_WINDOW': '10'})
+    @patch('load_sample.AsyncRabbitContext')
+    def test_async_load_sample_with_confirm_window_from_environment_raises_value_error(self, patch_rabbit):
+        sample_file_path = str(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'))
+
+        with patch('sys.argv', ['load_sample.py', sample_file_path, 'test_ce_uuid', 'test_ap_uuid',
+                                '--engine', 'asyncio']), self.assertRaises(ValueError):
+            main()
+
+        patch_rabbit.assert_not_called()
+
+
+@patch('load_sample.RabbitContext')
+class TestCheckpointedLoadSample(TestCase):
+
+    def setUp(self):
+        self.sample_file_path = Path(tempfile.mkdtemp()).joinpath('sample.csv')
+        shutil.copy(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), self.sample_file_path)
+        with open(self.sample_file_path) as sample_file:
+            self.sample_rows = list(csv.DictReader(sample_file))
+
+    def tearDown(self):
+        shutil.rmtree(self.sample_file_path.parent)
+
+    def test_checkpoint_saved_after_confirms(self, patch_rabbit):
+        patch_rabbit_context = patch_rabbit.return_value.__enter__.return_value
+
+        load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=10,
+                         confirm_window=10)
+
+        checkpoint = read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
+        self.assertEqual(checkpoint.row_count, len(self.sample_rows))
+        self.assertEqual(checkpoint.byte_offset, self.sample_file_path.stat().st_size)
+        self.assertEqual(patch_rabbit_context.wait_for_confirms.call_count, len(self.sample_rows) // 10 + 1)
+
+    def test_resume_publishes_only_rows_after_checkpoint(self, patch_rabbit):
+        patch_rabbit_context = patch_rabbit.return_value.__enter__.return_value
+        patch_rabbit_context.publish_message.side_effect = [None] * 12 + [RabbitConnectionClosedError]
+
+        with self.assertRaises(RabbitConnectionClosedError):
+            load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=5,
+                             confirm_window=10)
+
+        self.assertEqual(read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid').row_count, 10)
+
+        patch_rabbit_context.publish_message.reset_mock(side_effect=True)
+        load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=5, resume=True,
+                         confirm_window=10)
+
+        published_uprns = [json.loads(call[0][0])['uprn'] for call in
+                           patch_rabbit_context.publish_message.call_args_list]
+        self.assertEqual(published_uprns, [row['UPRN'] for row in self.sample_rows[10:]])
+        self.assertEqual(read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid').row_count,
+                         len(self.sample_rows))
+
+    def test_resume_after_sample_file_changed_raises_correct_exception(self, patch_rabbit):
+        patch_rabbit_context = patch_rabbit.return_value.__enter__.return_value
+        patch_rabbit_context.publish_message.side_effect = [None] * 12 + [RabbitConnectionClosedError]
+        with self.assertRaises(RabbitConnectionClosedError):
+            load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=5,
+                             confirm_window=10)
+
+        with open(self.sample_file_path, 'a') as sample_file:
+            sample_file.write(sample_file.name)
+
+        with self.assertRaises(SampleCheckpointError):
+            load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=5,
+                             resume=True, confirm_window=10)
+
+    def test_checkpoints_without_confirm_window_raises_value_error(self, _patch_rabbit):
+        with self.assertRaises(ValueError):
+            load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=5)
+
+    def test_load_sample_checks_flow_control(self, patch_rabbit):
+        load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', flow_control_check_frequency=10)
+
+        self.assertEqual(patch_rabbit.return_value.__enter__.return_value.wait_for_flow_control.call_count,
+                         len(self.sample_rows) // 10)
+
+    @patch('load_sample.TokenBucketRateLimiter')
+    def test_load_sample_paced_by_rate_profile(self, patch_rate_limiter, _patch_rabbit):
+        rate_profile = RateProfile.constant(100)
+
+        load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', rate_profile=rate_profile)
+
+        patch_rate_limiter.assert_called_once_with(rate_profile)
+        self.assertEqual(patch_rate_limiter.return_value.acquire.call_count, len(self.sample_rows))
+
+    def test_resume_without_checkpoint_raises_correct_exception(self, _patch_rabbit):
+        with self.assertRaises(SampleCheckpointError):
+            load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', resume=True, confirm_window=10)
+
+    def test_checkpoints_with_multiple_workers_raises_value_error(self, _patch_rabbit):
+        with self.assertRaises(ValueError):
+            load_sample_file(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid', workers=2, checkpoint_frequency=5,
+                             confirm_window=10)
+
+
+class TestInMemoryLoadSample(TestCase):
+
+    def test_load_sample_publishes_every_case_to_in_memory_rabbit(self):
+        in_memory_rabbit = InMemoryRabbitContext(store_messages=True)
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=in_memory_rabbit)
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_rows = list(csv.DictReader(sample_file))
+        self.assertEqual([json.loads(message)['uprn'] for message, _ in in_memory_rabbit.messages],
+                         [row['UPRN'] for row in sample_rows])
+        self.assertEqual(in_memory_rabbit.published_count, len(sample_rows))
+
+    def test_load_compressed_sample_file(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir)
+        sample_file_path = temp_dir.joinpath('sample_file.csv.gz')
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), 'rb') as sample_file, \
+                gzip.open(sample_file_path, 'wb') as compressed_sample_file:
+            shutil.copyfileobj(sample_file, compressed_sample_file)
+        in_memory_rabbit = InMemoryRabbitContext()
+
+        load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=in_memory_rabbit)
+
+        self.assertEqual(in_memory_rabbit.published_count, 33)
+        with self.assertRaises(ValueError):
+            load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', checkpoint_frequency=10,
+                             rabbit_context=in_memory_rabbit)
+
+    def test_load_sample_file_streamed_from_gcs(self):
+        in_memory_rabbit = InMemoryRabbitContext()
+        with FakeGcsServer() as fake_gcs, fake_gcs.emulator_environment():
+            fake_gcs.add_blob('sample-bucket', 'sample_file.csv',
+                              RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv').read_bytes())
+
+            load_sample_file('gs://sample-bucket/sample_file.csv', 'test_ce_uuid', 'test_ap_uuid',
+                             rabbit_context=in_memory_rabbit)
+
+            with self.assertRaises(ValueError):
+                load_sample_file('gs://sample-bucket/sample_file.csv', 'test_ce_uuid', 'test_ap_uuid', workers=2)
+
+        self.assertEqual(in_memory_rabbit.published_count, 33)
+
+    def test_load_sample_streams_sample_units_to_store(self):
+        fake_redis = FakeRedis()
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file, \
+                RedisSampleUnitStore(batch_size=10, redis_client=fake_redis) as sample_unit_store:
+            sample_units = load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid',
+                                       rabbit_context=InMemoryRabbitContext(), sample_unit_store=sample_unit_store)
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_rows = list(csv.DictReader(sample_file))
+        self.assertEqual(sample_units, {})
+        self.assertEqual(fake_redis.mset_sizes, [10, 10, 10, 3])
+        self.assertEqual([json.loads(sample_unit)['attributes'] for sample_unit in fake_redis.store.values()],
+                         sample_rows)
+        self.assertTrue(all(key == f'sampleunit:{json.loads(sample_unit)["id"]}'
+                            for key, sample_unit in fake_redis.store.items()))
+
+    def test_async_load_sample_streams_sample_units_to_store(self):
+        fake_redis = FakeRedis()
+
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file, \
+                RedisSampleUnitStore(batch_size=10, redis_client=fake_redis) as sample_unit_store:
+            load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', engine='asyncio',
+                        rabbit_context=InMemoryAsyncRabbitContext(), sample_unit_store=sample_unit_store)
+
+        self.assertEqual(len(fake_redis.store), 33)
+
+
+class TestValidatingLoadSample(TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.reject_file_path = self.temp_dir.joinpath('rejects.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def load_with_validation(self, sample_file_name, max_rejects=None):
+        in_memory_rabbit = InMemoryRabbitContext(store_messages=True)
+        with open(RESOURCE_FILE_PATH.joinpath(sample_file_name)) as sample_file:
+            load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=in_memory_rabbit,
+                        sample_validator=SampleValidator(), reject_file_path=self.reject_file_path,
+                        max_rejects=max_rejects)
+        return in_memory_rabbit
+
+    def test_load_sample_publishes_only_valid_rows(self):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            header, *rows = csv.reader(sample_file)
+        invalid_row = rows[1][:]
+        invalid_row[header.index('TREATMENT_CODE')] = 'HH_NOTVALID'
+        sample_file = [','.join(header), ','.join(rows[0]), ','.join(invalid_row), ','.join(rows[2])]
+        in_memory_rabbit = InMemoryRabbitContext(store_messages=True)
+
+        load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=in_memory_rabbit,
+                    sample_validator=SampleValidator(), reject_file_path=self.reject_file_path)
+
+        self.assertEqual([json.loads(message)['uprn'] for message, _ in in_memory_rabbit.messages],
+                         [rows[0][0], rows[2][0]])
+        with open(self.reject_file_path) as reject_file:
+            reject_header, *reject_rows = csv.reader(reject_file)
+        self.assertEqual(reject_header, [*header, 'ROW_NUMBER', 'VALIDATION_FAILURES'])
+        self.assertEqual(len(reject_rows), 1)
+        self.assertEqual(reject_rows[0][:len(header)], invalid_row)
+        self.assertEqual(reject_rows[0][-2], '3')
+        self.assertIn('TREATMENT_CODE', reject_rows[0][-1])
+
+    def test_load_sample_rejects_row_with_wrong_number_of_values(self):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            header, valid_row, *_ = csv.reader(sample_file)
+        sample_file = [','.join(header), ','.join(valid_row[:-1]), ','.join(valid_row)]
+        in_memory_rabbit = InMemoryRabbitContext()
+
+        load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=in_memory_rabbit,
+                    sample_validator=SampleValidator(), reject_file_path=self.reject_file_path)
+
+        self.assertEqual(in_memory_rabbit.published_count, 1)
+        with open(self.reject_file_path) as reject_file:
+            _, reject_row = csv.reader(reject_file)
+        self.assertEqual(reject_row[-1], f'None: Row has {len(header) - 1} values, expected {len(header)}')
+
+    def test_load_sample_aborts_once_max_rejects_exceeded(self):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            header, *rows = csv.reader(sample_file)
+        treatment_code_index = header.index('TREATMENT_CODE')
+        sample_file = [','.join(header)]
+        for row in rows[:3]:
+            row[treatment_code_index] = 'HH_NOTVALID'
+            sample_file.append(','.join(row))
+        in_memory_rabbit = InMemoryRabbitContext()
+
+        with self.assertRaises(SampleValidationError):
+            load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', rabbit_context=in_memory_rabbit,
+                        sample_validator=SampleValidator(), reject_file_path=self.reject_file_path, max_rejects=1)
+
+        self.assertEqual(in_memory_rabbit.published_count, 0)
+        with open(self.reject_file_path) as reject_file:
+            self.assertEqual(len(list(csv.reader(reject_file))), 3)
+
+    def test_load_sample_invalid_header_publishes_nothing(self):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            header, *rows = sample_file.read().splitlines()
+        sample_file = [header.replace('UPRN,', 'NOT_A_COLUMN,', 1), *rows]
+
+        with patch('load_sample.RabbitContext') as patch_rabbit, self.assertRaises(SampleValidationError):
+            load_sample(sample_file, 'test_ce_uuid', 'test_ap_uuid', sample_validator=SampleValidator(),
+                        reject_file_path=self.reject_file_path)
+
+        patch_rabbit.assert_not_called()
+        self.assertFalse(self.reject_file_path.exists())
+
+    @patch('load_sample.RabbitContext')
+    def test_resumed_load_keeps_rejects_from_before_checkpoint_with_file_row_numbers(self, patch_rabbit):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            header, *rows = csv.reader(sample_file)
+        for invalid_row_index in (2, 11, 20):
+            rows[invalid_row_index][header.index('TREATMENT_CODE')] = 'HH_NOTVALID'
+        sample_file_path = self.temp_dir.joinpath('sample.csv')
+        sample_file_path.write_text('\n'.join(','.join(row) for row in (header, *rows)) + '\n')
+        patch_rabbit_context = patch_rabbit.return_value.__enter__.return_value
+        patch_rabbit_context.publish_message.side_effect = [None] * 12 + [RabbitConnectionClosedError]
+        load_options = {'checkpoint_frequency': 5, 'confirm_window': 10, 'sample_validator': SampleValidator(),
+                        'reject_file_path': self.reject_file_path}
+
+        with self.assertRaises(RabbitConnectionClosedError):
+            load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', **load_options)
+        with open(self.reject_file_path) as reject_file:
+            self.assertEqual([reject[-2] for reject in csv.reader(reject_file)][1:], ['4', '13'])
+
+        patch_rabbit_context.publish_message.reset_mock(side_effect=True)
+        load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', resume=True, **load_options)
+
+        with open(self.reject_file_path) as reject_file:
+            reject_header, *reject_rows = csv.reader(reject_file)
+        self.assertEqual(reject_header, [*header, 'ROW_NUMBER', 'VALIDATION_FAILURES'])
+        self.assertEqual([reject[-2] for reject in reject_rows], ['4', '13', '22'])
+        self.assertEqual([reject[0] for reject in reject_rows], [rows[index][0] for index in (2, 11, 20)])
+        published_uprns = [json.loads(call[0][0])['uprn'] for call in
+                           patch_rabbit_context.publish_message.call_args_list]
+        self.assertEqual(published_uprns, [row[0] for row in rows[12:20] + rows[21:]])
+
+    @patch('load_sample.RabbitContext')
+    def test_reject_row_numbers_match_validator_with_quoted_line_breaks(self, patch_rabbit):
+        with open(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            header, *rows = csv.reader(sample_file)
+        for invalid_row_index in (2, 11, 20):
+            rows[invalid_row_index][header.index('TREATMENT_CODE')] = 'HH_NOTVALID'
+        for multiline_row_index in (0, 8, 15):
+            rows[multiline_row_index][header.index('ADDRESS_LINE2')] = 'First Floor\nBack Entrance'
+        sample_file_path = self.temp_dir.joinpath('sample.csv')
+        with open(sample_file_path, 'w', newline='') as sample_file:
+            sample_writer = csv.writer(sample_file, lineterminator='\n')
+            sample_writer.writerows([header, *rows[:5], [], *rows[5:]])
+        patch_rabbit_context = patch_rabbit.return_value.__enter__.return_value
+        patch_rabbit_context.publish_message.side_effect = [None] * 12 + [RabbitConnectionClosedError]
+        load_options = {'checkpoint_frequency': 5, 'confirm_window': 10, 'sample_validator': SampleValidator(),
+                        'reject_file_path': self.reject_file_path}
+
+        with self.assertRaises(RabbitConnectionClosedError):
+            load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', **load_options)
+        patch_rabbit_context.publish_message.reset_mock(side_effect=True)
+        load_sample_file(sample_file_path, 'test_ce_uuid', 'test_ap_uuid', resume=True, **load_options)
+
+        with open(self.reject_file_path) as reject_file:
+            _reject_header, *reject_rows = csv.reader(reject_file)
+        validation_failures = SampleValidator().validate(sample_file_path, scan_structure=False)
+        self.assertEqual([int(reject[-2]) for reject in reject_rows],
+                         sorted({failure.line_number for failure in validation_failures}))
+        self.assertEqual([int(reject[-2]) for reject in reject_rows], [4, 13, 22])
+
+    def test_validating_with_multiple_workers_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            load_sample_file(RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), 'test_ce_uuid',
+                             'test_ap_uuid', workers=2, sample_validator=SampleValidator(),
+                             reject_file_path=self.reject_file_path)
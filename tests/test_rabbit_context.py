@@ -1,8 +1,13 @@
+import threading
 from unittest import TestCase
 from unittest.mock import patch
 
-from exceptions import RabbitConnectionClosedError
+from pika.frame import Method
+from pika.spec import Basic, Confirm, Connection, Queue
+
+from exceptions import RabbitConnectionClosedError, RabbitDeliveryNotConfirmedError
 from rabbit_context import RabbitContext
+from tests.support.fake_rabbit import FakeAmqpServer
 
 
 @patch('rabbit_context.pika')
@@ -38,3 +43,196 @@ class TestRabbitContext(TestCase):
                                                       routing_key=rabbit.queue_name,
                                                       body='Test message body',
                                                       properties=patch_pika.BasicProperties.return_value)
+
+    def test_publisher_confirms_enabled_with_confirm_window(self, patch_pika):
+        patched_impl_channel = patch_pika.BlockingConnection.return_value.channel.return_value._impl
+        patched_impl_channel.confirm_delivery.side_effect = confirm_select_ok
+
+        with RabbitContext(confirm_window=10) as rabbit:
+            pass
+
+        patched_impl_channel.confirm_delivery.assert_called_once()
+        patched_impl_channel.add_on_return_callback.assert_called_once_with(rabbit._on_message_returned)
+
+    def test_publish_waits_for_confirms_when_window_is_full(self, patch_pika):
+        patched_connection = patch_pika.BlockingConnection.return_value
+        patched_channel = patched_connection.channel.return_value
+        patched_channel._impl.confirm_delivery.side_effect = confirm_select_ok
+
+        with RabbitContext(confirm_window=2) as rabbit:
+            patched_connection.process_data_events.reset_mock()
+            patched_connection.process_data_events.side_effect = lambda **_kwargs: rabbit._on_delivery_confirmation(
+                Method(1, Basic.Ack(delivery_tag=2, multiple=True)))
+            rabbit.publish_message('message 1', 'text')
+            patched_connection.process_data_events.assert_not_called()
+
+            rabbit.publish_message('message 2', 'text')
+            patched_connection.process_data_events.assert_called_once()
+
+        self.assertEqual(rabbit.published_count, 2)
+        self.assertEqual(rabbit.confirmed_count, 2)
+
+    def test_wait_for_confirms_drains_window(self, patch_pika):
+        patched_connection = patch_pika.BlockingConnection.return_value
+        patched_channel = patched_connection.channel.return_value
+        patched_channel._impl.confirm_delivery.side_effect = confirm_select_ok
+
+        with RabbitContext(confirm_window=10) as rabbit:
+            rabbit.publish_message('message 1', 'text')
+            rabbit.publish_message('message 2', 'text')
+            patched_connection.process_data_events.side_effect = [
+                rabbit._on_delivery_confirmation(Method(1, Basic.Ack(delivery_tag=1))),
+                rabbit._on_delivery_confirmation(Method(1, Basic.Ack(delivery_tag=2)))]
+            rabbit.wait_for_confirms()
+
+        self.assertEqual(rabbit.confirmed_count, 2)
+
+    def test_nacked_message_is_republished(self, patch_pika):
+        patched_connection = patch_pika.BlockingConnection.return_value
+        patched_channel = patched_connection.channel.return_value
+        patched_channel._impl.confirm_delivery.side_effect = confirm_select_ok
+
+        with RabbitContext(confirm_window=10) as rabbit:
+            rabbit.publish_message('Test message body', 'text')
+            rabbit._on_delivery_confirmation(Method(1, Basic.Nack(delivery_tag=1)))
+            patched_connection.process_data_events.side_effect = lambda **_kwargs: rabbit._on_delivery_confirmation(
+                Method(1, Basic.Ack(delivery_tag=2)))
+            rabbit.wait_for_confirms()
+
+        self.assertEqual(patched_channel.basic_publish.call_count, 2)
+        self.assertEqual(patched_channel.basic_publish.call_args[1]['body'], b'Test message body')
+        self.assertEqual(rabbit.published_count, 1)
+        self.assertEqual(rabbit.confirmed_count, 1)
+
+    def test_returned_message_is_republished(self, patch_pika):
+        patched_connection = patch_pika.BlockingConnection.return_value
+        patched_channel = patched_connection.channel.return_value
+        patched_channel._impl.confirm_delivery.side_effect = confirm_select_ok
+
+        with RabbitContext(confirm_window=10) as rabbit:
+            rabbit.publish_message('message 1', 'text')
+            rabbit.publish_message('message 2', 'text')
+            rabbit._on_message_returned(None, Basic.Return(reply_code=312, reply_text='NO_ROUTE'), None, b'message 2')
+            rabbit._on_delivery_confirmation(Method(1, Basic.Ack(delivery_tag=2, multiple=True)))
+            patched_connection.process_data_events.side_effect = lambda **_kwargs: rabbit._on_delivery_confirmation(
+                Method(1, Basic.Ack(delivery_tag=3)))
+            rabbit.wait_for_confirms()
+
+            self.assertEqual(patched_channel.basic_publish.call_count, 3)
+            self.assertEqual(patched_channel.basic_publish.call_args[1]['body'], b'message 2')
+            self.assertEqual(rabbit.confirmed_count, 2)
+
+    def test_message_not_confirmed_after_max_attempts_raises_correct_exception(self, patch_pika):
+        patched_connection = patch_pika.BlockingConnection.return_value
+        patched_channel = patched_connection.channel.return_value
+        patched_channel._impl.confirm_delivery.side_effect = confirm_select_ok
+
+        with RabbitContext(confirm_window=10) as rabbit:
+            patched_connection.process_data_events.side_effect = lambda **_kwargs: rabbit._on_delivery_confirmation(
+                Method(1, Basic.Nack(delivery_tag=rabbit._delivery_tag)))
+            rabbit.publish_message('Test message body', 'text')
+
+            with self.assertRaises(RabbitDeliveryNotConfirmedError):
+                rabbit.wait_for_confirms()
+
+        self.assertEqual(patched_channel.basic_publish.call_count, RabbitContext.MAX_PUBLISH_ATTEMPTS)
+
+    def test_connection_blocked_callbacks_registered(self, patch_pika):
+        with RabbitContext() as rabbit:
+            pass
+
+        patched_connection = patch_pika.BlockingConnection.return_value
+        patched_connection.add_on_connection_blocked_callback.assert_called_once_with(rabbit._on_connection_blocked)
+        patched_connection.add_on_connection_unblocked_callback.assert_called_once_with(
+            rabbit._on_connection_unblocked)
+
+    def test_wait_for_flow_control_waits_while_connection_blocked(self, patch_pika):
+        patched_connection = patch_pika.BlockingConnection.return_value
+
+        with RabbitContext() as rabbit:
+            rabbit._on_connection_blocked(patched_connection, Method(0, Connection.Blocked(reason='low on memory')))
+            patched_connection.sleep.side_effect = lambda _duration: rabbit._on_connection_unblocked(
+                patched_connection, Method(0, Connection.Unblocked()))
+
+            rabbit.wait_for_flow_control()
+
+        patched_connection.process_data_events.assert_called_once_with(time_limit=0)
+        patched_connection.sleep.assert_called_once()
+        self.assertFalse(rabbit.connection_blocked)
+        patched_connection.channel.return_value.queue_declare.assert_not_called()
+
+    def test_wait_for_flow_control_waits_for_queue_to_drain_below_low_water_mark(self, patch_pika):
+        patched_channel = patch_pika.BlockingConnection.return_value.channel.return_value
+        patched_channel.queue_declare.side_effect = [queue_declare_ok(message_count)
+                                                     for message_count in (100, 90, 81, 80)]
+
+        with RabbitContext(queue_high_water_mark=100) as rabbit:
+            rabbit.wait_for_flow_control()
+
+        patched_channel.queue_declare.assert_called_with(queue=rabbit.queue_name, passive=True)
+        self.assertEqual(patched_channel.queue_declare.call_count, 4)
+        self.assertEqual(patch_pika.BlockingConnection.return_value.sleep.call_count, 3)
+
+    def test_wait_for_flow_control_does_not_wait_below_high_water_mark(self, patch_pika):
+        patched_channel = patch_pika.BlockingConnection.return_value.channel.return_value
+        patched_channel.queue_declare.return_value = queue_declare_ok(99)
+
+        with RabbitContext(queue_high_water_mark=100) as rabbit:
+            rabbit.wait_for_flow_control()
+
+        patched_channel.queue_declare.assert_called_once()
+        patch_pika.BlockingConnection.return_value.sleep.assert_not_called()
+
+
+class TestRabbitContextPublisherConfirmsOverSocket(TestCase):
+    # Confirms are read off a real connection here rather than a mocked channel, as waiting for them relies on the
+    # callbacks of the asynchronous channel waking the blocking connection
+    TIMEOUT = 10
+
+    def setUp(self):
+        self.fake_amqp_server = FakeAmqpServer()
+        self.fake_amqp_server.start()
+
+    def tearDown(self):
+        self.fake_amqp_server.stop()
+
+    def test_publish_waits_for_confirms_when_window_is_full(self):
+        rabbit = self.publish_messages_with_timeout(message_count=10, confirm_window=1)
+
+        self.assertEqual(rabbit.published_count, 10)
+        self.assertEqual(rabbit.confirmed_count, 10)
+        self.assertEqual(self.fake_amqp_server.published_count, 10)
+
+    def test_nacked_messages_are_republished(self):
+        self.fake_amqp_server.nack_delivery_tags.update({2, 4})
+
+        rabbit = self.publish_messages_with_timeout(message_count=5, confirm_window=3)
+
+        self.assertEqual(rabbit.published_count, 5)
+        self.assertEqual(rabbit.confirmed_count, 5)
+        self.assertEqual(self.fake_amqp_server.published_count, 7)
+
+    def publish_messages_with_timeout(self, message_count, confirm_window):
+        # A wait for confirms which never wakes up would hang the test run, so publish on a thread and fail if it
+        # doesn't finish
+        rabbit = RabbitContext(confirm_window=confirm_window, **self.fake_amqp_server.connection_kwargs())
+
+        def publish_messages():
+            with rabbit:
+                for message_number in range(message_count):
+                    rabbit.publish_message(f'message {message_number}', 'text')
+                rabbit.wait_for_confirms()
+
+        publisher = threading.Thread(target=publish_messages, daemon=True)
+        publisher.start()
+        publisher.join(self.TIMEOUT)
+        self.assertFalse(publisher.is_alive(), 'Waiting for publisher confirms did not return')
+        return rabbit
+
+
+def queue_declare_ok(message_count):
+    return Method(1, Queue.DeclareOk(message_count=message_count))
+
+
+def confirm_select_ok(ack_nack_callback, callback):
+    callback(Method(1, Confirm.SelectOk()))
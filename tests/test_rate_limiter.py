@@ -0,0 +1,75 @@
+from pathlib import Path
+from unittest import TestCase
+
+from rate_limiter import RatePhase, RateProfile, TokenBucketRateLimiter, read_rate_profile
+
+RESOURCE_FILE_PATH = Path(__file__).parent.joinpath('resources')
+
+
+class TestRateProfile(TestCase):
+
+    def test_read_rate_profile(self):
+        rate_profile = read_rate_profile(Path(__file__).parents[1].joinpath('rate_profile.csv'))
+
+        self.assertEqual(rate_profile.phases, [RatePhase('ramp', 60, 500, 5000), RatePhase('steady', 300, 5000, 5000),
+                                               RatePhase('burst', 30, 10000, 10000),
+                                               RatePhase('steady', 300, 5000, 5000)])
+
+    def test_read_rate_profile_with_invalid_phase_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            read_rate_profile(RESOURCE_FILE_PATH.joinpath('rate_profile_invalid_phase.csv'))
+
+    def test_rate_at_ramps_between_rates(self):
+        rate_profile = RateProfile([RatePhase('ramp', 10, 100, 200), RatePhase('burst', 5, 1000, 1000)])
+
+        self.assertEqual(rate_profile.rate_at(0)[1], 100)
+        self.assertEqual(rate_profile.rate_at(5)[1], 150)
+        self.assertEqual(rate_profile.rate_at(12), (RatePhase('burst', 5, 1000, 1000), 1000))
+
+    def test_rate_at_keeps_final_rate_after_profile_ends(self):
+        rate_profile = RateProfile([RatePhase('ramp', 10, 100, 200)])
+
+        self.assertEqual(rate_profile.rate_at(60)[1], 200)
+
+
+class TestTokenBucketRateLimiter(TestCase):
+
+    def setUp(self):
+        self.now = 0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration
+
+    def test_acquire_paces_to_target_rate(self):
+        rate_limiter = TokenBucketRateLimiter(RateProfile.constant(5000), clock=self.clock, sleep=self.sleep)
+
+        for _ in range(10001):
+            rate_limiter.acquire()
+
+        self.assertAlmostEqual(self.now, 2)
+
+    def test_acquire_catches_up_to_bucket_size_after_stall(self):
+        rate_limiter = TokenBucketRateLimiter(RateProfile.constant(5000), clock=self.clock, sleep=self.sleep)
+        rate_limiter.acquire()
+        self.now += 1
+
+        for _ in range(int(5000 * TokenBucketRateLimiter.BUCKET_SECONDS)):
+            rate_limiter.acquire()
+
+        self.assertEqual(self.now, 1)
+        rate_limiter.acquire()
+        self.assertGreater(self.now, 1)
+
+    def test_acquire_logs_achieved_and_target_rate(self):
+        rate_limiter = TokenBucketRateLimiter(RateProfile.constant(100), log_interval=1, clock=self.clock,
+                                              sleep=self.sleep)
+
+        with self.assertLogs('rate_limiter') as logs:
+            for _ in range(101):
+                rate_limiter.acquire()
+
+        self.assertEqual(logs.output, ['INFO:rate_limiter:Achieved 100 msgs/sec against target 100 msgs/sec in '
+                                       'steady phase'])
@@ -1,3 +1,4 @@
+import gzip
 import shutil
 from pathlib import Path
 from unittest import TestCase
@@ -148,3 +149,31 @@ class TestRedactSample(TestCase):
 
         # Then
         self.assertEqual(Path('sample_files/test_redacted_htc_only.csv'), output_path)
+
+    def test_redacted_file_output_path_compressed(self):
+        # Given
+        file_path = Path('sample_files/test.csv.gz')
+
+        # When
+        output_path = redact_sample.create_output_path(file_path, redact_htc_only=False, compression='zstd')
+
+        # Then
+        self.assertEqual(Path('sample_files/test_redacted.csv.zst'), output_path)
+
+    def test_redact_compressed_sample_valid_output(self):
+        # Given
+        sample_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('sample_file_1_per_treatment_code.csv.gz')
+        with open(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), 'rb') as sample_file, \
+                gzip.open(sample_file_path, 'wb') as compressed_sample_file:
+            shutil.copyfileobj(sample_file, compressed_sample_file)
+        sample_redacted_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath(
+            'sample_file_1_per_treatment_code_redacted.csv.gz')
+
+        # When
+        redact_sample.redact_sample_file(sample_file_path, sample_redacted_file_path, redact_htc_only=False)
+        validation_failures = SampleValidator().validate(sample_redacted_file_path)
+
+        # Then
+        self.assertEqual(validation_failures, [])
+        with gzip.open(sample_redacted_file_path, 'rt') as sample_redacted_file:
+            self.assertEqual(len(sample_redacted_file.readlines()), 34)
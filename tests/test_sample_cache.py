@@ -0,0 +1,109 @@
+import base64
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import Mock
+
+import google_crc32c
+
+from sample_cache import SampleCache
+
+
+def fake_blob(name, data):
+    blob = Mock(size=len(data), generation=1, crc32c=base64.b64encode(google_crc32c.Checksum(data).digest()).decode())
+    blob.name = name
+    blob.bucket.name = 'sample-bucket'
+    return blob
+
+
+class TestSampleCache(TestCase):
+
+    def setUp(self):
+        self.cache_directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.cache_directory)
+        self.now = 0
+        self.cache = SampleCache(self.cache_directory, max_bytes=100, clock=lambda: self.now)
+
+    def add_to_cache(self, blob, data):
+        self.cache.reserve(blob)
+        self.cache.object_path(blob).write_bytes(data)
+        self.cache.add(blob)
+
+    def test_get_missing_blob(self):
+        self.assertIsNone(self.cache.get(fake_blob('sample.csv', b'a' * 10)))
+
+    def test_get_cached_blob(self):
+        blob = fake_blob('sample.csv', b'a' * 10)
+        self.add_to_cache(blob, b'a' * 10)
+
+        self.assertEqual(self.cache.get(blob).read_bytes(), b'a' * 10)
+
+    def test_same_content_under_another_name_is_a_hit(self):
+        self.add_to_cache(fake_blob('sample.csv', b'a' * 10), b'a' * 10)
+
+        self.assertIsNotNone(self.cache.get(fake_blob('renamed_sample.csv', b'a' * 10)))
+        self.assertIsNone(self.cache.get(fake_blob('sample.csv', b'b' * 10)))
+
+    def test_least_recently_used_evicted_over_budget(self):
+        first_blob, second_blob, third_blob = (fake_blob(f'sample_{content}.csv', content * 40)
+                                               for content in (b'a', b'b', b'c'))
+        self.add_to_cache(first_blob, b'a' * 40)
+        self.now = 1
+        self.add_to_cache(second_blob, b'b' * 40)
+        self.now = 2
+        self.cache.get(first_blob)
+        self.now = 3
+
+        self.add_to_cache(third_blob, b'c' * 40)
+
+        self.assertIsNotNone(self.cache.get(first_blob))
+        self.assertIsNone(self.cache.get(second_blob))
+        self.assertFalse(self.cache.object_path(second_blob).exists())
+        self.assertIsNotNone(self.cache.get(third_blob))
+
+    def test_evicting_file_deleted_outside_cache(self):
+        first_blob, second_blob, third_blob = (fake_blob(f'sample_{content}.csv', content * 40)
+                                               for content in (b'a', b'b', b'c'))
+        self.add_to_cache(first_blob, b'a' * 40)
+        self.now = 1
+        self.add_to_cache(second_blob, b'b' * 40)
+        self.cache.object_path(first_blob).unlink()
+        self.now = 2
+
+        self.add_to_cache(third_blob, b'c' * 40)
+
+        self.assertEqual(set(json.loads(self.cache_directory.joinpath('index.json').read_text())),
+                         {self.cache.object_path(second_blob).name, self.cache.object_path(third_blob).name})
+
+    def test_cached_file_deleted_outside_cache_is_a_miss(self):
+        blob = fake_blob('sample.csv', b'a' * 10)
+        self.add_to_cache(blob, b'a' * 10)
+        self.cache.object_path(blob).unlink()
+
+        self.assertIsNone(self.cache.get(blob))
+        self.assertEqual(json.loads(self.cache_directory.joinpath('index.json').read_text()), {})
+
+    def test_cached_file_changed_outside_cache_is_a_miss(self):
+        blob = fake_blob('sample.csv', b'a' * 10)
+        self.add_to_cache(blob, b'a' * 10)
+        self.cache.object_path(blob).write_bytes(b'b' * 10)
+
+        self.assertIsNone(self.cache.get(blob))
+        self.assertFalse(self.cache.object_path(blob).exists())
+        self.assertEqual(json.loads(self.cache_directory.joinpath('index.json').read_text()), {})
+
+    def test_reserve_evicts_before_download(self):
+        first_blob, second_blob = (fake_blob(f'sample_{content}.csv', content * 60) for content in (b'a', b'b'))
+        self.add_to_cache(first_blob, b'a' * 60)
+
+        self.cache.reserve(second_blob)
+
+        self.assertFalse(self.cache.object_path(first_blob).exists())
+        self.assertIsNone(self.cache.get(first_blob))
+
+    def test_can_cache(self):
+        self.assertTrue(self.cache.can_cache(fake_blob('sample.csv', b'a' * 100)))
+        self.assertFalse(self.cache.can_cache(fake_blob('sample.csv', b'a' * 101)))
+        self.assertFalse(self.cache.can_cache(Mock(size=10, crc32c=None)))
@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from exceptions import SampleCheckpointError
+from sample_checkpoint import Checkpoint, checkpoint_path, read_checkpoint, start_checkpoint, write_checkpoint
+
+
+class TestSampleCheckpoint(TestCase):
+
+    def setUp(self):
+        self.sample_file_path = Path(tempfile.mkdtemp()).joinpath('sample.csv')
+        self.sample_file_path.write_text('UPRN\n1\n2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.sample_file_path.parent)
+
+    def test_checkpoint_path_is_next_to_sample_file(self):
+        self.assertEqual(checkpoint_path(self.sample_file_path), self.sample_file_path.parent.joinpath(
+            'sample.csv.checkpoint'))
+
+    def test_write_and_read_checkpoint(self):
+        checkpoint = start_checkpoint(self.sample_file_path, 7, 'test_ce_uuid', 'test_ap_uuid')._replace(row_count=1)
+
+        write_checkpoint(self.sample_file_path, checkpoint)
+
+        self.assertEqual(read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid'), checkpoint)
+        self.assertEqual(list(self.sample_file_path.parent.iterdir()),
+                         [self.sample_file_path, checkpoint_path(self.sample_file_path)])
+
+    def test_read_missing_checkpoint_raises_correct_exception(self):
+        with self.assertRaises(SampleCheckpointError):
+            read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
+
+    def test_read_checkpoint_for_different_collection_exercise_raises_correct_exception(self):
+        write_checkpoint(self.sample_file_path, start_checkpoint(self.sample_file_path, 7, 'other_ce_uuid',
+                                                                 'test_ap_uuid'))
+
+        with self.assertRaises(SampleCheckpointError):
+            read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
+
+    def test_read_checkpoint_beyond_end_of_file_raises_correct_exception(self):
+        write_checkpoint(self.sample_file_path, start_checkpoint(self.sample_file_path, 100, 'test_ce_uuid',
+                                                                 'test_ap_uuid'))
+
+        with self.assertRaises(SampleCheckpointError):
+            read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
+
+    def test_read_checkpoint_for_changed_sample_file_raises_correct_exception(self):
+        write_checkpoint(self.sample_file_path, start_checkpoint(self.sample_file_path, 7, 'test_ce_uuid',
+                                                                 'test_ap_uuid'))
+        self.sample_file_path.write_text('UPRN\n3\n4\n')
+        file_stat = self.sample_file_path.stat()
+        os.utime(self.sample_file_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1))
+
+        with self.assertRaises(SampleCheckpointError):
+            read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
+
+    def test_read_checkpoint_without_file_fingerprint_raises_correct_exception(self):
+        write_checkpoint(self.sample_file_path, Checkpoint(7, 1, 2, 'test_ce_uuid', 'test_ap_uuid'))
+
+        with self.assertRaises(SampleCheckpointError):
+            read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
+
+    def test_read_checkpoint_saved_by_different_version_raises_correct_exception(self):
+        checkpoint = start_checkpoint(self.sample_file_path, 7, 'test_ce_uuid', 'test_ap_uuid')._asdict()
+        checkpoint['line_count'] = checkpoint.pop('file_row_count')
+        checkpoint_path(self.sample_file_path).write_text(json.dumps(checkpoint))
+
+        with self.assertRaises(SampleCheckpointError):
+            read_checkpoint(self.sample_file_path, 'test_ce_uuid', 'test_ap_uuid')
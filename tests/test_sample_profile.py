@@ -0,0 +1,68 @@
+import json
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from sample_profile import DistinctCountSketch, SampleProfile
+
+
+class TestSampleProfile(TestCase):
+
+    def test_distinct_count_sketch_estimates(self):
+        for distinct_count in (10, 1000, 200000):
+            sketch = DistinctCountSketch()
+
+            sketch.add_values(str(10000000000 + uprn) for uprn in range(distinct_count))
+            sketch.add_values(str(10000000000 + uprn) for uprn in range(distinct_count))
+
+            self.assertAlmostEqual(sketch.estimate() / distinct_count, 1, delta=0.03)
+
+    def test_distinct_count_sketch_counts_values_with_same_crc32(self):
+        sketch = DistinctCountSketch()
+
+        sketch.add_values(['1784373664297', '2353156762959'])
+
+        self.assertEqual(sketch.estimate(), 2)
+
+    def test_distinct_count_sketch_update_merges_values(self):
+        sketch, other_sketch = DistinctCountSketch(), DistinctCountSketch()
+        sketch.add_values(f'AB{number} 1CD' for number in range(0, 60000))
+        other_sketch.add_values(f'AB{number} 1CD' for number in range(40000, 100000))
+
+        sketch.update(pickle.loads(pickle.dumps(other_sketch)))
+
+        self.assertAlmostEqual(sketch.estimate() / 100000, 1, delta=0.03)
+
+    def test_profile_counts(self):
+        sample_profile, other_sample_profile = SampleProfile(), SampleProfile()
+        sample_profile.add(('HH_LP1E', 'HH', 'U', 'E12000009', 'E06000052', '1', '', 'TR1 1AA', '1'))
+        sample_profile.add(('CE_LDIEE', 'CE', 'E', 'E12000009', 'E06000052', '', '40', 'TR1 1AA', '2'))
+        sample_profile.add_rows([('CE_LDIUE', 'CE', 'U', 'E12000009', 'E06000053', '', '7', 'TR1 1AB', '3'),
+                                 ('SPG_LPHUE', 'SPG', 'U', 'W92000004', 'W06000001', '2', '9', 'LL1 1AA', '4')])
+        other_sample_profile.add(('HH_LP1E', 'HH', 'U', 'E12000009', 'E06000052', '1', '', 'TR1 1AB', '5'))
+
+        sample_profile.update(other_sample_profile)
+
+        self.assertEqual(sample_profile.to_dict(), {
+            'row_count': 5,
+            'treatment_codes': {'CE_LDIEE': 1, 'CE_LDIUE': 1, 'HH_LP1E': 2, 'SPG_LPHUE': 1},
+            'address_types': {'CE': {'E': 1, 'U': 1}, 'HH': {'U': 2}, 'SPG': {'U': 1}},
+            'regions': {'E12000009': 4, 'W92000004': 1},
+            'lads': {'E06000052': 3, 'E06000053': 1, 'W06000001': 1},
+            'print_batches': {'': 2, '1': 2, '2': 1},
+            'ce_expected_capacity': {'total': 47, 'by_address_level': {'E': 40, 'U': 7},
+                                     'by_treatment_code': {'CE_LDIEE': 40, 'CE_LDIUE': 7}},
+            'approximate_distinct_postcodes': 3,
+            'approximate_distinct_uprns': 5})
+
+    def test_write(self):
+        profile_directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, profile_directory)
+        sample_profile = SampleProfile()
+        sample_profile.add(('HH_LP1E', 'HH', 'U', 'E12000009', 'E06000052', '1', '', 'TR1 1AA', '1'))
+
+        sample_profile.write(profile_directory.joinpath('profile.json'))
+
+        self.assertEqual(json.loads(profile_directory.joinpath('profile.json').read_text()), sample_profile.to_dict())
@@ -0,0 +1,49 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from sample_unit_store import JsonlSampleUnitStore, RedisSampleUnitStore
+from tests.support.fake_redis import FakeRedis
+
+
+class TestRedisSampleUnitStore(TestCase):
+
+    def test_sample_units_written_in_batches(self):
+        fake_redis = FakeRedis()
+
+        with RedisSampleUnitStore(batch_size=3, redis_client=fake_redis) as sample_unit_store:
+            for sample_unit_number in range(7):
+                sample_unit_store.add(f'sampleunit:{sample_unit_number}', f'{{"id": "{sample_unit_number}"}}')
+            self.assertEqual(fake_redis.mset_sizes, [3, 3])
+
+        self.assertEqual(fake_redis.mset_sizes, [3, 3, 1])
+        self.assertEqual(len(fake_redis.store), 7)
+        self.assertEqual(fake_redis.store['sampleunit:6'], '{"id": "6"}')
+        self.assertEqual(sample_unit_store.stored_count, 7)
+
+    def test_flush_with_empty_batch_does_not_write(self):
+        fake_redis = FakeRedis()
+
+        with RedisSampleUnitStore(redis_client=fake_redis) as sample_unit_store:
+            sample_unit_store.flush()
+
+        self.assertEqual(fake_redis.mset_sizes, [])
+
+
+class TestJsonlSampleUnitStore(TestCase):
+
+    def setUp(self):
+        self.sample_unit_file_path = Path(tempfile.mkdtemp()).joinpath('sample_units.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.sample_unit_file_path.parent)
+
+    def test_sample_units_appended_as_json_lines(self):
+        for sample_unit_number in range(2):
+            with JsonlSampleUnitStore(self.sample_unit_file_path) as sample_unit_store:
+                sample_unit_store.add(f'sampleunit:{sample_unit_number}', json.dumps({'id': str(sample_unit_number)}))
+
+        self.assertEqual([json.loads(line) for line in self.sample_unit_file_path.read_text().splitlines()],
+                         [{'id': '0'}, {'id': '1'}])
@@ -0,0 +1,61 @@
+import random
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from sampled_validation import FailureRateEstimator, read_rows_at_random_offsets, sample_data_size, wilson_interval
+from validate_sample import ValidationFailure
+
+
+class TestSampledValidation(TestCase):
+
+    def setUp(self):
+        self.sample_directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.sample_directory)
+
+    def test_read_rows_at_random_offsets(self):
+        sample_file_path = self.sample_directory.joinpath('sample.csv')
+        sample_file_path.write_bytes(b'A,B\n1,one\n22,"two\nlines"\n333,three\n')
+
+        sampled_rows = list(read_rows_at_random_offsets(sample_file_path, 200, 2, random.Random(1)))
+
+        self.assertEqual(len(sampled_rows), 200)
+        self.assertEqual({tuple(sampled_row[0]) if sampled_row else None for sampled_row in sampled_rows},
+                         {('1', 'one'), ('22', 'two\nlines'), ('333', 'three'), None})
+        self.assertEqual({sampled_row[1] for sampled_row in sampled_rows if sampled_row},
+                         {len(b'1,one\n'), len(b'22,"two\nlines"\n'), len(b'333,three\n')})
+        self.assertEqual(sample_data_size(sample_file_path), len(b'1,one\n22,"two\nlines"\n333,three\n'))
+
+    def test_read_rows_at_random_offsets_without_rows(self):
+        sample_file_path = self.sample_directory.joinpath('sample.csv')
+        sample_file_path.write_bytes(b'A,B\n')
+
+        self.assertEqual(list(read_rows_at_random_offsets(sample_file_path, 10, 2)), [])
+
+    def test_failure_rates_weighted_by_inverse_row_length(self):
+        failure_rates = FailureRateEstimator(['A', 'B'], data_size=300)
+        failure = ValidationFailure(None, 'B', 'Empty mandatory value', 'mandatory')
+
+        failure_rates.add(10, [])
+        failure_rates.add(10, [])
+        failure_rates.add(20, [failure, failure])
+        failure_rates.add_skipped_row()
+
+        estimate, any_column_estimate = failure_rates.estimates()
+        self.assertEqual(estimate[:3], ('B', 1, 0.2))
+        self.assertEqual(estimate.example, 'Empty mandatory value')
+        self.assertEqual(any_column_estimate[:3], ('any column', 1, 0.2))
+        self.assertLess(estimate.lower, 0.2)
+        self.assertGreater(estimate.upper, 0.2)
+        self.assertEqual(failure_rates.failing_row_count, 1)
+        self.assertEqual(failure_rates.estimated_row_count(), 25)
+        self.assertEqual(failure_rates.summary_lines()[0],
+                         'Sampled 3 rows of an estimated 25, skipped 1 which could not be read from their offset')
+
+    def test_wilson_interval(self):
+        lower, upper = wilson_interval(0.5, 100)
+
+        self.assertAlmostEqual(lower, 0.4038, places=4)
+        self.assertAlmostEqual(upper, 0.5962, places=4)
+        self.assertEqual(wilson_interval(0.0, 100)[0], 0.0)
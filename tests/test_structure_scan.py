@@ -0,0 +1,64 @@
+import csv
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from structure_scan import StructureFailure, scan_sample_file
+
+
+class TestStructureScan(TestCase):
+
+    def setUp(self):
+        self.sample_directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.sample_directory)
+
+    def write_sample_file(self, sample_file_bytes):
+        sample_file_path = self.sample_directory.joinpath('sample.csv')
+        sample_file_path.write_bytes(sample_file_bytes)
+        return sample_file_path
+
+    def test_scan_valid_file(self):
+        sample_file_path = self.sample_directory.joinpath('sample.csv')
+        with open(sample_file_path, 'w', newline='') as sample_file:
+            writer = csv.writer(sample_file)
+            writer.writerow(['UPRN', 'ADDRESS_LINE1', 'TOWN_NAME'])
+            for uprn in range(500):
+                writer.writerow([uprn, f'Flat "{uprn}",\r\n{uprn} Street' if uprn % 7 else f'{uprn} Street', 'Tŵn'])
+            sample_file.write('\r\n')
+
+        for block_size in (16, 256, 1024 * 1024):
+            self.assertEqual(list(scan_sample_file(sample_file_path, block_size=block_size)), [])
+
+    def test_scan_finds_every_failing_row(self):
+        sample_file_path = self.write_sample_file(b'A,B,C\r\n'
+                                                  b'1,2,3\r\n'
+                                                  b'1,2\r\n'
+                                                  b'\r\n'
+                                                  b'1,\xff,3\r\n'
+                                                  b'1,"2\r\n2",3\n'
+                                                  b'1,2\r3\r\n'
+                                                  b'1,2,3,"4,5"\r\n'
+                                                  b'1,2,3')
+
+        for block_size in (8, 1024):
+            self.assertEqual(list(scan_sample_file(sample_file_path, block_size=block_size)), [
+                StructureFailure(3, 14, 'Row has 2 field(s), expected 3 like the header', 'field_count'),
+                StructureFailure(4, 23, 'Invalid file encoding, requires utf-8, byte 0xff at byte offset 23 is not '
+                                        'valid utf-8', 'encoding'),
+                StructureFailure(5, 38, "Line ends with '\\n' at byte offset 38, expected '\\r\\n' like the header",
+                                 'line_ending'),
+                StructureFailure(6, 42, "Line break '\\r' at byte offset 42, expected '\\r\\n' like the header",
+                                 'line_ending'),
+                StructureFailure(6, 39, 'Row has 2 field(s), expected 3 like the header', 'field_count'),
+                StructureFailure(7, 46, 'Row has 4 field(s), expected 3 like the header', 'field_count')])
+
+    def test_scan_unclosed_quote_carries_on_from_the_next_line(self):
+        sample_file_path = self.write_sample_file(b'A,B\n1,"2\n' + b'1,2\n' * 3 + b'1\n')
+
+        self.assertEqual(list(scan_sample_file(sample_file_path, max_row_lines=3)), [
+            StructureFailure(2, 4, 'Quoted field is not closed within 3 line(s)', 'quotes'),
+            StructureFailure(6, 21, 'Row has 1 field(s), expected 2 like the header', 'field_count')])
+
+    def test_scan_empty_file(self):
+        self.assertEqual(list(scan_sample_file(self.write_sample_file(b''))), [])
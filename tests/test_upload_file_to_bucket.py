@@ -0,0 +1,117 @@
+from unittest.mock import patch
+
+import pytest
+from google.api_core.exceptions import BadRequest
+
+from exceptions import SampleUploadChecksumError
+from tests.support.fake_gcs import FakeGcsServer
+from upload_file_to_bucket import parallel_composite_upload, upload_file_to_bucket, _file_crc32c
+
+SAMPLE_DATA = b''.join(b'%d,Flat %d,Windleybury\n' % (line_number, line_number) for line_number in range(5000))
+PART_SIZE = 10000
+
+
+@pytest.fixture
+def fake_gcs():
+    with FakeGcsServer() as fake_gcs_server:
+        yield fake_gcs_server
+
+
+@pytest.fixture
+def sample_file(tmp_path):
+    sample_file_path = tmp_path.joinpath('sample_file.csv')
+    sample_file_path.write_bytes(SAMPLE_DATA)
+    return sample_file_path
+
+
+def test_upload_file_to_bucket_single_stream(fake_gcs, sample_file):
+    with fake_gcs.emulator_environment():
+        upload_file_to_bucket(sample_file, 'test', 'sample-bucket')
+
+    assert fake_gcs.blobs == {('sample-bucket', 'sample_file.csv'): SAMPLE_DATA}
+
+
+def test_upload_file_to_bucket_parallel_composite(fake_gcs, sample_file):
+    with fake_gcs.emulator_environment():
+        upload_file_to_bucket(sample_file, 'test', 'sample-bucket', workers=4, part_size=PART_SIZE)
+
+    assert fake_gcs.blobs == {('sample-bucket', 'sample_file.csv'): SAMPLE_DATA}
+    assert len(fake_gcs.upload_attempts) == len(range(0, len(SAMPLE_DATA), PART_SIZE))
+
+
+def test_parallel_composite_upload_has_content_type_of_single_stream_upload(fake_gcs, sample_file):
+    with fake_gcs.emulator_environment():
+        upload_file_to_bucket(sample_file, 'test', 'sample-bucket')
+        single_stream_content_type = fake_gcs.content_types[('sample-bucket', 'sample_file.csv')]
+        upload_file_to_bucket(sample_file, 'test', 'sample-bucket', workers=4, part_size=PART_SIZE)
+
+    assert single_stream_content_type == 'text/csv'
+    assert fake_gcs.content_types[('sample-bucket', 'sample_file.csv')] == single_stream_content_type
+
+
+def test_parallel_composite_upload_composes_more_than_32_parts(fake_gcs, sample_file):
+    bucket = fake_gcs.client().bucket('sample-bucket')
+
+    blob = parallel_composite_upload(bucket, sample_file, workers=8, part_size=1000)
+
+    assert blob.size == len(SAMPLE_DATA)
+    assert fake_gcs.blobs == {('sample-bucket', 'sample_file.csv'): SAMPLE_DATA}
+
+
+def test_parallel_composite_upload_empty_file(fake_gcs, tmp_path):
+    empty_file_path = tmp_path.joinpath('empty.csv')
+    empty_file_path.write_bytes(b'')
+
+    parallel_composite_upload(fake_gcs.client().bucket('sample-bucket'), empty_file_path, workers=2)
+
+    assert fake_gcs.blobs == {('sample-bucket', 'empty.csv'): b''}
+
+
+def test_parallel_composite_upload_retries_only_failed_part(fake_gcs, sample_file):
+    bucket = fake_gcs.client().bucket('sample-bucket')
+    with patch('upload_file_to_bucket.uuid') as patched_uuid:
+        patched_uuid.uuid4.return_value.hex = 'upload'
+        fake_gcs.fail_next_upload_of('sample_file.csv.parts/upload/00003')
+
+        parallel_composite_upload(bucket, sample_file, workers=4, part_size=PART_SIZE)
+
+    assert fake_gcs.blobs == {('sample-bucket', 'sample_file.csv'): SAMPLE_DATA}
+    assert fake_gcs.upload_attempts.count('sample_file.csv.parts/upload/00003') == 2
+    assert all(fake_gcs.upload_attempts.count(name) == 1 for name in fake_gcs.upload_attempts
+               if name != 'sample_file.csv.parts/upload/00003')
+
+
+def test_parallel_composite_upload_retries_corrupted_part(fake_gcs, sample_file):
+    bucket = fake_gcs.client().bucket('sample-bucket')
+    with patch('upload_file_to_bucket.uuid') as patched_uuid:
+        patched_uuid.uuid4.return_value.hex = 'upload'
+        fake_gcs.corrupt_next_upload_of('sample_file.csv.parts/upload/00002')
+
+        parallel_composite_upload(bucket, sample_file, workers=4, part_size=PART_SIZE)
+
+    assert fake_gcs.blobs == {('sample-bucket', 'sample_file.csv'): SAMPLE_DATA}
+    assert fake_gcs.upload_attempts.count('sample_file.csv.parts/upload/00002') == 2
+
+
+def test_parallel_composite_upload_failure_cleans_up_parts(fake_gcs, sample_file):
+    bucket = fake_gcs.client().bucket('sample-bucket')
+    with patch('upload_file_to_bucket.uuid') as patched_uuid, patch('upload_file_to_bucket.MAX_PART_ATTEMPTS', 1):
+        patched_uuid.uuid4.return_value.hex = 'upload'
+        fake_gcs.fail_next_upload_of('sample_file.csv.parts/upload/00001')
+
+        with pytest.raises(BadRequest):
+            parallel_composite_upload(bucket, sample_file, workers=4, part_size=PART_SIZE)
+
+    assert fake_gcs.blobs == {}
+
+
+def test_parallel_composite_upload_checksum_mismatch(fake_gcs, sample_file):
+    bucket = fake_gcs.client().bucket('sample-bucket')
+
+    # Only the checksum of the whole file is wrong, so the parts upload and the composed object fails the check
+    with patch('upload_file_to_bucket._file_crc32c', side_effect=lambda file_path, *part_range: (
+            _file_crc32c(file_path, *part_range) if part_range else 'AAAAAA==')), \
+            pytest.raises(SampleUploadChecksumError):
+        parallel_composite_upload(bucket, sample_file, workers=4, part_size=PART_SIZE)
+
+    assert fake_gcs.blobs == {}
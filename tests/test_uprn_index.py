@@ -0,0 +1,83 @@
+import pickle
+from unittest import TestCase
+
+from uprn_index import UprnIndex
+
+
+class TestUprnIndex(TestCase):
+
+    def test_find_duplicate_uprns(self):
+        uprn_index = UprnIndex()
+
+        uprn_index.add_rows([('100', '100', 'U'), ('356', '356', 'U'), ('100', '100', 'U'), ('not a uprn', '', 'U'),
+                             ('9999999999999', '1', 'U'), ('356', '356', 'U'), ('100', '100', 'U')])
+        uprn_index.add('9999999999999', '1', 'U')
+
+        self.assertEqual(uprn_index.row_count, 8)
+        self.assertEqual(list(uprn_index.find_duplicate_uprns()),
+                         [(2, '100', 0), (5, '356', 1), (6, '100', 0), (7, '9999999999999', 4)])
+
+    def test_find_duplicate_uprns_none(self):
+        uprn_index = UprnIndex()
+
+        uprn_index.add_rows((str(uprn), str(uprn), 'U') for uprn in range(1000, 5000))
+
+        self.assertEqual(list(uprn_index.find_duplicate_uprns()), [])
+
+    def test_uprns_differing_in_leading_zeros_are_not_duplicates(self):
+        uprn_index = UprnIndex(estab_references=True)
+
+        uprn_index.add_rows([('123', '123', 'E'), ('0123', '0123', 'U'), ('00123', '123', 'U'), ('0123', '0123', 'U'),
+                             ('0', '0', 'U'), ('00', '0123', 'U')])
+
+        self.assertEqual(list(uprn_index.find_duplicate_uprns()), [(3, '0123', 1)])
+        self.assertEqual(list(uprn_index.find_unresolved_estab_references()), [(5, '0123', 1)])
+
+    def test_find_unresolved_estab_references(self):
+        uprn_index = UprnIndex(estab_references=True)
+
+        uprn_index.add_rows([('10', '10', 'E'),
+                             ('11', '10', 'U'),
+                             ('12', '12', 'U'),
+                             ('13', '12', 'U'),
+                             ('14', '266', 'U'),
+                             ('15', '', 'U'),
+                             ('16', '11', 'E')])
+
+        self.assertEqual(list(uprn_index.find_unresolved_estab_references()), [(3, '12', 2), (4, '266', None)])
+
+    def test_estab_references_only_indexed_when_checked(self):
+        uprn_index = UprnIndex()
+
+        uprn_index.add_rows([('11', '10', 'U')])
+
+        self.assertEqual(list(uprn_index.find_unresolved_estab_references()), [])
+
+    def test_update_adds_rows_after_existing_rows(self):
+        uprn_index, chunk_uprn_index = UprnIndex(estab_references=True), UprnIndex(estab_references=True)
+        uprn_index.add_rows([('10', '10', 'E'), ('11', '10', 'U')])
+        chunk_uprn_index.add_rows([('12', '10', 'U'), ('11', '99', 'U')])
+
+        uprn_index.update(pickle.loads(pickle.dumps(chunk_uprn_index)))
+
+        self.assertEqual(uprn_index.row_count, 4)
+        self.assertEqual(list(uprn_index.find_duplicate_uprns()), [(3, '11', 1)])
+        self.assertEqual(list(uprn_index.find_unresolved_estab_references()), [(3, '99', None)])
+
+    def test_too_many_rows(self):
+        uprn_index = UprnIndex()
+        uprn_index.row_count = UprnIndex.MAX_ROWS
+
+        with self.assertRaises(ValueError):
+            uprn_index.add('10', '10', 'U')
+
+    def test_to_bytes_round_trip(self):
+        uprn_index = UprnIndex(estab_references=True)
+        uprn_index.add_rows([('10', '10', 'E'), ('11', '10', 'U'), ('11', '99', 'U'), ('x', '', 'U')])
+
+        copied_uprn_index = UprnIndex.from_bytes(uprn_index.to_bytes())
+
+        self.assertEqual(copied_uprn_index.row_count, 4)
+        self.assertTrue(copied_uprn_index.estab_references)
+        self.assertEqual(list(copied_uprn_index.find_duplicate_uprns()), [(2, '11', 1)])
+        self.assertEqual(list(copied_uprn_index.find_unresolved_estab_references()), [(2, '99', None)])
@@ -1,9 +1,20 @@
+import csv
+import functools
+import gzip
+import io
+import json
+import random
 import shutil
 from pathlib import Path
 from unittest import TestCase
+from unittest.mock import patch
 
+from exceptions import SampleValidationError
 from generate_sample_file import SampleGenerator
-from validate_sample import SampleValidator
+from tests.support.fake_gcs import FakeGcsServer
+import validate_sample
+import validation_cache
+from validate_sample import ENGINES, SampleValidator, chunk_byte_ranges, find_column_validation_failures, main
 
 
 class TestValidateSample(TestCase):
@@ -41,6 +52,100 @@ class TestValidateSample(TestCase):
         failure = validation_failures[0]
         self.assertEqual(failure.line_number, 2)
         self.assertEqual(failure.column, 'TREATMENT_CODE')
+        self.assertEqual(failure.rule, 'in_set')
+
+    def test_compiled_validation_plan_matches_validating_one_validator_at_a_time(self):
+        # Given
+        sample_validator = SampleValidator()
+        reference_validator = SampleValidator()
+        with open(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            valid_row = next(csv.DictReader(sample_file))
+        invalid_rows = [valid_row, {**valid_row, 'UPRN': ' 123'}, {**valid_row, 'ADDRESS_TYPE': 'XX'},
+                        {**valid_row, 'LATITUDE': '1234.5678901'}, {**valid_row, 'LONGITUDE': '200.0'},
+                        {**valid_row, 'POSTCODE': 'AB1|2CD', 'TOWN_NAME': ''},
+                        {**valid_row, 'REGION': 'Z0000000', 'ADDRESS_LINE1': 'a' * 61},
+                        {**valid_row, 'ADDRESS_TYPE': 'CE', 'ADDRESS_LEVEL': 'U', 'CE_EXPECTED_CAPACITY': '0'}]
+
+        for line_number, row in enumerate(invalid_rows, 2):
+            # When
+            failures = sample_validator.find_row_validation_failures(line_number, row)
+
+            # Then
+            expected_failures = [failure for column, validators in reference_validator.schema.items()
+                                 for failure in find_column_validation_failures(line_number, row, column, validators)]
+            self.assertEqual([(failure.line_number, failure.column, str(failure.description)) for failure in failures],
+                             [(failure.line_number, failure.column, str(failure.description))
+                              for failure in expected_failures])
+            self.assertEqual(bool(failures), line_number != 2)
+
+    def test_memoized_validation_matches_validating_one_validator_at_a_time(self):
+        # Given
+        sample_validator = SampleValidator()
+        reference_validator = SampleValidator(memoization_cache_size=0)
+        with open(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            valid_row = next(csv.DictReader(sample_file))
+        invalid_row = {**valid_row, 'ADDRESS_TYPE': 'XX', 'POSTCODE': 'AB1|2CD'}
+        rows = [valid_row, invalid_row, valid_row, invalid_row]
+
+        for line_number, row in enumerate(rows, 2):
+            # When
+            failures = sample_validator.find_row_validation_failures(line_number, row)
+
+            # Then the invalid values fail every time, as only passing values are cached
+            expected_failures = reference_validator.find_row_validation_failures(line_number, row)
+            self.assertEqual([(failure.line_number, failure.column, str(failure.description)) for failure in failures],
+                             [(failure.line_number, failure.column, str(failure.description))
+                              for failure in expected_failures])
+            self.assertEqual(bool(failures), row is invalid_row)
+        self.assertEqual(sample_validator.memoization_stats()['ADDRESS_TYPE'], (1, 3))
+        self.assertEqual(sample_validator.memoization_stats()['ESTAB_TYPE'], (3, 1))
+        self.assertEqual(reference_validator.memoization_stats(), {})
+
+    def test_memoization_stops_for_columns_with_many_distinct_values(self):
+        # Given
+        sample_validator = SampleValidator()
+        with open(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            valid_row = next(csv.DictReader(sample_file))
+
+        # When
+        with patch('validators.ValidValueCache.MIN_LOOKUPS', 10):
+            failures = [failure for line_number in range(2, 22) for failure in sample_validator
+                        .find_row_validation_failures(line_number, {**valid_row, 'PRINT_BATCH': str(line_number)})]
+
+        # Then
+        self.assertEqual(failures, [])
+        self.assertEqual(sample_validator.memoization_stats()['PRINT_BATCH'], (0, 10))
+        self.assertEqual(sample_validator.memoization_stats()['ESTAB_TYPE'], (19, 1))
+        self.assertNotIn('PRINT_BATCH', sample_validator._get_memoized_plan()[0])
+
+    def test_generate_and_validate_compressed_sample(self):
+        # Given
+        sample_validator = SampleValidator()
+        generated_sample_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('generated_sample.csv.gz')
+        treatment_code_quantities_path = self.RESOURCE_FILE_PATH.joinpath('treatment_code_quantities_1_per.csv')
+
+        # When
+        SampleGenerator().generate_sample_file(generated_sample_file_path, treatment_code_quantities_path)
+        validation_failures = sample_validator.validate(generated_sample_file_path)
+
+        # Then
+        self.assertEqual(validation_failures, [])
+        with gzip.open(generated_sample_file_path, 'rt') as generated_sample_file:
+            self.assertEqual(len(generated_sample_file.readlines()), 34)
+
+    def test_validate_sample_streamed_from_gcs(self):
+        # Given
+        sample_validator = SampleValidator()
+        with FakeGcsServer() as fake_gcs, fake_gcs.emulator_environment():
+            fake_gcs.add_blob('sample-bucket', 'sample_file.csv', self.RESOURCE_FILE_PATH.joinpath(
+                'sample_file_invalid_treatment_code.csv').read_bytes())
+
+            # When
+            validation_failures = sample_validator.validate('gs://sample-bucket/sample_file.csv')
+
+        # Then
+        self.assertEqual(len(validation_failures), 1)
+        self.assertEqual(validation_failures[0].column, 'TREATMENT_CODE')
 
     def test_generate_and_validate_random_uprns(self):
         # Given
@@ -69,3 +174,376 @@ class TestValidateSample(TestCase):
 
         # Then
         self.assertEqual(validation_failures, [])
+
+    def write_sample_file_with_quoted_line_breaks(self):
+        # Copies of the valid rows with quoted line breaks and escaped quotes, with some of the rows made invalid
+        with open(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_file_reader = csv.DictReader(sample_file)
+            valid_rows = list(sample_file_reader)
+        sample_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('sample_file_quoted_line_breaks.csv')
+        with open(sample_file_path, 'w', newline='') as sample_file:
+            writer = csv.DictWriter(sample_file, fieldnames=sample_file_reader.fieldnames)
+            writer.writeheader()
+            for copy in range(10):
+                for index, row in enumerate(valid_rows):
+                    writer.writerow({**row, 'ADDRESS_LINE2': f'Flat "{copy}"\n{index}\n',
+                                     'ADDRESS_LINE3': 'Quoted, "again"\n' if index % 3 else '',
+                                     'TREATMENT_CODE': row['TREATMENT_CODE'] if index % 7 else 'NOT_A_CODE'})
+        return sample_file_path
+
+    def test_chunk_byte_ranges_split_outside_quoted_line_breaks(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+
+        # When
+        chunks = chunk_byte_ranges(sample_file_path, 7, block_size=1000)
+
+        # Then every chunk holds whole rows and together they hold every row once
+        sample_file_bytes = sample_file_path.read_bytes()
+        self.assertEqual(len(chunks), 7)
+        self.assertEqual(chunks[0][0], sample_file_bytes.index(b'\n') + 1)
+        self.assertEqual(chunks[-1][1], len(sample_file_bytes))
+        chunk_rows = []
+        for start, end in chunks:
+            chunk = sample_file_bytes[start:end].decode()
+            self.assertEqual(chunk.count('"') % 2, 0)
+            chunk_rows.extend(csv.reader(io.StringIO(chunk)))
+        self.assertEqual(chunk_rows, list(csv.reader(io.StringIO(sample_file_bytes.decode())))[1:])
+
+    def test_validate_sample_in_parallel_matches_single_process(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+
+        # When
+        validation_failures = SampleValidator().validate(sample_file_path)
+        parallel_validation_failures = SampleValidator().validate(sample_file_path, jobs=4)
+
+        # Then
+        self.assertIn('TREATMENT_CODE', {failure.column for failure in validation_failures})
+        self.assertEqual([(failure.line_number, failure.column, str(failure.description))
+                          for failure in parallel_validation_failures],
+                         [(failure.line_number, failure.column, str(failure.description))
+                          for failure in validation_failures])
+
+    def test_validate_compressed_sample_in_parallel_not_supported(self):
+        # Given
+        sample_validator = SampleValidator()
+
+        # When, then raises
+        with self.assertRaises(ValueError):
+            sample_validator.validate(self.TMP_TEST_DIRECTORY_PATH.joinpath('sample_file.csv.gz'), jobs=2)
+
+    def test_validate_sample_columnar_matches_row_engine(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        with open(sample_file_path, 'a', newline='') as sample_file:
+            sample_file.write('\n')
+            sample_file.write(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv').read_text()
+                              .splitlines()[1] + ',extra\n')
+
+        # When the rows with extra values are validated, rather than stopping at their structure failures
+        validation_failures = SampleValidator().validate(sample_file_path, scan_structure=False)
+        columnar_validation_failures = SampleValidator().validate(sample_file_path, engine='columnar',
+                                                                  scan_structure=False)
+
+        # Then
+        self.assertEqual([(failure.line_number, failure.column, str(failure.description))
+                          for failure in columnar_validation_failures],
+                         [(failure.line_number, failure.column, str(failure.description))
+                          for failure in validation_failures])
+
+    def test_validate_sample_columnar_in_parallel_matches_row_engine(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+
+        # When
+        validation_failures = SampleValidator().validate(sample_file_path)
+        columnar_validation_failures = SampleValidator().validate(sample_file_path, jobs=3, engine='columnar')
+
+        # Then
+        self.assertEqual([(failure.line_number, failure.column, str(failure.description))
+                          for failure in columnar_validation_failures],
+                         [(failure.line_number, failure.column, str(failure.description))
+                          for failure in validation_failures])
+
+    def test_validate_sample_in_parallel_uses_customised_schema(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        expected_failures = SampleValidator().validate(sample_file_path)
+
+        for engine in ENGINES:
+            for cache_file_path in (None, self.TMP_TEST_DIRECTORY_PATH.joinpath(f'{engine}.validation-cache')):
+                sample_validator = SampleValidator()
+                sample_validator.schema['TREATMENT_CODE'] = []
+
+                # When
+                validation_failures = sample_validator.validate(sample_file_path, jobs=3, engine=engine,
+                                                                cache_file_path=cache_file_path)
+
+                # Then
+                self.assertEqual([(failure.line_number, failure.column, str(failure.description))
+                                  for failure in validation_failures],
+                                 [(failure.line_number, failure.column, str(failure.description))
+                                  for failure in expected_failures if failure.column != 'TREATMENT_CODE'])
+
+    def test_validate_sample_unknown_engine(self):
+        # When, then raises
+        with self.assertRaises(ValueError):
+            SampleValidator().validate(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'),
+                                       engine='numpy')
+
+    def test_iter_validation_failures_stops_reading_when_closed(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        validation_failures = SampleValidator().iter_validation_failures(sample_file_path)
+
+        # When
+        first_failures = [next(validation_failures) for _ in range(3)]
+        validation_failures.close()
+
+        # Then
+        self.assertEqual([(failure.line_number, failure.column, str(failure.description))
+                          for failure in first_failures],
+                         [(failure.line_number, failure.column, str(failure.description))
+                          for failure in SampleValidator().validate(sample_file_path)[:3]])
+
+    def test_validate_sample_duplicate_uprns(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+
+        for jobs, engine in ((1, 'row'), (1, 'columnar'), (3, 'row')):
+            # When
+            validation_failures = SampleValidator().validate(sample_file_path, jobs=jobs, engine=engine)
+
+            # Then every copy of the rows after the first fails, after the failures of the rows themselves
+            duplicate_uprn_failures = [failure for failure in validation_failures if failure.rule == 'unique']
+            self.assertEqual(len(duplicate_uprn_failures), 33 * 9)
+            self.assertEqual(validation_failures[-len(duplicate_uprn_failures):], duplicate_uprn_failures)
+            self.assertEqual(duplicate_uprn_failures[0].line_number, 35)
+            self.assertEqual(duplicate_uprn_failures[0].column, 'UPRN')
+            self.assertRegex(duplicate_uprn_failures[0].description, r'UPRN \d+ is not unique, it is also on line 2')
+
+    def test_validate_sample_estab_references(self):
+        # Given
+        with open(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv')) as sample_file:
+            sample_file_reader = csv.DictReader(sample_file)
+            rows = list(sample_file_reader)[:6]
+        rows[0]['ADDRESS_LEVEL'] = 'E'
+        rows[1]['ESTAB_UPRN'] = rows[0]['UPRN']
+        rows[2]['ESTAB_UPRN'] = rows[2]['UPRN']
+        rows[3]['ESTAB_UPRN'] = rows[2]['UPRN']
+        sample_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('sample_file_estab_references.csv')
+        with open(sample_file_path, 'w', newline='') as sample_file:
+            writer = csv.DictWriter(sample_file, fieldnames=sample_file_reader.fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+        for jobs, engine in ((1, 'row'), (1, 'columnar'), (2, 'columnar')):
+            # When
+            validation_failures = SampleValidator(check_estab_references=True).validate(sample_file_path, jobs=jobs,
+                                                                                        engine=engine)
+
+            # Then
+            self.assertEqual([(failure.line_number, failure.column, failure.description) for failure
+                              in validation_failures if failure.rule == 'estab_reference'],
+                             [(5, 'ESTAB_UPRN', f'ESTAB_UPRN {rows[2]["UPRN"]} is the UPRN on line 4, which is not '
+                                                f'an estab'),
+                              (6, 'ESTAB_UPRN', f'ESTAB_UPRN {rows[4]["ESTAB_UPRN"]} is not the UPRN of an estab in '
+                                                f'the sample file'),
+                              (7, 'ESTAB_UPRN', f'ESTAB_UPRN {rows[5]["ESTAB_UPRN"]} is not the UPRN of an estab in '
+                                                f'the sample file')])
+        self.assertFalse([failure for failure in SampleValidator().validate(sample_file_path)
+                          if failure.rule == 'estab_reference'])
+
+    def test_validate_sample_structure_failures_stop_row_validation(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        sample_file_rows = sample_file_path.read_bytes().split(b'\r\n')
+        sample_file_rows[5] = sample_file_rows[5].replace(b'HH', b'H\xe9', 1)
+        sample_file_rows[20] += b',extra'
+        sample_file_path.write_bytes(b'\r\n'.join(sample_file_rows))
+
+        for jobs, engine in ((1, 'row'), (2, 'columnar')):
+            # When
+            validation_failures = SampleValidator().validate(sample_file_path, jobs=jobs, engine=engine)
+
+            # Then every failing row is found, and no values are validated
+            self.assertEqual([(failure.line_number, failure.column, failure.rule) for failure in validation_failures],
+                             [(6, None, 'encoding'), (21, None, 'field_count')])
+            self.assertRegex(validation_failures[0].description, r'byte 0xe9 at byte offset \d+ is not valid utf-8')
+
+    def test_main_structure_only(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+
+        # When
+        with patch('sys.argv', ['validate_sample.py', str(sample_file_path), '--structure-only']), \
+                patch('builtins.print') as mock_print:
+            main()
+
+        # Then the invalid values aren't validated
+        mock_print.assert_any_call(f'Success! The structure of {sample_file_path} is valid, validate without '
+                                   f'--structure-only to check every value ✅')
+
+    def test_validate_sample_profile(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        with open(sample_file_path, newline='') as sample_file:
+            rows = list(csv.DictReader(sample_file))
+
+        profiles = []
+        for jobs, engine in ((1, 'row'), (1, 'columnar'), (3, 'row'), (2, 'columnar')):
+            # When
+            sample_validator = SampleValidator(profile=True)
+            sample_validator.validate(sample_file_path, jobs=jobs, engine=engine)
+            profiles.append(sample_validator.sample_profile.to_dict())
+
+        # Then every engine counts the same rows, as invalid rows are counted too
+        self.assertEqual(profiles[1:], profiles[:1] * 3)
+        self.assertEqual(profiles[0]['row_count'], len(rows))
+        self.assertEqual(profiles[0]['treatment_codes']['NOT_A_CODE'],
+                         len([row for row in rows if row['TREATMENT_CODE'] == 'NOT_A_CODE']))
+        self.assertEqual(profiles[0]['ce_expected_capacity']['total'],
+                         sum(int(row['CE_EXPECTED_CAPACITY']) for row in rows if row['ADDRESS_TYPE'] == 'CE'))
+        self.assertEqual(profiles[0]['approximate_distinct_uprns'], len({row['UPRN'] for row in rows}))
+
+    def test_validate_sample_profile_with_validation_cache_not_supported(self):
+        # When, then raises
+        with self.assertRaises(ValueError):
+            SampleValidator(profile=True).validate(self.write_sample_file_with_quoted_line_breaks(),
+                                                   cache_file_path=self.TMP_TEST_DIRECTORY_PATH.joinpath('cache.json'))
+
+    def test_main_writes_profile(self):
+        # Given
+        sample_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('sample_file.csv')
+        shutil.copy(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), sample_file_path)
+        profile_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('profile.json')
+
+        # When
+        with patch('sys.argv', ['validate_sample.py', str(sample_file_path), '--profile-file',
+                                str(profile_file_path)]), \
+                patch('builtins.print'):
+            main()
+
+        # Then
+        sample_profile = json.loads(profile_file_path.read_text())
+        self.assertEqual(sample_profile['row_count'], 33)
+        self.assertEqual(set(sample_profile['treatment_codes'].values()), {1})
+
+    def test_incremental_validation_only_validates_changed_chunks(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        cache_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('validation-cache.json')
+        small_chunks = functools.partial(validation_cache.content_defined_chunks, average_rows=8, min_rows=4,
+                                         max_rows=32)
+        with patch('validate_sample.content_defined_chunks', side_effect=small_chunks):
+            SampleValidator().validate(sample_file_path, cache_file_path=cache_file_path)
+        valid_rows = self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv').read_bytes()
+        sample_file_path.write_bytes(sample_file_path.read_bytes().replace(b'HH_LP1W', b'HH_XXXX', 1)
+                                     + valid_rows[valid_rows.index(b'\n') + 1:])
+
+        # When
+        with patch('validate_sample.content_defined_chunks', side_effect=small_chunks), \
+                patch('validate_sample._validate_byte_range', wraps=validate_sample._validate_byte_range) \
+                as validate_byte_range:
+            incremental_validation_failures = SampleValidator().validate(sample_file_path,
+                                                                         cache_file_path=cache_file_path)
+            chunk_count = len(small_chunks(sample_file_path))
+
+        # Then the failures match validating the whole file, including the duplicate UPRNs of the appended rows
+        validation_failures = SampleValidator().validate(sample_file_path)
+        self.assertEqual([(failure.line_number, failure.column, str(failure.description), failure.rule)
+                          for failure in incremental_validation_failures],
+                         [(failure.line_number, failure.column, str(failure.description), failure.rule)
+                          for failure in validation_failures])
+        self.assertIn('Value "HH_XXXX" is not in the valid set', map(str, (failure.description for failure
+                                                                           in incremental_validation_failures)))
+        self.assertEqual(len([failure for failure in incremental_validation_failures if failure.rule == 'unique']),
+                         33 * 10)
+        self.assertLess(validate_byte_range.call_count, chunk_count / 2)
+
+    def test_quick_check_estimates_failure_rates(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+
+        # When
+        failure_rates = SampleValidator().quick_check(sample_file_path, 500, random.Random(1))
+
+        # Then about 1 in 7 rows have an invalid treatment code, and cross row rules aren't checked
+        estimates = {estimate.column: estimate for estimate in failure_rates.estimates()}
+        self.assertEqual(failure_rates.sampled_row_count + failure_rates.skipped_row_count, 500)
+        self.assertLess(estimates['TREATMENT_CODE'].lower, 1 / 7)
+        self.assertGreater(estimates['TREATMENT_CODE'].upper, 1 / 7)
+        self.assertEqual(estimates['TREATMENT_CODE'].example, 'Value "NOT_A_CODE" is not in the valid set')
+        self.assertNotIn('UPRN', estimates)
+        self.assertEqual(estimates['any column'].rate, 1.0)
+
+    def test_quick_check_invalid_header(self):
+        # When, then raises
+        with self.assertRaises(SampleValidationError):
+            SampleValidator().quick_check(self.RESOURCE_FILE_PATH.joinpath('treatment_code_quantities_1_per.csv'), 10)
+
+    def test_main_quick_check(self):
+        # Given
+        sample_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('sample_file.csv')
+        shutil.copy(self.RESOURCE_FILE_PATH.joinpath('sample_file_1_per_treatment_code.csv'), sample_file_path)
+
+        # When
+        with patch('sys.argv', ['validate_sample.py', str(sample_file_path), '--sample-rows', '50']), \
+                patch('builtins.print') as mock_print:
+            main()
+
+        # Then
+        mock_print.assert_any_call(f'Success! The sampled rows of {sample_file_path} passed validation, validate '
+                                   f'without --sample-rows to check every row ✅')
+        self.assertFalse(sample_file_path.with_name('sample_file.csv.failures.jsonl').exists())
+
+    def test_main_closes_failures_when_report_is_full(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        closed_failures = []
+        validator_iter_validation_failures = SampleValidator.iter_validation_failures
+
+        def iter_validation_failures(*args):
+            try:
+                yield from validator_iter_validation_failures(SampleValidator(), *args)
+            finally:
+                closed_failures.append(True)
+
+        # When
+        with patch('sys.argv', ['validate_sample.py', str(sample_file_path), '--max-failures', '1']), \
+                patch.object(SampleValidator, 'iter_validation_failures', side_effect=iter_validation_failures), \
+                patch('validate_sample.print_memoization_stats',
+                      side_effect=lambda _stats: self.assertEqual(closed_failures, [True])) as mock_print_stats, \
+                patch('builtins.print'), \
+                self.assertRaises(SystemExit):
+            main()
+
+        # Then
+        mock_print_stats.assert_called_once()
+
+    def test_main_writes_report_and_summary_without_prompting(self):
+        # Given
+        sample_file_path = self.write_sample_file_with_quoted_line_breaks()
+        report_file_path = self.TMP_TEST_DIRECTORY_PATH.joinpath('failures.jsonl')
+
+        # When
+        with patch('sys.argv', ['validate_sample.py', str(sample_file_path), '--report-file', str(report_file_path),
+                                '--max-failures', '10']), \
+                patch('builtins.input', side_effect=AssertionError('prompted for input')), \
+                patch('builtins.print') as mock_print, \
+                self.assertRaises(SystemExit) as exit_context:
+            main()
+
+        # Then
+        self.assertEqual(exit_context.exception.code, 1)
+        self.assertEqual(len(report_file_path.read_text().splitlines()), 10)
+        mock_print.assert_any_call('10 validation failure(s), stopped at the limit of 10:\n'
+                                   '6 x column: ADDRESS_LINE2, rule: no_padding_whitespace, '
+                                   'e.g. line(s) 2, 3, 4, 5, 6: '
+                                   'Value "Flat "0"\n0\n" contains padding whitespace\n'
+                                   '3 x column: ADDRESS_LINE3, rule: no_padding_whitespace, e.g. line(s) 3, 4, 6: '
+                                   'Value "Quoted, "again"\n" contains padding whitespace\n'
+                                   '1 x column: TREATMENT_CODE, rule: in_set, e.g. line(s) 2: '
+                                   'Value "NOT_A_CODE" is not in the valid set\n'
+                                   f'Every failure is listed in {report_file_path}')
@@ -0,0 +1,76 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from uprn_index import UprnIndex
+from validation_cache import CachedChunk, ValidationCache, content_defined_chunks, validation_cache_path
+
+
+class TestValidationCache(TestCase):
+
+    def setUp(self):
+        self.sample_directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.sample_directory)
+
+    def write_sample_file(self, rows):
+        sample_file_path = self.sample_directory.joinpath('sample.csv')
+        sample_file_path.write_bytes(b'UPRN,ADDRESS_LINE1\r\n' + b''.join(rows))
+        return sample_file_path
+
+    def test_content_defined_chunks_cover_every_row(self):
+        rows = [f'{uprn},"Flat {uprn}\n{uprn} Street"\r\n'.encode() for uprn in range(1000)]
+        sample_file_path = self.write_sample_file(rows)
+
+        chunks = content_defined_chunks(sample_file_path, average_rows=16, min_rows=4, max_rows=64)
+
+        sample_file_bytes = sample_file_path.read_bytes()
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(chunks[0].start, len(b'UPRN,ADDRESS_LINE1\r\n'))
+        self.assertEqual(chunks[-1].end, len(sample_file_bytes))
+        self.assertEqual([chunk.start for chunk in chunks[1:]], [chunk.end for chunk in chunks[:-1]])
+        for chunk in chunks:
+            self.assertEqual(sample_file_bytes[chunk.start:chunk.end].count(b'"') % 2, 0)
+            self.assertLessEqual(sample_file_bytes[chunk.start:chunk.end].count(b'\r\n'), 64)
+        # Only the last chunk can end before the minimum number of rows
+        for chunk in chunks[:-1]:
+            self.assertGreaterEqual(sample_file_bytes[chunk.start:chunk.end].count(b'\r\n'), 4)
+
+    def test_content_defined_chunks_only_change_around_edited_rows(self):
+        rows = [f'{uprn},{uprn} Street\r\n'.encode() for uprn in range(2000)]
+        chunks = content_defined_chunks(self.write_sample_file(rows), average_rows=16, min_rows=4, max_rows=64)
+        rows[500] = b'500,Edited Street\r\n'
+        del rows[1500]
+
+        edited_chunks = content_defined_chunks(self.write_sample_file(rows), average_rows=16, min_rows=4, max_rows=64)
+
+        changed_digests = ({chunk.digest for chunk in edited_chunks} - {chunk.digest for chunk in chunks})
+        self.assertTrue(1 <= len(changed_digests) <= 4)
+
+    def test_cache_round_trip(self):
+        cache_file_path = validation_cache_path(self.sample_directory.joinpath('sample.csv'))
+        uprn_index = UprnIndex()
+        uprn_index.add_rows([('10', '10', 'U'), ('10', '10', 'U')])
+
+        ValidationCache(cache_file_path, 'fingerprint').write({
+            'digest': CachedChunk(2, [[1, 'UPRN', 'Empty mandatory value', 'mandatory']], uprn_index)})
+
+        cache = ValidationCache(cache_file_path, 'fingerprint')
+        self.assertEqual(cache_file_path.name, 'sample.csv.validation-cache.json')
+        self.assertIn('digest', cache)
+        cached_chunk = cache.get('digest')
+        self.assertEqual(cached_chunk.row_count, 2)
+        self.assertEqual(cached_chunk.failures, [[1, 'UPRN', 'Empty mandatory value', 'mandatory']])
+        self.assertEqual(list(cached_chunk.uprn_index.find_duplicate_uprns()), [(1, '10', 0)])
+
+    def test_cache_with_other_fingerprint_is_empty(self):
+        cache_file_path = self.sample_directory.joinpath('cache.json')
+        ValidationCache(cache_file_path, 'fingerprint').write({'digest': CachedChunk(0, [], UprnIndex())})
+
+        self.assertNotIn('digest', ValidationCache(cache_file_path, 'other fingerprint'))
+
+    def test_corrupt_cache_is_empty(self):
+        cache_file_path = self.sample_directory.joinpath('cache.json')
+        cache_file_path.write_text('{"version": 1, "fingerp')
+
+        self.assertNotIn('digest', ValidationCache(cache_file_path, 'fingerprint'))
@@ -0,0 +1,85 @@
+import csv
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from validate_sample import ValidationFailure
+from validation_report import ValidationReport
+from validators import Invalid
+
+
+class TestValidationReport(TestCase):
+
+    def setUp(self):
+        self.report_directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.report_directory)
+
+    def test_failures_streamed_to_jsonl_report(self):
+        report_file_path = self.report_directory.joinpath('failures.jsonl')
+
+        with ValidationReport(report_file_path) as report:
+            report.add(ValidationFailure(2, 'UPRN', Invalid('Empty mandatory value'), 'mandatory'))
+            report.add(ValidationFailure(3, 'POSTCODE', Invalid('Postcode "A|" is non alphanumeric'),
+                                         'alphanumeric_postcode'))
+
+        self.assertEqual([json.loads(line) for line in report_file_path.read_text().splitlines()], [
+            {'line_number': 2, 'column': 'UPRN', 'rule': 'mandatory', 'description': 'Empty mandatory value'},
+            {'line_number': 3, 'column': 'POSTCODE', 'rule': 'alphanumeric_postcode',
+             'description': 'Postcode "A|" is non alphanumeric'}])
+
+    def test_failures_streamed_to_csv_report(self):
+        report_file_path = self.report_directory.joinpath('failures.csv')
+
+        with ValidationReport(report_file_path) as report:
+            report.add(ValidationFailure(2, 'UPRN', Invalid('Empty mandatory value'), 'mandatory'))
+
+        with open(report_file_path) as report_file:
+            self.assertEqual(list(csv.reader(report_file)), [['LINE_NUMBER', 'COLUMN', 'RULE', 'DESCRIPTION'],
+                                                             ['2', 'UPRN', 'mandatory', 'Empty mandatory value']])
+
+    def test_no_report_file_without_failures(self):
+        report_file_path = self.report_directory.joinpath('failures.jsonl')
+
+        with ValidationReport(report_file_path) as report:
+            pass
+
+        self.assertFalse(report_file_path.exists())
+        self.assertEqual(report.summary_lines(), ['0 validation failure(s)'])
+
+    def test_summary_counts_failures_per_column_and_rule_with_first_examples(self):
+        with ValidationReport(example_count=2) as report:
+            report.add(ValidationFailure(1, None, "Values don't match expected set", 'header'))
+            for line_number in range(2, 6):
+                report.add(ValidationFailure(line_number, 'UPRN', Invalid('Empty mandatory value'), 'mandatory'))
+            report.add(ValidationFailure(7, 'UPRN', Invalid('Value "a" is non numeric'), 'numeric'))
+            report.add(ValidationFailure(8, 'UPRN', Invalid('Value "b" is non numeric'), 'numeric'))
+
+        self.assertEqual(report.failure_count, 7)
+        self.assertEqual(report.rule_summaries[('UPRN', 'mandatory')].count, 4)
+        self.assertEqual(report.rule_summaries[('UPRN', 'mandatory')].example_lines, [2, 3])
+        self.assertEqual(report.summary_lines(), [
+            '7 validation failure(s):',
+            '4 x column: UPRN, rule: mandatory, e.g. line(s) 2, 3: Empty mandatory value',
+            '2 x column: UPRN, rule: numeric, e.g. line(s) 7, 8: Value "a" is non numeric',
+            "1 x header: Values don't match expected set"])
+
+    def test_summary_gives_example_lines_of_row_failures_without_a_column(self):
+        with ValidationReport() as report:
+            report.add(ValidationFailure(None, None, 'Invalid file encoding, requires utf-8', 'encoding'))
+            report.add(ValidationFailure(4, None, 'Row has 2 field(s), expected 27 like the header', 'field_count'))
+            report.add(ValidationFailure(9, None, 'Row has 28 field(s), expected 27 like the header', 'field_count'))
+
+        self.assertEqual(report.summary_lines()[1:], [
+            '2 x field_count, e.g. line(s) 4, 9: Row has 2 field(s), expected 27 like the header',
+            '1 x encoding: Invalid file encoding, requires utf-8'])
+
+    def test_report_is_full_at_max_failures(self):
+        with ValidationReport(max_failures=2) as report:
+            report.add(ValidationFailure(2, 'UPRN', Invalid('Empty mandatory value'), 'mandatory'))
+            self.assertFalse(report.is_full)
+            report.add(ValidationFailure(3, 'UPRN', Invalid('Empty mandatory value'), 'mandatory'))
+
+        self.assertTrue(report.is_full)
+        self.assertEqual(report.summary_lines()[0], '2 validation failure(s), stopped at the limit of 2:')
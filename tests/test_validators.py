@@ -388,3 +388,152 @@ def test_alphanumeric_plus_hyphen_field_values_invalid():
     # When, then raises
     with pytest.raises(validators.Invalid):
         alphanumeric_plus_hyphen_field_validator('TE-STT1-ES-!!')
+
+
+@pytest.mark.parametrize('validator, values', [
+    (validators.max_length(3), ['', 'abc', 'abcd', 'ab\n']),
+    (validators.mandatory(), ['', ' ', '  a', 'a ', '\n', ' \n ']),
+    (validators.numeric(), ['', ' ', '12 3', '1a', '١٢', '-1']),
+    (validators.latitude_longitude(max_precision=9, max_scale=7), [
+        '51.4463421', '-3.1234567', '51.44634211', '123456789.0', '12345678.9', '1e5', '1.', '.5', '1.2.3', ' 1.2',
+        '-0.1', '']),
+    (validators.in_set({'A', 'B'}), ['A', 'B', 'C', '', 'A ']),
+    (validators.no_padding_whitespace(), ['', 'a', 'a b', ' a', 'a ', '\ta', 'a ', 'é', 'a\nb', '\n']),
+    (validators.no_pipe_character(), ['', 'a', 'a|b', '|']),
+    (validators.alphanumeric_postcode(), ['AB1 2CD', ' ', '', 'AB1-2CD', 'é1']),
+    (validators.alphanumeric_plus_hyphen_field_values(), ['TE-ST-01', '-', '', 'TE ST', 'TE-ST!']),
+    (validators.latitude_longitude_range(), ['0', '-180', '180', '180.1', 'nan', 'inf', 'a', '']),
+])
+def test_fast_check_passing_guarantees_validator_passes(validator, values):
+    # Given
+    check_row, _unchecked_columns = validators.compile_row_fast_check({'COLUMN': [validator]})
+    column_checks, _unchecked_columns = validators.compile_column_fast_checks({'COLUMN': [validator]})
+
+    # When
+    failing_rows = column_checks['COLUMN']({'COLUMN': tuple(values)})
+
+    for index, value in enumerate(values):
+        fast_check_passed = check_row({'COLUMN': value})
+
+        # Then the validator agrees with every value the fast checks pass
+        if fast_check_passed or index not in failing_rows:
+            validator(value, row={'COLUMN': value})
+
+
+def test_compile_row_fast_check_passes_valid_row():
+    # Given
+    check_row, unchecked_columns = validators.compile_row_fast_check({
+        'ID': [validators.mandatory(), validators.numeric(), validators.unique()],
+        'NAME': [validators.max_length(5), validators.no_padding_whitespace()],
+        'TYPE': [validators.in_set({'HH', 'CE'})],
+        'LATITUDE': [validators.latitude_longitude_range()]})
+
+    # When
+    fast_check_passed = check_row({'ID': '1', 'NAME': 'Flat', 'TYPE': 'HH', 'LATITUDE': '51.5'})
+
+    # Then
+    assert fast_check_passed
+    assert unchecked_columns == ['ID']
+
+
+@pytest.mark.parametrize('row', [
+    {'NAME': 'Flat 1', 'TYPE': 'HH', 'LATITUDE': '51.5'},
+    {'NAME': 'Flat ', 'TYPE': 'HH', 'LATITUDE': '51.5'},
+    {'NAME': 'Flat', 'TYPE': 'SPG', 'LATITUDE': '51.5'},
+    {'NAME': 'Flat', 'TYPE': 'HH', 'LATITUDE': '181'},
+])
+def test_compile_row_fast_check_fails_invalid_row(row):
+    # Given
+    check_row, _unchecked_columns = validators.compile_row_fast_check({
+        'NAME': [validators.max_length(5), validators.no_padding_whitespace()],
+        'TYPE': [validators.in_set({'HH', 'CE'})],
+        'LATITUDE': [validators.latitude_longitude_range()]})
+
+    # When
+    fast_check_passed = check_row(row)
+
+    # Then
+    assert not fast_check_passed
+
+
+def test_compile_column_fast_checks_finds_failing_rows():
+    # Given
+    column_checks, unchecked_columns = validators.compile_column_fast_checks({
+        'ID': [validators.mandatory(), validators.numeric(), validators.unique()],
+        'NAME': [validators.max_length(5), validators.no_padding_whitespace(), validators.no_pipe_character()],
+        'TYPE': [validators.in_set({'HH', 'CE'})],
+        'REGION': [validators.region_matches_treatment_code()],
+        'TREATMENT_CODE': [validators.mandatory()]})
+    names = ['Flat'] * 200
+    names[3], names[150], names[199] = 'Flat 1', 'Fl|t', 'Flat\n'
+    columns = {'NAME': tuple(names), 'TYPE': ('HH', 'SPG', 'CE'), 'REGION': ('E', 'W', 'W'),
+               'TREATMENT_CODE': ('HH_LP1E', 'HH_LP1E', 'HH_LP1W')}
+
+    # When, then
+    assert column_checks['NAME'](columns) == {3, 150, 199}
+    assert column_checks['TYPE'](columns) == {1}
+    assert column_checks['REGION'](columns) == {1}
+    assert unchecked_columns == ['ID']
+
+
+def test_valid_value_cache_only_caches_passing_values():
+    # Given
+    valid_value_cache = validators.ValidValueCache([validators.mandatory(), validators.in_set({'A', 'B', 'C'})],
+                                                   max_size=2)
+
+    # When
+    results = [valid_value_cache.check(value) for value in ['A', 'A', 'X', 'X', '', 'B', 'C', 'A']]
+
+    # Then
+    assert results == [True, True, False, False, False, True, True, True]
+    assert (valid_value_cache.hits, valid_value_cache.misses) == (1, 7)
+    assert list(valid_value_cache.values) == ['C', 'A']
+
+
+def test_valid_value_cache_find_failing_indexes():
+    # Given
+    valid_value_cache = validators.ValidValueCache([validators.in_set({'A', 'B'})], max_size=10)
+
+    # When, then
+    assert valid_value_cache.find_failing_indexes(('A', 'X', 'B', 'X')) == [1, 3]
+    assert valid_value_cache.find_failing_indexes(('A', 'B', 'A')) == []
+    assert (valid_value_cache.hits, valid_value_cache.misses) == (3, 4)
+
+
+def test_valid_value_cache_evicts_least_recently_used():
+    # Given
+    valid_value_cache = validators.ValidValueCache([validators.in_set({'A', 'B', 'C', 'D'})], max_size=2)
+
+    # When
+    valid_value_cache.check('A')
+    valid_value_cache.check('B')
+    valid_value_cache.check('A')
+    valid_value_cache.check('C')
+
+    # Then
+    assert list(valid_value_cache.values) == ['A', 'C']
+
+    # When the hits are found in C
+    assert valid_value_cache.find_failing_indexes(('A',)) == []
+    valid_value_cache.check('D')
+    is_row_cached = validators.compile_memoized_row_check({'TYPE': valid_value_cache})
+    assert is_row_cached({'TYPE': 'A'})
+    assert not is_row_cached({'TYPE': 'C'})
+    valid_value_cache.check('B')
+
+    # Then
+    assert list(valid_value_cache.values) == ['A', 'B']
+
+
+def test_valid_value_cache_not_effective_with_low_hit_rate():
+    # Given
+    valid_value_cache = validators.ValidValueCache([validators.numeric()], max_size=100)
+
+    # When
+    for value in range(valid_value_cache.MIN_LOOKUPS - 1):
+        valid_value_cache.check(str(value))
+
+    # Then
+    assert valid_value_cache.is_effective
+    valid_value_cache.check('0')
+    assert not valid_value_cache.is_effective
@@ -1,30 +1,134 @@
 import argparse
+import base64
+import mimetypes
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import google_crc32c
 from google.cloud import storage
 
+from exceptions import SampleUploadChecksumError
 
-def upload_file_to_bucket(file_name, project_name, bucket_name):
+PART_SIZE = 32 * 1024 * 1024
+MAX_PART_ATTEMPTS = 3
+MAX_COMPOSE_SOURCES = 32
+CHECKSUM_BUFFER_SIZE = 1024 * 1024
+
+
+def upload_file_to_bucket(file_name, project_name, bucket_name, workers=1, part_size=PART_SIZE):
     file_path = Path(file_name)
 
     client = storage.Client(project=project_name)
     bucket = client.get_bucket(bucket_name)
     print(f'Copying file to GCS bucket {bucket.name}')
-    bucket.blob(file_path.name).upload_from_filename(filename=str(file_path))
+    if workers > 1:
+        parallel_composite_upload(bucket, file_path, workers, part_size)
+    else:
+        bucket.blob(file_path.name).upload_from_filename(filename=str(file_path))
     print(f'File successfully written to {bucket.name}')
 
 
+def parallel_composite_upload(bucket: storage.Bucket, file_path: Path, workers, part_size=PART_SIZE) -> storage.Blob:
+    # The file is uploaded as parts on a thread pool then composed into the final object server side. The parts live
+    # under a unique prefix so concurrent uploads of the same file can't collide, and are deleted however it ends
+    file_size = file_path.stat().st_size
+    part_prefix = f'{file_path.name}.parts/{uuid.uuid4().hex}'
+    part_starts = range(0, file_size, part_size) if file_size else [0]
+    part_blobs = [bucket.blob(f'{part_prefix}/{index:05d}') for index, _ in enumerate(part_starts)]
+    intermediate_blobs = []
+
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            uploads = [executor.submit(_upload_part, part_blob, file_path, start, min(part_size, file_size - start))
+                       for part_blob, start in zip(part_blobs, part_starts)]
+            # The local checksum is worked out while the parts upload
+            expected_checksum = _file_crc32c(file_path)
+            try:
+                for upload in uploads:
+                    upload.result()
+            except Exception:
+                for upload in uploads:
+                    upload.cancel()
+                raise
+
+        # A composed object doesn't take the content type of its parts, so it is given the type a single stream upload
+        # of the file would have
+        blob = bucket.blob(file_path.name)
+        blob.content_type = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
+        blob = _compose(bucket, blob, part_blobs, part_prefix, intermediate_blobs)
+        if blob.crc32c != expected_checksum:
+            blob.delete()
+            raise SampleUploadChecksumError(f'Composed {blob.name} has checksum {blob.crc32c}, '
+                                            f'expected {expected_checksum}')
+        return blob
+    finally:
+        bucket.delete_blobs(part_blobs + intermediate_blobs, on_error=lambda _blob: None)
+
+
+def _upload_part(part_blob: storage.Blob, file_path: Path, start, size):
+    # Each part is retried on its own, so a failed part doesn't restart the parts that already uploaded. The CRC32C of
+    # each uploaded part is checked here, as the locked storage client can't check it during the upload
+    for attempt in range(1, MAX_PART_ATTEMPTS + 1):
+        try:
+            with open(file_path, 'rb') as file:
+                file.seek(start)
+                part_blob.upload_from_file(file, size=size)
+            expected_checksum = _file_crc32c(file_path, start, size)
+            if part_blob.crc32c != expected_checksum:
+                raise SampleUploadChecksumError(f'Uploaded part {part_blob.name} has checksum {part_blob.crc32c}, '
+                                                f'expected {expected_checksum}')
+            return
+        except Exception as error:
+            if attempt == MAX_PART_ATTEMPTS:
+                raise
+            print(f'Retrying upload of part {part_blob.name} after attempt {attempt} failed: {error}')
+
+
+def _compose(bucket: storage.Bucket, blob: storage.Blob, sources, part_prefix, intermediate_blobs) -> storage.Blob:
+    # A compose request takes at most 32 sources, so larger uploads are composed into intermediate objects first
+    level = 0
+    while len(sources) > MAX_COMPOSE_SOURCES:
+        composed_sources = []
+        for index, group_start in enumerate(range(0, len(sources), MAX_COMPOSE_SOURCES)):
+            intermediate_blob = bucket.blob(f'{part_prefix}/composed-{level}-{index:05d}')
+            intermediate_blobs.append(intermediate_blob)
+            intermediate_blob.compose(sources[group_start:group_start + MAX_COMPOSE_SOURCES])
+            composed_sources.append(intermediate_blob)
+        sources = composed_sources
+        level += 1
+    blob.compose(sources)
+    return blob
+
+
+def _file_crc32c(file_path: Path, start=0, size=None):
+    checksum = google_crc32c.Checksum()
+    remaining = os.path.getsize(file_path) - start if size is None else size
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        for block in iter(lambda: file.read(min(CHECKSUM_BUFFER_SIZE, remaining)), b''):
+            checksum.update(block)
+            remaining -= len(block)
+    return base64.b64encode(checksum.digest()).decode()
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Upload a file to a bucket')
     parser.add_argument('file_name', help='name of the file', type=str)
     parser.add_argument('project_name', help='project name', type=str)
     parser.add_argument('bucket_name', help='bucket name', type=str)
+    parser.add_argument('--workers', help='upload the file as this many parts in parallel and compose them, '
+                                          'uploads in a single stream by default', type=int, default=1)
+    parser.add_argument('--part-size-mb', help='size of each part of a parallel upload in MB', type=int,
+                        default=PART_SIZE // (1024 * 1024))
     return parser.parse_args()
 
 
 def main():
     args = parse_arguments()
-    upload_file_to_bucket(args.file_name, args.project_name, args.bucket_name)
+    upload_file_to_bucket(args.file_name, args.project_name, args.bucket_name, args.workers,
+                          args.part_size_mb * 1024 * 1024)
 
 
 if __name__ == "__main__":
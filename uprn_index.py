@@ -0,0 +1,144 @@
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from heapq import merge
+from itertools import filterfalse, repeat
+from operator import add, rshift
+
+BUCKET_BITS = 8
+BUCKET_COUNT = 1 << BUCKET_BITS
+ROW_INDEX_BITS = 28
+ROW_INDEX_MASK = (1 << ROW_INDEX_BITS) - 1
+MAX_UPRN_LENGTH = 13
+# The key of a UPRN is its value plus the number of shorter digit strings, so UPRNs differing only in leading zeros get
+# different keys. The largest key is still below 2^44, the same as the largest 13 digit UPRN
+LENGTH_KEY_OFFSETS = tuple(sum(10 ** shorter for shorter in range(1, length)) for length in range(MAX_UPRN_LENGTH + 2))
+
+
+class UprnIndex:
+    # A compact index of every row's UPRN, and optionally the ESTAB_UPRN of every unit which isn't its own estab, for
+    # checking rules across rows. Values are indexed by their key, so "0123" and "123" are different UPRNs, and are
+    # split into buckets by the key's lowest byte. The rest of each key is packed with its row's index into one
+    # unsigned 64 bit int. A 13 digit UPRN leaves 28 bits for the row index, so
+    # the index holds up to 2^28 rows in 8 bytes per row, plus 8 bytes per estab reference
+    MAX_ROWS = 1 << ROW_INDEX_BITS
+
+    def __init__(self, estab_references=False):
+        self.estab_references = estab_references
+        self.row_count = 0
+        self._uprns = [array('Q') for _ in range(BUCKET_COUNT)]
+        self._estab_uprns = [array('Q') for _ in range(BUCKET_COUNT)]
+        self._estab_references = [array('Q') for _ in range(BUCKET_COUNT)]
+
+    def add(self, uprn, estab_uprn, address_level):
+        self.add_rows([(uprn, estab_uprn, address_level)])
+
+    def add_rows(self, rows):
+        # Rows are (UPRN, ESTAB_UPRN, ADDRESS_LEVEL) values. Values which aren't UPRNs are left to the validators, but
+        # still take a row index so every row's index matches its position in the file
+        row_index = self.row_count - 1
+        for row_index, (uprn, estab_uprn, address_level) in enumerate(rows, self.row_count):
+            uprn = _parse_uprn(uprn)
+            if uprn is None:
+                continue
+            self._uprns[uprn & BUCKET_COUNT - 1].append((uprn >> BUCKET_BITS) << ROW_INDEX_BITS | row_index)
+            if not self.estab_references:
+                continue
+            if address_level == 'E':
+                self._estab_uprns[uprn & BUCKET_COUNT - 1].append(uprn >> BUCKET_BITS)
+            elif address_level == 'U':
+                estab_uprn = _parse_uprn(estab_uprn)
+                if estab_uprn is not None and estab_uprn != uprn:
+                    self._estab_references[estab_uprn & BUCKET_COUNT - 1].append(
+                        (estab_uprn >> BUCKET_BITS) << ROW_INDEX_BITS | row_index)
+        self.row_count = row_index + 1
+        if self.row_count > self.MAX_ROWS:
+            raise ValueError(f'The UPRN index holds at most {self.MAX_ROWS} rows')
+
+    def update(self, uprn_index):
+        # Adds the rows of another index, such as one built by a worker process, after the rows of this one
+        for buckets, other_buckets in ((self._uprns, uprn_index._uprns),
+                                       (self._estab_references, uprn_index._estab_references)):
+            for bucket, other_bucket in zip(buckets, other_buckets):
+                bucket.extend(map(add, other_bucket, repeat(self.row_count)))
+        for bucket, other_bucket in zip(self._estab_uprns, uprn_index._estab_uprns):
+            bucket.extend(other_bucket)
+        self.row_count += uprn_index.row_count
+        if self.row_count > self.MAX_ROWS:
+            raise ValueError(f'The UPRN index holds at most {self.MAX_ROWS} rows')
+
+    def to_bytes(self) -> bytes:
+        # The row count, whether estab references are indexed, the length of every bucket then the buckets' values
+        buckets = (*self._uprns, *self._estab_uprns, *self._estab_references)
+        header = array('Q', (self.row_count, self.estab_references, *map(len, buckets)))
+        return b''.join((header.tobytes(), *(bucket.tobytes() for bucket in buckets)))
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        header = array('Q')
+        header.frombytes(data[:(2 + 3 * BUCKET_COUNT) * header.itemsize])
+        uprn_index = cls(estab_references=bool(header[1]))
+        uprn_index.row_count = header[0]
+        offset = len(header) * header.itemsize
+        for bucket, length in zip((*uprn_index._uprns, *uprn_index._estab_uprns, *uprn_index._estab_references),
+                                  header[2:]):
+            bucket.frombytes(data[offset:offset + length * bucket.itemsize])
+            offset += length * bucket.itemsize
+        return uprn_index
+
+    def find_duplicate_uprns(self):
+        # Yields (row index, UPRN, row index of the UPRN's first row) for every row but the first with each UPRN, in
+        # row order. UPRNs are given as they are written in the file
+        return merge(*map(self._find_bucket_duplicate_uprns, range(BUCKET_COUNT)))
+
+    def _find_bucket_duplicate_uprns(self, bucket):
+        packed_uprns = self._uprns[bucket]
+        duplicate_uprns = _find_duplicates(map(rshift, packed_uprns, repeat(ROW_INDEX_BITS)))
+        first_row_indexes = {}
+        for packed_uprn in packed_uprns if duplicate_uprns else ():
+            uprn, row_index = packed_uprn >> ROW_INDEX_BITS, packed_uprn & ROW_INDEX_MASK
+            if uprn in duplicate_uprns:
+                first_row_index = first_row_indexes.setdefault(uprn, row_index)
+                if first_row_index != row_index:
+                    yield row_index, _uprn_from_key(uprn << BUCKET_BITS | bucket), first_row_index
+
+    def find_unresolved_estab_references(self):
+        # Yields (row index, ESTAB_UPRN, row index of the first row with that UPRN or None) for every unit whose
+        # ESTAB_UPRN isn't its own UPRN or the UPRN of an estab, in row order
+        return merge(*map(self._find_bucket_unresolved_estab_references, range(BUCKET_COUNT)))
+
+    def _find_bucket_unresolved_estab_references(self, bucket):
+        references = self._estab_references[bucket]
+        unresolved_uprns = set(filterfalse(set(self._estab_uprns[bucket]).__contains__,
+                                           map(rshift, references, repeat(ROW_INDEX_BITS))))
+        # The rows with unresolved UPRNs are only looked for when there are any, as it takes a pass over the bucket
+        row_indexes = {}
+        for packed_uprn in self._uprns[bucket] if unresolved_uprns else ():
+            uprn = packed_uprn >> ROW_INDEX_BITS
+            if uprn in unresolved_uprns:
+                row_indexes.setdefault(uprn, packed_uprn & ROW_INDEX_MASK)
+        for packed_reference in references if unresolved_uprns else ():
+            estab_uprn = packed_reference >> ROW_INDEX_BITS
+            if estab_uprn in unresolved_uprns:
+                yield (packed_reference & ROW_INDEX_MASK, _uprn_from_key(estab_uprn << BUCKET_BITS | bucket),
+                       row_indexes.get(estab_uprn))
+
+
+def _parse_uprn(value):
+    # Returns the UPRN's key
+    if value and len(value) <= MAX_UPRN_LENGTH and value.isascii() and value.isdigit():
+        return int(value) + LENGTH_KEY_OFFSETS[len(value)]
+    return None
+
+
+def _uprn_from_key(key) -> str:
+    length = bisect_right(LENGTH_KEY_OFFSETS, key) - 1
+    return str(key - LENGTH_KEY_OFFSETS[length]).zfill(length)
+
+
+def _find_duplicates(values) -> set:
+    # Counting is only needed when there are duplicates, which a set finds faster
+    values = list(values)
+    if len(set(values)) == len(values):
+        return set()
+    return {value for value, count in Counter(values).items() if count > 1}
@@ -1,13 +1,45 @@
 import argparse
+import contextlib
 import csv
+import hashlib
+import inspect
+import io
+import itertools
+import multiprocessing
+import os
+import random
 from collections import namedtuple
+from heapq import merge
+from operator import attrgetter, itemgetter
+from pathlib import Path
 
+from compressed_file import is_compressed, open_sample_file
+from exceptions import SampleValidationError
+from gcs_sample_file import is_gcs_uri, local_file_path
+from sample_profile import PROFILE_COLUMNS, SampleProfile
+from sampled_validation import FailureRateEstimator, read_rows_at_random_offsets, sample_data_size
+from structure_scan import ENCODING_RULE, scan_sample_file
+from uprn_index import UprnIndex
+from validation_cache import CachedChunk, ValidationCache, content_defined_chunks, validation_cache_path
+from validation_report import ValidationReport
 from validators import max_length, Invalid, mandatory, numeric, in_set, latitude_longitude, set_equal, \
     no_padding_whitespace, region_matches_treatment_code, ce_u_has_expected_capacity, \
     ce_e_has_expected_capacity, alphanumeric_postcode, no_pipe_character, latitude_longitude_range, \
-    alphanumeric_plus_hyphen_field_values
+    alphanumeric_plus_hyphen_field_values, compile_row_fast_check, compile_column_fast_checks, rule_name, \
+    is_memoizable, ValidValueCache, compile_memoized_row_check
 
-ValidationFailure = namedtuple('ValidationFailure', ('line_number', 'column', 'description'))
+ValidationFailure = namedtuple('ValidationFailure', ('line_number', 'column', 'description', 'rule'),
+                               defaults=(None,))
+
+HEADER_RULE = 'header'
+UNIQUE_RULE = 'unique'
+ESTAB_REFERENCE_RULE = 'estab_reference'
+UPRN_INDEX_COLUMNS = ('UPRN', 'ESTAB_UPRN', 'ADDRESS_LEVEL')
+
+ENGINES = ('row', 'columnar')
+# Small batches are still long enough for the column checks to run mostly in C, and are freed before the garbage
+# collector has to scan them again in its older generations
+COLUMNAR_BATCH_SIZE = 500
 
 
 class SampleValidator:
@@ -28,7 +60,18 @@ class SampleValidator:
                    'MILITARY SFA', 'EMBASSY', 'ROYAL HOUSEHOLD', 'CARAVAN', 'MARINA', 'TRAVELLING PERSONS',
                    'TRANSIENT PERSONS', 'MIGRANT WORKERS', 'MILITARY US SFA'}
 
-    def __init__(self):
+    # Columns with few distinct values, which cache the values passing their single column validators
+    MEMOIZED_COLUMNS = ('ADDRESS_TYPE', 'ESTAB_TYPE', 'ADDRESS_LEVEL', 'ABP_CODE', 'TOWN_NAME', 'POSTCODE', 'OA',
+                        'LSOA', 'MSOA', 'LAD', 'REGION', 'HTC_WILLINGNESS', 'HTC_DIGITAL', 'FIELDCOORDINATOR_ID',
+                        'FIELDOFFICER_ID', 'TREATMENT_CODE', 'CE_EXPECTED_CAPACITY', 'CE_SECURE', 'PRINT_BATCH')
+    MEMOIZATION_CACHE_SIZE = 20000
+
+    def __init__(self, memoization_cache_size=MEMOIZATION_CACHE_SIZE, check_estab_references=False, profile=False):
+        self.memoization_cache_size = memoization_cache_size
+        self.check_estab_references = check_estab_references
+        # With profile, validating a file also builds a SampleProfile of it, kept in sample_profile
+        self.profile = profile
+        self.sample_profile = None
         self.schema = {
             'UPRN': [mandatory(), max_length(13), numeric(), no_padding_whitespace()],
             'ESTAB_UPRN': [mandatory(), max_length(13), numeric(), no_padding_whitespace()],
@@ -66,89 +109,645 @@ class SampleValidator:
             'CE_SECURE': [mandatory(), in_set({'0', '1'}), no_padding_whitespace()],
             'PRINT_BATCH': [numeric(), max_length(2), no_padding_whitespace()]
         }
+        self._reset_memoization()
+
+    def _reset_memoization(self):
+        self._valid_value_caches = None
+        self._cached_row_count = 0
+        self._memoized_plan = None
+        self._validation_plan = None
+        self._column_validation_plan = None
+        self._worker_memoization_stats = {}
 
     def find_header_validation_failures(self, header):
         valid_header = set(self.schema.keys())
         try:
             set_equal(valid_header)(header)
         except Invalid as invalid:
-            return ValidationFailure(line_number=1, column=None, description=str(invalid))
+            return ValidationFailure(line_number=1, column=None, description=str(invalid), rule=HEADER_RULE)
 
     def find_row_validation_failures(self, line_number, row):
+        # A row passing the fused fast check, with the values of its memoized columns known to pass, only needs the
+        # validators without fast checks run. Any other row runs every validator to get the same failures as checking
+        # the schema one validator at a time
+        check_row, unchecked_columns, is_row_cached = self._get_validation_plan()
+        if is_row_cached(row):
+            self._cached_row_count += 1
+            row_passes = check_row(row)
+        else:
+            row_passes = self._check_memoized_columns(row) and check_row(row)
+        columns = unchecked_columns if row_passes else self.schema
         failures = []
-        for column, validators in self.schema.items():
-            for validator in validators:
-                try:
-                    validator(row[column], row=row)
-                except Invalid as invalid:
-                    failures.append(ValidationFailure(line_number, column, invalid))
+        for column in columns:
+            failures.extend(find_column_validation_failures(line_number, row, column, self.schema[column]))
         return failures
 
+    def _check_memoized_columns(self, row) -> bool:
+        # Every column is checked so each cache counts its hits and misses
+        valid_value_caches, _fast_checked_schema = self._get_memoized_plan()
+        passes = all([valid_value_cache.check(row[column]) for column, valid_value_cache in valid_value_caches.items()])
+        self._review_memoization()
+        return passes
+
+    def _get_validation_plan(self):
+        # Compiled from the schema on first use, so the schema can still be customised after construction
+        if self._validation_plan is None:
+            valid_value_caches, fast_checked_schema = self._get_memoized_plan()
+            self._validation_plan = (*compile_row_fast_check(fast_checked_schema),
+                                     compile_memoized_row_check(valid_value_caches))
+        return self._validation_plan
+
+    def _get_memoized_plan(self):
+        # Splits the single column validators of the memoized columns with effective caches from the rest of the
+        # schema, which is checked with fast checks. Both engines share the caches
+        if self._valid_value_caches is None:
+            self._valid_value_caches = {}
+            for column, validators in self.schema.items():
+                memoized = [validator for validator in validators if is_memoizable(validator)]
+                if column in self.MEMOIZED_COLUMNS and self.memoization_cache_size and memoized:
+                    self._valid_value_caches[column] = ValidValueCache(memoized, self.memoization_cache_size)
+        if self._memoized_plan is None:
+            valid_value_caches = {column: valid_value_cache
+                                  for column, valid_value_cache in self._valid_value_caches.items()
+                                  if valid_value_cache.is_effective}
+            fast_checked_schema = {}
+            for column, validators in self.schema.items():
+                memoized = valid_value_caches[column].validators if column in valid_value_caches else []
+                fast_checked = [validator for validator in validators if validator not in memoized]
+                if fast_checked:
+                    fast_checked_schema[column] = fast_checked
+            self._memoized_plan = valid_value_caches, fast_checked_schema
+        return self._memoized_plan
+
+    def _review_memoization(self):
+        # Columns whose caches turn out not to be effective go back to being checked with fast checks
+        self._count_cached_rows()
+        valid_value_caches, _fast_checked_schema = self._get_memoized_plan()
+        if not all(valid_value_cache.is_effective for valid_value_cache in valid_value_caches.values()):
+            self._memoized_plan = self._validation_plan = self._column_validation_plan = None
+
+    def _count_cached_rows(self):
+        # Rows with every memoized value cached are only counted as a whole, as counting each hit would cost the
+        # time caching saves
+        valid_value_caches, _fast_checked_schema = self._get_memoized_plan()
+        for valid_value_cache in valid_value_caches.values():
+            valid_value_cache.hits += self._cached_row_count
+        self._cached_row_count = 0
+
+    def memoization_stats(self) -> dict:
+        # The number of cache hits and misses for each memoized column, including those of any worker processes
+        self._count_cached_rows()
+        stats = {column: [valid_value_cache.hits, valid_value_cache.misses]
+                 for column, valid_value_cache in self._valid_value_caches.items()}
+        for column, (hits, misses) in self._worker_memoization_stats.items():
+            stats[column][0] += hits
+            stats[column][1] += misses
+        return {column: tuple(column_stats) for column, column_stats in stats.items()}
+
+    def find_batch_validation_failures(self, first_line_number, fieldnames, batch) -> list:
+        # Validates a batch of csv.reader rows a column at a time. Each column's fast checks run over all its values at
+        # once, then only the values failing them are run through the column's validators. The failures are put back
+        # in row then schema order to match validating the rows one at a time
+        if set(map(len, batch)) != {len(fieldnames)}:
+            # Rows with missing or extra values are rare enough to validate the batch as csv.DictReader would read it
+            return [failure for line_number, row in enumerate(batch, first_line_number)
+                    for failure in self.find_row_validation_failures(line_number, _csv_dict_row(fieldnames, row))]
+
+        column_checks, unchecked_columns = self._get_column_validation_plan()
+        valid_value_caches, _fast_checked_schema = self._get_memoized_plan()
+        columns = dict(zip(fieldnames, zip(*batch)))
+        rows = {}
+        cell_failures = []
+        for column_position, (column, validators) in enumerate(self.schema.items()):
+            failing_rows = set(column_checks[column](columns)) if column in column_checks else set()
+            if column in valid_value_caches:
+                failing_rows.update(valid_value_caches[column].find_failing_indexes(columns[column]))
+            failing_rows = range(len(batch)) if column in unchecked_columns else sorted(failing_rows)
+            for index in failing_rows:
+                if index not in rows:
+                    rows[index] = dict(zip(fieldnames, batch[index]))
+                failures = find_column_validation_failures(first_line_number + index, rows[index], column, validators)
+                if failures:
+                    cell_failures.append((index, column_position, failures))
+        self._review_memoization()
+        cell_failures.sort(key=lambda cell_failure: cell_failure[:2])
+        return [failure for _index, _column_position, failures in cell_failures for failure in failures]
+
+    def _get_column_validation_plan(self):
+        if self._column_validation_plan is None:
+            self._column_validation_plan = compile_column_fast_checks(self._get_memoized_plan()[1])
+        return self._column_validation_plan
+
+    def find_sample_validation_failures_columnar(self, sample_rows, fieldnames, batch_size=COLUMNAR_BATCH_SIZE) -> list:
+        return list(self.iter_sample_validation_failures_columnar(sample_rows, fieldnames, batch_size))
+
+    def iter_sample_validation_failures_columnar(self, sample_rows, fieldnames, batch_size=COLUMNAR_BATCH_SIZE):
+        failure_count, line_number = 0, 2
+        uprn_index = self._new_uprn_index()
+        sample_profile = self.sample_profile = self._new_sample_profile()
+        for batch in _row_batches(sample_rows, batch_size):
+            failures = self.find_batch_validation_failures(line_number, fieldnames, batch)
+            uprn_index.add_rows(_batch_values(fieldnames, batch, UPRN_INDEX_COLUMNS))
+            if sample_profile is not None:
+                sample_profile.add_rows(_batch_values(fieldnames, batch, PROFILE_COLUMNS))
+            yield from failures
+            failure_count += len(failures)
+            line_number += len(batch)
+            if (line_number - 1) // 10000 != (line_number - 1 - len(batch)) // 10000:
+                print_validation_progress(line_number - 1, failure_count, end='\r')
+        print_validation_progress(line_number - 1, failure_count)
+        yield from self.iter_cross_row_validation_failures(uprn_index)
+
     def find_sample_validation_failures(self, sample_file_reader) -> list:
-        failures = []
+        return list(self.iter_sample_validation_failures(sample_file_reader))
+
+    def iter_sample_validation_failures(self, sample_file_reader):
+        failure_count, line_number = 0, 1
+        uprn_index = self._new_uprn_index()
+        sample_profile = self.sample_profile = self._new_sample_profile()
+        get_profile_values = itemgetter(*PROFILE_COLUMNS)
         for line_number, row in enumerate(sample_file_reader, 2):
-            failures.extend(self.find_row_validation_failures(line_number, row))
+            failures = self.find_row_validation_failures(line_number, row)
+            uprn_index.add(row['UPRN'], row['ESTAB_UPRN'], row['ADDRESS_LEVEL'])
+            if sample_profile is not None:
+                sample_profile.add(get_profile_values(row))
+            yield from failures
+            failure_count += len(failures)
             if not line_number % 10000:
-                print(f"Validation progress: {str(line_number).rjust(8)} lines checked, "
-                      f"Failures: {len(failures)}", end='\r', flush=True)
-        print(f"Validation progress: {str(line_number).rjust(8)} lines checked, "
-              f"Failures: {len(failures)}")
+                print_validation_progress(line_number, failure_count, end='\r')
+        print_validation_progress(line_number, failure_count)
+        yield from self.iter_cross_row_validation_failures(uprn_index)
+
+    def _new_uprn_index(self):
+        return UprnIndex(estab_references=self.check_estab_references)
+
+    def _new_sample_profile(self):
+        return SampleProfile() if self.profile else None
+
+    def iter_cross_row_validation_failures(self, uprn_index: UprnIndex, first_line_number=2):
+        # Every UPRN must be unique, and when estab references are checked every unit's ESTAB_UPRN must be its own
+        # UPRN or the UPRN of an estab. These can only be checked once every row is indexed, so their failures come
+        # after those of the rows, in line order
+        duplicate_uprn_failures = (
+            ValidationFailure(first_line_number + row_index, 'UPRN',
+                              f'UPRN {uprn} is not unique, it is also on line {first_line_number + first_row_index}',
+                              UNIQUE_RULE)
+            for row_index, uprn, first_row_index in uprn_index.find_duplicate_uprns())
+        estab_reference_failures = (
+            ValidationFailure(first_line_number + row_index, 'ESTAB_UPRN',
+                              f'ESTAB_UPRN {estab_uprn} is not the UPRN of an estab in the sample file'
+                              if referenced_row_index is None else
+                              f'ESTAB_UPRN {estab_uprn} is the UPRN on line {first_line_number + referenced_row_index}'
+                              f', which is not an estab', ESTAB_REFERENCE_RULE)
+            for row_index, estab_uprn, referenced_row_index in uprn_index.find_unresolved_estab_references())
+        return merge(duplicate_uprn_failures, estab_reference_failures, key=attrgetter('line_number'))
+
+    def find_sample_validation_failures_parallel(self, sample_file_path, fieldnames, jobs, engine='row') -> list:
+        return list(self.iter_sample_validation_failures_parallel(sample_file_path, fieldnames, jobs, engine))
+
+    def iter_sample_validation_failures_parallel(self, sample_file_path, fieldnames, jobs, engine='row',
+                                                 max_failures=None, progress_print_interval=1):
+        # Each chunk of the file is validated by a copy of this validator in a worker process forked for that chunk, so
+        # validators which keep state across rows only see the rows of their own chunk. The workers index their chunk's
+        # UPRNs, which are checked across the whole file once every chunk is done. A chunk's failures are yielded as
+        # soon as it and the chunks before it are done. With max_failures, workers stop once their chunk has that many
+        # failures
+        chunks = chunk_byte_ranges(sample_file_path, jobs)
+        lines_checked, failure_count = multiprocessing.Value('L', 0), multiprocessing.Value('L', 0)
+        chunk_args = [(sample_file_path, fieldnames, start, end, engine, max_failures) for start, end in chunks]
+        uprn_index = self._new_uprn_index()
+        self.sample_profile = self._new_sample_profile()
+
+        with _chunk_worker_pool(self, len(chunks), lines_checked, failure_count) as pool:
+            chunk_results = pool.imap(_validate_chunk_with_args, chunk_args)
+            # Line numbers within each chunk are moved on by the rows in the chunks before it, so the failures come
+            # out in the same order with the same line numbers as validating the file in one process
+            line_number = 1
+            for _chunk in chunks:
+                row_count, chunk_failures, memoization_stats, chunk_uprn_index, chunk_sample_profile = \
+                    _next_chunk_result(chunk_results, progress_print_interval, lines_checked, failure_count)
+                self._add_worker_memoization_stats(memoization_stats)
+                uprn_index.update(chunk_uprn_index)
+                if self.sample_profile is not None:
+                    self.sample_profile.update(chunk_sample_profile)
+                for failure in chunk_failures:
+                    yield failure._replace(line_number=line_number + failure.line_number)
+                line_number += row_count
+        print_validation_progress(line_number, failure_count.value)
+        yield from self.iter_cross_row_validation_failures(uprn_index)
+
+    def iter_sample_validation_failures_incremental(self, sample_file_path, fieldnames, cache_file_path, jobs=1,
+                                                    engine='row'):
+        # The file is split into chunks at rows picked by their content, so editing rows only changes the chunks
+        # holding them. Chunks whose bytes are in the cache have their failures and UPRN index replayed from it, and
+        # only the other chunks are validated. The cross row rules are checked over the index of the whole file, and
+        # the cache is only rewritten once every chunk is done
+        chunks = content_defined_chunks(sample_file_path)
+        cache = ValidationCache(cache_file_path, self._validation_cache_fingerprint(sample_file_path))
+        changed_chunks = [chunk for chunk in chunks if chunk.digest not in cache]
+        print(f'Validating {len(changed_chunks)} changed chunk(s) of {len(chunks)}, '
+              f'the rest are unchanged since they were cached')
+        chunk_results = self._validate_chunks(sample_file_path, fieldnames, changed_chunks, jobs, engine)
+
+        uprn_index, cached_chunks, failure_count, line_number = self._new_uprn_index(), {}, 0, 1
+        for chunk in chunks:
+            if chunk.digest in cache:
+                cached_chunk = cache.get(chunk.digest)
+                chunk_failures = [ValidationFailure(*failure) for failure in cached_chunk.failures]
+            else:
+                row_count, chunk_failures, chunk_uprn_index = next(chunk_results)
+                cached_chunk = CachedChunk(row_count, [[failure.line_number, failure.column, str(failure.description),
+                                                        failure.rule] for failure in chunk_failures], chunk_uprn_index)
+            cached_chunks[chunk.digest] = cached_chunk
+            uprn_index.update(cached_chunk.uprn_index)
+            for failure in chunk_failures:
+                yield failure._replace(line_number=line_number + failure.line_number)
+            failure_count += len(chunk_failures)
+            line_number += cached_chunk.row_count
+        print_validation_progress(line_number, failure_count)
+        cache.write(cached_chunks)
+        yield from self.iter_cross_row_validation_failures(uprn_index)
+
+    def _validation_cache_fingerprint(self, sample_file_path):
+        # Changes with the header, the validator's settings or the code of the validator, schema and UPRN index
+        fingerprint = hashlib.blake2b(digest_size=16)
+        with open(sample_file_path, 'rb') as sample_file:
+            fingerprint.update(sample_file.readline())
+        fingerprint.update(f'{type(self).__qualname__} {self.check_estab_references}'.encode())
+        for source_file_path in sorted({Path(source_file).resolve() for source_file
+                                        in (inspect.getfile(type(self)), __file__, inspect.getfile(Invalid),
+                                            inspect.getfile(UprnIndex))}):
+            fingerprint.update(source_file_path.read_bytes())
+        return fingerprint.hexdigest()
+
+    def _validate_chunks(self, sample_file_path, fieldnames, chunks, jobs=1, engine='row'):
+        # Yields the row count, failures and UPRN index of each chunk in order. With one job every chunk is validated
+        # by this validator, so the memoization caches carry on from one chunk to the next
+        if jobs == 1 or len(chunks) < 2:
+            for chunk in chunks:
+                row_count, failures, uprn_index, _sample_profile = _validate_byte_range(
+                    self, sample_file_path, fieldnames, chunk.start, chunk.end, engine)
+                yield row_count, failures, uprn_index
+            return
+        chunk_args = [(sample_file_path, fieldnames, chunk.start, chunk.end, engine) for chunk in chunks]
+        with _chunk_worker_pool(self, min(jobs, len(chunk_args))) as pool:
+            for row_count, failures, memoization_stats, uprn_index, _sample_profile in pool.imap(
+                    _validate_chunk_with_args, chunk_args):
+                self._add_worker_memoization_stats(memoization_stats)
+                yield row_count, failures, uprn_index
+
+    def _add_worker_memoization_stats(self, memoization_stats):
+        for column, (hits, misses) in memoization_stats.items():
+            worker_hits, worker_misses = self._worker_memoization_stats.get(column, (0, 0))
+            self._worker_memoization_stats[column] = (worker_hits + hits, worker_misses + misses)
+
+    def validate(self, sample_file_path, jobs=1, engine='row', cache_file_path=None, scan_structure=True) -> list:
+        failures = []
+        for failure in self.iter_validation_failures(sample_file_path, jobs, engine, cache_file_path=cache_file_path,
+                                                     scan_structure=scan_structure):
+            if failure.rule == ENCODING_RULE and failure.line_number is None:
+                # A file that can't be decoded stops validating part way through, so any other failures are partial
+                return [failure]
+            failures.append(failure)
         return failures
 
-    def validate(self, sample_file_path) -> list:
+    def iter_validation_failures(self, sample_file_path, jobs=1, engine='row', max_failures=None,
+                                 cache_file_path=None, scan_structure=True):
+        # Yields the failures as they are found, so they don't all have to be held in memory. max_failures only lets
+        # parallel workers stop early, it is up to the caller to stop iterating. With a cache file only the chunks of
+        # the file which changed since it was last validated are validated again. Local uncompressed files have their
+        # structure scanned first, and their rows are only validated if it has no failures
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown validation engine "{engine}", must be one of {", ".join(ENGINES)}')
+        is_local_file = not (is_compressed(sample_file_path) or is_gcs_uri(sample_file_path))
+        if (jobs > 1 or cache_file_path) and not is_local_file:
+            raise ValueError('Validating with more than one job or a validation cache is not supported for '
+                             'compressed or gs:// sample files')
+        if self.profile and cache_file_path:
+            raise ValueError('Profiling is not supported with a validation cache, as the unchanged parts of the file '
+                             'are not read')
+        self.sample_profile = None
+        if scan_structure and is_local_file:
+            structure_failure_count = 0
+            for failure in self.iter_structure_validation_failures(sample_file_path):
+                structure_failure_count += 1
+                yield failure
+            if structure_failure_count:
+                return
+        yield from self._iter_file_validation_failures(sample_file_path, jobs, engine, max_failures, cache_file_path)
+
+    def _iter_file_validation_failures(self, sample_file_path, jobs, engine, max_failures, cache_file_path):
         try:
-            with open(sample_file_path, encoding="utf-8") as sample_file:
+            with open_sample_file(sample_file_path, encoding="utf-8") as sample_file:
                 sample_file_reader = csv.DictReader(sample_file, delimiter=',')
                 header_failures = self.find_header_validation_failures(sample_file_reader.fieldnames)
                 if header_failures:
-                    return [header_failures]
-                return self.find_sample_validation_failures(sample_file_reader)
+                    yield header_failures
+                elif cache_file_path:
+                    yield from self.iter_sample_validation_failures_incremental(
+                        sample_file_path, sample_file_reader.fieldnames, cache_file_path, jobs, engine)
+                elif jobs > 1:
+                    yield from self.iter_sample_validation_failures_parallel(
+                        sample_file_path, sample_file_reader.fieldnames, jobs, engine, max_failures)
+                elif engine == 'columnar':
+                    yield from self.iter_sample_validation_failures_columnar(sample_file_reader.reader,
+                                                                             sample_file_reader.fieldnames)
+                else:
+                    yield from self.iter_sample_validation_failures(sample_file_reader)
         except UnicodeDecodeError as err:
-            return [
-                ValidationFailure(line_number=None, column=None,
-                                  description=f'Invalid file encoding, requires utf-8, error: {err}')]
+            yield ValidationFailure(line_number=None, column=None,
+                                    description=f'Invalid file encoding, requires utf-8, error: {err}',
+                                    rule=ENCODING_RULE)
+
+    def iter_structure_validation_failures(self, sample_file_path):
+        # The cheapest check of a sample file, which reads it as bytes without validating any values. Every row which
+        # isn't utf-8, doesn't have the header's number of fields, has a quoted field which is never closed or
+        # doesn't end with the header's line ending fails, with the byte offset of the failure in its description
+        if is_compressed(sample_file_path) or is_gcs_uri(sample_file_path):
+            raise ValueError('Structure scans are not supported for compressed or gs:// sample files')
+        for failure in scan_sample_file(sample_file_path):
+            yield ValidationFailure(failure.line_number, None, failure.description, failure.rule)
+
+    def quick_check(self, sample_file_path, row_count, random_generator=random) -> FailureRateEstimator:
+        # Validates the rows at row_count random offsets across the file to estimate the failure rate of each column,
+        # which takes seconds however large the file is. Rules across rows can't be checked from a sample of the rows
+        if is_compressed(sample_file_path) or is_gcs_uri(sample_file_path):
+            raise ValueError('Quick checks are not supported for compressed or gs:// sample files')
+        with open(sample_file_path, encoding='utf-8', newline='') as sample_file:
+            fieldnames = next(csv.reader(sample_file, delimiter=','), [])
+        header_failure = self.find_header_validation_failures(fieldnames)
+        if header_failure:
+            raise SampleValidationError(f'Invalid sample file header: {header_failure.description}')
+
+        failure_rates = FailureRateEstimator(self.schema, sample_data_size(sample_file_path))
+        for sampled_row in read_rows_at_random_offsets(sample_file_path, row_count, len(fieldnames), random_generator):
+            if sampled_row is None:
+                failure_rates.add_skipped_row()
+                continue
+            row, row_length = sampled_row
+            failure_rates.add(row_length, self.find_row_validation_failures(None, dict(zip(fieldnames, row))))
+        return failure_rates
+
+
+def print_validation_progress(lines_checked, failure_count, end='\n'):
+    print(f"Validation progress: {str(lines_checked).rjust(8)} lines checked, "
+          f"Failures: {failure_count}", end=end, flush=True)
 
 
-def build_failure_log(failure):
-    return (f'line: {failure.line_number}, column: {failure.column}, description: {failure.description}'
-            if failure.column else
-            f'line: Header, description: {failure.description}'
-            if failure.line_number else
-            failure.description)
+def print_memoization_stats(memoization_stats):
+    lookups = {column: hits + misses for column, (hits, misses) in memoization_stats.items()}
+    if not any(lookups.values()):
+        return
+    print('Memoized validation hit rates: ' + ', '.join(
+        f'{column} {hits / lookups[column]:.1%}' for column, (hits, _misses) in memoization_stats.items()
+        if lookups[column]))
 
 
-def print_failures_summary(failures, print_limit):
-    for failure in failures[:print_limit]:
-        print(build_failure_log(failure))
-    response = input(f'Showing first {print_limit} of {len(failures)}. '
-                     f'Show remaining {len(failures) - print_limit} [Y/n]?\n')
-    if response.lower() in {'y', 'yes'}:
-        for failure in failures[print_limit:]:
-            print(build_failure_log(failure))
+def _row_batches(sample_rows, batch_size):
+    # Empty rows are skipped and not counted as lines, the same as csv.DictReader
+    sample_rows = filter(None, sample_rows)
+    return iter(lambda: list(itertools.islice(sample_rows, batch_size)), [])
 
 
-def print_failures(failures, print_limit=20):
-    print(f'{len(failures)} validation failure(s):')
-    if len(failures) > print_limit:
-        print_failures_summary(failures, print_limit)
-    else:
-        for failure in failures:
-            print(build_failure_log(failure))
+def _csv_dict_row(fieldnames, row):
+    # Builds the dict csv.DictReader would read from the row
+    dict_row = dict(zip(fieldnames, row))
+    if len(row) > len(fieldnames):
+        dict_row[None] = row[len(fieldnames):]
+    for fieldname in fieldnames[len(row):]:
+        dict_row[fieldname] = None
+    return dict_row
+
+
+def _batch_values(fieldnames, batch, columns):
+    # The values of the columns in each of a batch of csv.reader rows, read as csv.DictReader would if any rows have
+    # missing or extra values
+    if set(map(len, batch)) == {len(fieldnames)}:
+        return map(itemgetter(*map(fieldnames.index, columns)), batch)
+    get_values = itemgetter(*columns)
+    return (get_values(_csv_dict_row(fieldnames, row)) for row in batch)
+
+
+def chunk_byte_ranges(sample_file_path, chunk_count, block_size=1024 * 1024) -> list:
+    # Chunk boundaries are moved forward to the next line break outside a quoted field, so each chunk holds whole rows.
+    # A line break is outside quotes when an even number of quotes come before it, as escaped quotes are doubled, so
+    # the quotes are counted through the whole file up to the last boundary
+    with open(sample_file_path, 'rb') as sample_file:
+        sample_file.readline()
+        data_start = sample_file.tell()
+        file_size = os.fstat(sample_file.fileno()).st_size
+        targets = [data_start + (file_size - data_start) * chunk // chunk_count for chunk in range(1, chunk_count)]
+
+        boundaries, quote_count, block_start = [data_start], 0, data_start
+        for block in iter(lambda: sample_file.read(block_size), b''):
+            if not targets:
+                break
+            counted_to = 0
+            while targets:
+                line_break = block.find(b'\n', max(targets[0] - 1 - block_start, counted_to))
+                if line_break == -1:
+                    break
+                quote_count += block.count(b'"', counted_to, line_break)
+                counted_to = line_break + 1
+                if not quote_count % 2:
+                    boundaries.append(block_start + counted_to)
+                    targets.pop(0)
+            quote_count += block.count(b'"', counted_to)
+            block_start += len(block)
+        boundaries.append(file_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+class _ByteRangeReader(io.RawIOBase):
+
+    def __init__(self, sample_file, start, end):
+        sample_file.seek(start)
+        self._sample_file = sample_file
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        read_size = self._sample_file.readinto(memoryview(buffer)[:self._remaining])
+        self._remaining -= read_size
+        return read_size
+
+
+_chunk_sample_validator = None
+_chunk_lines_checked = None
+_chunk_failure_count = None
+
+
+def _chunk_worker_pool(sample_validator, processes, lines_checked=None, failure_count=None):
+    # The workers are forked rather than given the validator's class, so they validate with the validator as it is,
+    # including any changes made to its schema after it was built. The schema's validators are closures, which can't
+    # be pickled for spawned workers. Each worker is forked for a single chunk, so every chunk starts from the same copy
+    return multiprocessing.get_context('fork').Pool(processes, initializer=_init_chunk_worker,
+                                                    initargs=(sample_validator, lines_checked, failure_count),
+                                                    maxtasksperchild=1)
+
+
+def _init_chunk_worker(sample_validator, lines_checked, failure_count):
+    global _chunk_sample_validator, _chunk_lines_checked, _chunk_failure_count
+    _chunk_sample_validator, _chunk_lines_checked, _chunk_failure_count = sample_validator, lines_checked, failure_count
+
+
+def _validate_chunk_with_args(chunk_args):
+    return _validate_chunk(*chunk_args)
+
+
+def _next_chunk_result(chunk_results, progress_print_interval, lines_checked, failure_count):
+    while True:
+        try:
+            return chunk_results.next(progress_print_interval)
+        except multiprocessing.TimeoutError:
+            print_validation_progress(lines_checked.value + 1, failure_count.value, end='\r')
+
+
+def _validate_chunk(sample_file_path, fieldnames, start, end, engine='row', max_failures=None,
+                    progress_frequency=10000):
+    # Returns the number of rows in the chunk, their failures numbered from 1 for the chunk's first row, the
+    # memoization stats, the chunk's UPRN index and its SampleProfile, or None if it isn't profiled. The memoization
+    # caches inherited from the parent process are dropped, so the stats are only those of this chunk
+    sample_validator = _chunk_sample_validator
+    sample_validator._reset_memoization()
+    row_count, failures, uprn_index, sample_profile = _validate_byte_range(
+        sample_validator, sample_file_path, fieldnames, start, end, engine, max_failures, progress_frequency)
+    return row_count, failures, sample_validator.memoization_stats(), uprn_index, sample_profile
+
+
+def _validate_byte_range(sample_validator, sample_file_path, fieldnames, start, end, engine='row', max_failures=None,
+                         progress_frequency=10000):
+    # Returns the number of rows in the byte range, their failures numbered from 1 for its first row, its UPRN index
+    # and its SampleProfile if the validator profiles. Once the range has max_failures the rest of it is skipped, the
+    # caller stops there anyway
+    uprn_index = sample_validator._new_uprn_index()
+    sample_profile = sample_validator._new_sample_profile()
+    get_profile_values = itemgetter(*PROFILE_COLUMNS)
+    failures, row_count, reported_failure_count = [], 0, 0
+    with open(sample_file_path, 'rb') as sample_file:
+        chunk_file = io.TextIOWrapper(io.BufferedReader(_ByteRangeReader(sample_file, start, end)), encoding='utf-8')
+        if engine == 'columnar':
+            for batch in _row_batches(csv.reader(chunk_file, delimiter=','), COLUMNAR_BATCH_SIZE):
+                failures.extend(sample_validator.find_batch_validation_failures(row_count + 1, fieldnames, batch))
+                uprn_index.add_rows(_batch_values(fieldnames, batch, UPRN_INDEX_COLUMNS))
+                if sample_profile is not None:
+                    sample_profile.add_rows(_batch_values(fieldnames, batch, PROFILE_COLUMNS))
+                row_count += len(batch)
+                _add_chunk_progress(len(batch), len(failures) - reported_failure_count)
+                reported_failure_count = len(failures)
+                if max_failures is not None and len(failures) >= max_failures:
+                    break
+            return row_count, failures, uprn_index, sample_profile
+        for row_count, row in enumerate(csv.DictReader(chunk_file, fieldnames=fieldnames, delimiter=','), 1):
+            failures.extend(sample_validator.find_row_validation_failures(row_count, row))
+            uprn_index.add(row['UPRN'], row['ESTAB_UPRN'], row['ADDRESS_LEVEL'])
+            if sample_profile is not None:
+                sample_profile.add(get_profile_values(row))
+            if not row_count % progress_frequency:
+                _add_chunk_progress(progress_frequency, len(failures) - reported_failure_count)
+                reported_failure_count = len(failures)
+            if max_failures is not None and len(failures) >= max_failures:
+                break
+    _add_chunk_progress(row_count % progress_frequency, len(failures) - reported_failure_count)
+    return row_count, failures, uprn_index, sample_profile
+
+
+def _add_chunk_progress(lines_checked, failure_count):
+    if _chunk_lines_checked is not None:
+        with _chunk_lines_checked.get_lock():
+            _chunk_lines_checked.value += lines_checked
+        with _chunk_failure_count.get_lock():
+            _chunk_failure_count.value += failure_count
+
+
+def find_column_validation_failures(line_number, row, column, validators) -> list:
+    failures = []
+    for validator in validators:
+        try:
+            validator(row[column], row=row)
+        except Invalid as invalid:
+            failures.append(ValidationFailure(line_number, column, invalid, rule_name(validator)))
+    return failures
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Load a sample file into response management.')
-    parser.add_argument('sample_file_path', help='path to the sample file', type=str)
+    parser.add_argument('sample_file_path', help='path to the sample file, or a gs://<bucket>/<object> URI to stream '
+                                                 'it from GCS', type=str)
+    parser.add_argument('--engine', help='validate the file a row at a time, or in batches of rows a column at a '
+                                         'time', choices=ENGINES, default='row')
+    parser.add_argument('--jobs', '-j', help='number of processes to validate the file with, each validating a '
+                                             'separate chunk of it', type=int, default=1)
+    parser.add_argument('--report-file', help='path to write every validation failure to, as JSON lines or as csv '
+                                              'if it ends in .csv, defaults to <sample_file_path>.failures.jsonl',
+                        type=Path)
+    parser.add_argument('--max-failures', help='stop validating once this many failures have been found', type=int)
+    parser.add_argument('--sample-rows', help='quickly estimate the failure rate of each column by validating this '
+                                              'many rows read at random offsets across the file, instead of '
+                                              'validating every row', type=int)
+    parser.add_argument('--incremental', help='only validate the parts of the file which changed since it was last '
+                                              'validated with --incremental, using a cache saved next to the file',
+                        action='store_true')
+    parser.add_argument('--structure-only', help='only scan the structure of the file, checking it is utf-8 and every '
+                                                 'row has the header\'s number of fields, closes its quotes and ends '
+                                                 'with the header\'s line ending, without validating any values',
+                        action='store_true')
+    parser.add_argument('--profile-file', help='path to write a JSON profile of the sample file to, built while it is '
+                                               'validated, with row counts by treatment code, address type and level, '
+                                               'region, LAD and print batch, CE expected capacity totals and the '
+                                               'approximate number of distinct postcodes and UPRNs', type=Path)
+    parser.add_argument('--check-estab-references', help="check every unit's ESTAB_UPRN is its own UPRN or the UPRN "
+                                                         "of an estab in the sample file", action='store_true')
     return parser.parse_args()
 
 
+def quick_check(sample_file_path, sample_rows):
+    failure_rates = SampleValidator().quick_check(sample_file_path, sample_rows)
+    print('\n'.join(failure_rates.summary_lines()))
+    if failure_rates.failing_row_count:
+        print(f'{sample_file_path} has sampled rows which are not valid ❌')
+        exit(1)
+    print(f'Success! The sampled rows of {sample_file_path} passed validation, validate without --sample-rows to '
+          f'check every row ✅')
+
+
 def main():
     args = parse_arguments()
-    failures = SampleValidator().validate(args.sample_file_path)
-    if failures:
-        print_failures(failures)
+    if args.sample_rows:
+        quick_check(args.sample_file_path, args.sample_rows)
+        return
+    report_file_path = args.report_file or Path(f'{local_file_path(args.sample_file_path)}.failures.jsonl')
+    with ValidationReport(report_file_path, args.max_failures) as report:
+        sample_validator = SampleValidator(check_estab_references=args.check_estab_references,
+                                           profile=bool(args.profile_file))
+        cache_file_path = validation_cache_path(args.sample_file_path) if args.incremental else None
+        if args.structure_only:
+            failures = sample_validator.iter_structure_validation_failures(args.sample_file_path)
+        else:
+            failures = sample_validator.iter_validation_failures(args.sample_file_path, args.jobs, args.engine,
+                                                                 args.max_failures, cache_file_path)
+        # Closing the failures as soon as the report is full tears down any worker pool straight away, rather than
+        # when the generator is garbage collected
+        with contextlib.closing(failures):
+            for failure in failures:
+                report.add(failure)
+                if report.is_full:
+                    break
+    print_memoization_stats(sample_validator.memoization_stats())
+    if sample_validator.sample_profile is not None and not report.is_full:
+        sample_validator.sample_profile.write(args.profile_file)
+        print(f'Sample profile written to {args.profile_file}')
+    if report.failure_count:
+        print('\n'.join(report.summary_lines()))
         print(f'{args.sample_file_path} is not valid ❌')
         exit(1)
+    if args.structure_only:
+        print(f'Success! The structure of {args.sample_file_path} is valid, validate without --structure-only to '
+              f'check every value ✅')
+        return
     print(f'Success! {args.sample_file_path} passed validation ✅')
 
 
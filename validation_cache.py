@@ -0,0 +1,86 @@
+import base64
+import hashlib
+import json
+import os
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+from uprn_index import UprnIndex
+
+CHUNK_AVERAGE_ROWS = 4096
+CHUNK_MIN_ROWS = 1024
+CHUNK_MAX_ROWS = 16384
+
+ContentChunk = namedtuple('ContentChunk', ('start', 'end', 'digest'))
+CachedChunk = namedtuple('CachedChunk', ('row_count', 'failures', 'uprn_index'))
+
+
+def validation_cache_path(sample_file_path) -> Path:
+    sample_file_path = Path(sample_file_path)
+    return sample_file_path.with_name(f'{sample_file_path.name}.validation-cache.json')
+
+
+def content_defined_chunks(sample_file_path, average_rows=CHUNK_AVERAGE_ROWS, min_rows=CHUNK_MIN_ROWS,
+                           max_rows=CHUNK_MAX_ROWS) -> list:
+    # Splits the rows after the header into chunks ending at rows picked by the checksum of their last line, rather
+    # than at fixed offsets, so editing, adding or removing rows only changes the chunks holding them and the chunks
+    # after them keep their bytes. Rows only end at line breaks with an even number of quotes before them in the chunk
+    chunks = []
+    with open(sample_file_path, 'rb') as sample_file:
+        sample_file.readline()
+        start = position = sample_file.tell()
+        chunk_hash, row_count, quote_count = hashlib.blake2b(digest_size=16), 0, 0
+        for line in sample_file:
+            chunk_hash.update(line)
+            position += len(line)
+            quote_count += line.count(b'"')
+            if quote_count % 2:
+                continue
+            row_count += 1
+            if row_count >= max_rows or (row_count >= min_rows and not zlib.crc32(line) % average_rows):
+                chunks.append(ContentChunk(start, position, chunk_hash.hexdigest()))
+                start, chunk_hash, row_count, quote_count = position, hashlib.blake2b(digest_size=16), 0, 0
+        if position > start:
+            chunks.append(ContentChunk(start, position, chunk_hash.hexdigest()))
+    return chunks
+
+
+class ValidationCache:
+    # The row count, failures and UPRN index of each chunk of a sample file, keyed by the hash of the chunk's bytes and
+    # kept in a JSON file next to the sample file. The cache is only used by validation with the same fingerprint, which
+    # covers the header and the validation code, as either changing could change the failures of unchanged rows
+    VERSION = 1
+
+    def __init__(self, cache_file_path, fingerprint):
+        self.cache_file_path = Path(cache_file_path)
+        self.fingerprint = fingerprint
+        self._chunks = self._read()
+
+    def _read(self) -> dict:
+        try:
+            cache = json.loads(self.cache_file_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+        if (cache.get('version'), cache.get('fingerprint')) != (self.VERSION, self.fingerprint):
+            return {}
+        return cache['chunks']
+
+    def __contains__(self, digest):
+        return digest in self._chunks
+
+    def get(self, digest) -> CachedChunk:
+        chunk = self._chunks[digest]
+        return CachedChunk(chunk['row_count'], chunk['failures'],
+                           UprnIndex.from_bytes(base64.b64decode(chunk['uprn_index'])))
+
+    def write(self, chunks: dict):
+        # Replaces the cache with the given CachedChunks by digest, so chunks no longer in the file are dropped. Write
+        # to a temporary file and rename it over the old cache so a crash mid write can't corrupt it
+        temporary_path = self.cache_file_path.with_name(f'{self.cache_file_path.name}.tmp')
+        with open(temporary_path, 'w') as temporary_file:
+            json.dump({'version': self.VERSION, 'fingerprint': self.fingerprint, 'chunks': {
+                digest: {'row_count': chunk.row_count, 'failures': chunk.failures,
+                         'uprn_index': base64.b64encode(chunk.uprn_index.to_bytes()).decode()}
+                for digest, chunk in chunks.items()}}, temporary_file)
+        os.replace(temporary_path, self.cache_file_path)
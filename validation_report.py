@@ -0,0 +1,86 @@
+import csv
+import json
+from pathlib import Path
+
+CSV_SUFFIX = '.csv'
+
+
+class RuleSummary:
+
+    def __init__(self, description):
+        self.count = 0
+        self.example_lines = []
+        # The description of the first failure, as header and encoding failures have no line to look up
+        self.description = description
+
+
+class ValidationReport:
+    # Streams validation failures to a JSON lines report file, or a csv report if its path ends in .csv, as they are
+    # found. Only the number of failures and the first few example lines of each column and rule are kept in memory,
+    # so the size of the report doesn't limit the size of sample file that can be validated
+    CSV_HEADER = ['LINE_NUMBER', 'COLUMN', 'RULE', 'DESCRIPTION']
+
+    def __init__(self, report_file_path=None, max_failures=None, example_count=5):
+        self.report_file_path = Path(report_file_path) if report_file_path else None
+        self.max_failures = max_failures
+        self.example_count = example_count
+        self.failure_count = 0
+        self.rule_summaries = {}
+        self._report_file = None
+        self._report_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._report_file:
+            self._report_file.close()
+
+    @property
+    def is_full(self):
+        return self.max_failures is not None and self.failure_count >= self.max_failures
+
+    def add(self, failure):
+        self.failure_count += 1
+        rule_summary = self.rule_summaries.setdefault((failure.column, failure.rule),
+                                                      RuleSummary(str(failure.description)))
+        rule_summary.count += 1
+        if len(rule_summary.example_lines) < self.example_count:
+            rule_summary.example_lines.append(failure.line_number)
+        if self.report_file_path:
+            self._write(failure)
+
+    def _write(self, failure):
+        # The report file is only created once there is a failure to write to it
+        if self._report_file is None:
+            self._report_file = open(self.report_file_path, 'w', newline='')
+            if self.report_file_path.suffix == CSV_SUFFIX:
+                self._report_writer = csv.writer(self._report_file)
+                self._report_writer.writerow(self.CSV_HEADER)
+
+        if self._report_writer:
+            self._report_writer.writerow([failure.line_number, failure.column, failure.rule, failure.description])
+        else:
+            self._report_file.write(json.dumps({'line_number': failure.line_number, 'column': failure.column,
+                                                'rule': failure.rule, 'description': str(failure.description)})
+                                    + '\n')
+
+    def summary_lines(self) -> list:
+        lines = [f'{self.failure_count} validation failure(s)'
+                 + (f', stopped at the limit of {self.max_failures}' if self.is_full else '')
+                 + (':' if self.failure_count else '')]
+        for (column, rule), rule_summary in sorted(self.rule_summaries.items(),
+                                                   key=lambda rule_item: -rule_item[1].count):
+            if column is None:
+                # Failures of the whole row, such as its structure, give example lines. Header failures are always on
+                # the first line and encoding failures found while reading the file have none
+                example_lines = [line for line in rule_summary.example_lines if line is not None and line > 1]
+                lines.append(f'{rule_summary.count} x {rule}'
+                             + (f', e.g. line(s) {", ".join(map(str, example_lines))}' if example_lines else '')
+                             + f': {rule_summary.description}')
+                continue
+            lines.append(f'{rule_summary.count} x column: {column}, rule: {rule}, e.g. line(s) '
+                         f'{", ".join(map(str, rule_summary.example_lines))}: {rule_summary.description}')
+        if self.failure_count and self.report_file_path:
+            lines.append(f'Every failure is listed in {self.report_file_path}')
+        return lines
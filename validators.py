@@ -1,11 +1,221 @@
+import re
+from collections import OrderedDict, deque, namedtuple
+from operator import contains, itemgetter, methodcaller
 from typing import Iterable
 
+COLUMN_CHECK_SPLIT = 16
+COLUMN_CHECK_MIN_BLOCK_SIZE = 64
+
+# Runs an iterator to the end in C, for maps called for their side effects
+_consume = deque(maxlen=0).extend
+
+FastCheck = namedtuple('FastCheck', ('pattern', 'valid_values', 'passes', 'passes_columns', 'column_passes'))
+
 
 class Invalid(Exception):
     pass
 
 
+def fast_check(pattern: str = None, valid_values=None, passes=None, passes_columns=(), column_passes=None):
+    # Attaches a fast check to a validator: a regex the whole value must match, a set the value must be in and/or a
+    # passes(value, *values) predicate, given the row's values of passes_columns after the value. Passing the fast check
+    # must guarantee the validator passes, it is fine for valid values to fail it as they are then run through the
+    # validator itself. Patterns must never match a newline, as they are checked against values joined by newlines.
+    # A pattern can also have a column_passes(values, joined_values) function, given a batch of a column's values with
+    # no line breaks and the values joined by newlines. It must only be true if every value matches the pattern, and
+    # the columnar engine runs it in place of the pattern over whole columns
+    def attach(validate):
+        validate.fast_check = FastCheck(pattern, valid_values, passes, tuple(passes_columns), column_passes)
+        return validate
+
+    return attach
+
+
+def compile_row_fast_check(schema: dict):
+    # Fuses the fast checks of every validator in the schema into a single check(row) function. The patterns of all the
+    # columns are combined into one regex matched against the row's values joined by newlines, and the sets are checked
+    # with map, so the loops over columns run in C. Also returns the columns with validators that have no fast check,
+    # e.g. stateful ones, which must always be run
+    regex_columns, column_patterns, set_columns, valid_value_sets = [], [], [], []
+    predicates, unchecked_columns = [], []
+    for column, validators in schema.items():
+        if not all(hasattr(validator, 'fast_check') for validator in validators):
+            unchecked_columns.append(column)
+            continue
+        fast_checks = [validator.fast_check for validator in validators]
+        patterns = [check.pattern for check in fast_checks if check.pattern]
+        if patterns:
+            regex_columns.append(column)
+            column_patterns.append(_combine_patterns(patterns))
+        for check in fast_checks:
+            if check.valid_values is not None:
+                set_columns.append(column)
+                valid_value_sets.append(check.valid_values)
+            if check.passes:
+                predicates.append((column, check.passes, _values_getter(check.passes_columns)))
+
+    match_row_values = re.compile(''.join(column_patterns)).fullmatch
+    get_regex_values, get_set_values = _values_getter(regex_columns), _values_getter(set_columns)
+
+    def check_row(row):
+        try:
+            return (match_row_values('\n'.join(get_regex_values(row)) + '\n') is not None
+                    and all(map(contains, valid_value_sets, get_set_values(row)))
+                    and all(passes(row[column], *get_values(row)) for column, passes, get_values in predicates))
+        except TypeError:
+            # The missing values of rows with too few values are None, which are left to the validators
+            return False
+
+    return check_row, unchecked_columns
+
+
+def compile_column_fast_checks(schema: dict):
+    # Compiles the fast checks of each column into a find_failing_rows(columns) function, taking a batch of rows as a
+    # dict of column name to a tuple of the column's values. It returns the indexes of the rows failing the column's
+    # fast check. Each check runs over the whole column in one go, only looking at single values when it fails. Also
+    # returns the columns with validators that have no fast check, which must be run on every row
+    column_checks, unchecked_columns = {}, []
+    for column, validators in schema.items():
+        if all(hasattr(validator, 'fast_check') for validator in validators):
+            column_checks[column] = _compile_column_check(column, [validator.fast_check for validator in validators])
+        else:
+            unchecked_columns.append(column)
+    return column_checks, unchecked_columns
+
+
+def _compile_column_check(column, fast_checks):
+    patterns = [check.pattern for check in fast_checks if check.pattern]
+    match_value = re.compile(_combine_patterns(patterns)).fullmatch if patterns else None
+    column_passes = [check.column_passes for check in fast_checks if check.pattern and check.column_passes]
+    column_patterns = [check.pattern for check in fast_checks if check.pattern and not check.column_passes]
+    match_column_values = (re.compile(f'(?:{_combine_patterns(column_patterns)})*').fullmatch if column_patterns
+                           else None)
+    valid_value_sets = [check.valid_values for check in fast_checks if check.valid_values is not None]
+    predicates = [(check.passes, check.passes_columns) for check in fast_checks if check.passes]
+
+    def all_values_match(values):
+        joined_values = '\n'.join(values)
+        # Patterns never match a line break, so only the joined values' newline separators are allowed
+        return (joined_values.count('\n') == len(values) - 1
+                and (not match_column_values or match_column_values(joined_values + '\n'))
+                and all(passes(values, joined_values) for passes in column_passes))
+
+    def find_unmatched_values(values, start):
+        # Splits a block failing the whole column check into smaller blocks to check, so only the values in the small
+        # blocks containing the failures are matched one at a time
+        if all_values_match(values):
+            return []
+        if len(values) <= COLUMN_CHECK_MIN_BLOCK_SIZE:
+            return [start + index for index, value in enumerate(values) if not match_value(value + '\n')]
+        block_size = -(-len(values) // COLUMN_CHECK_SPLIT)
+        return [index for block_start in range(0, len(values), block_size)
+                for index in find_unmatched_values(values[block_start:block_start + block_size], start + block_start)]
+
+    def find_failing_rows(columns):
+        values = columns[column]
+        failing_rows = set(find_unmatched_values(values, 0) if patterns and values else ())
+        for valid_values in valid_value_sets:
+            if not valid_values.issuperset(values):
+                failing_rows.update(index for index, value in enumerate(values) if value not in valid_values)
+        for passes, passes_columns in predicates:
+            results = list(map(passes, values, *(columns[passes_column] for passes_column in passes_columns)))
+            if not all(results):
+                failing_rows.update(index for index, result in enumerate(results) if not result)
+        return failing_rows
+
+    return find_failing_rows
+
+
+def is_memoizable(validator):
+    # Validators with fast checks are pure functions of their inputs, so a validator only depends on its own value
+    # unless its fast check reads other columns
+    return hasattr(validator, 'fast_check') and not validator.fast_check.passes_columns
+
+
+class ValidValueCache:
+    # Remembers up to max_size values that passed a column's single column validators, dropping the least recently
+    # used once full. Every hit moves the value to the end of the OrderedDict, which is a single C call, so a row's
+    # memoized columns can all be looked up in C with map. A cache that isn't hit for at least half of its first
+    # MIN_LOOKUPS lookups isn't effective, as the column has too many distinct values
+    MIN_LOOKUPS = 10000
+    MIN_HIT_RATE = 0.5
+
+    def __init__(self, validators, max_size):
+        self.validators = validators
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def is_effective(self):
+        lookups = self.hits + self.misses
+        return lookups < self.MIN_LOOKUPS or self.hits >= lookups * self.MIN_HIT_RATE
+
+    def check(self, value) -> bool:
+        if value in self.values:
+            self.values.move_to_end(value)
+            self.hits += 1
+            return True
+        self.misses += 1
+        try:
+            for validator in self.validators:
+                validator(value)
+        except (Invalid, TypeError):
+            # The missing values of rows with too few values are None, which are left to the validators
+            return False
+        self.values[value] = None
+        if len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+        return True
+
+    def find_failing_indexes(self, values) -> list:
+        # Indexes of the values which aren't cached and fail the validators, values found in the cache are checked in C
+        try:
+            _consume(map(self.values.move_to_end, values))
+        except KeyError:
+            return [index for index, passes in enumerate(map(self.check, values)) if not passes]
+        self.hits += len(values)
+        return []
+
+
+def compile_memoized_row_check(valid_value_caches: dict):
+    # Returns a function checking whether all of a row's values are in their column's valid value cache, in C. The
+    # values are marked as used as they are found, a value missing from its cache stops the check with a KeyError
+    cached_values = [valid_value_cache.values for valid_value_cache in valid_value_caches.values()]
+    get_values = _values_getter(list(valid_value_caches))
+
+    def is_row_cached(row):
+        try:
+            _consume(map(OrderedDict.move_to_end, cached_values, get_values(row)))
+        except KeyError:
+            return False
+        return True
+
+    return is_row_cached
+
+
+def rule_name(validator):
+    # The name of the function that made the validator, e.g. max_length
+    return validator.__qualname__.split('.')[0]
+
+
+def _combine_patterns(patterns):
+    # Every pattern but the last is a lookahead up to the newline ending the value, so the value must match all of them
+    lookaheads = ''.join(f'(?=(?:{pattern})\\n)' for pattern in patterns[:-1])
+    return f'{lookaheads}(?:{patterns[-1]})\\n'
+
+
+def _values_getter(columns):
+    if len(columns) == 1:
+        column, = columns
+        return lambda row: (row[column],)
+    return itemgetter(*columns) if columns else lambda _row: ()
+
+
 def max_length(max_len: int):
+    @fast_check(pattern=f'.{{0,{max_len}}}',
+                column_passes=lambda values, _joined_values: max(map(len, values)) <= max_len)
     def validate(value, **_kwargs):
         if len(value) > max_len:
             raise Invalid(f'Value has length {len(value)}, exceeds max of {max_len}')
@@ -25,6 +235,7 @@ def unique():
 
 
 def mandatory():
+    @fast_check(pattern=' *[^ \\n].*', column_passes=lambda values, _joined_values: all(map(str.strip, values)))
     def validate(value, **_kwargs):
         if not value or value.replace(" ", "") == '':
             raise Invalid('Empty mandatory value')
@@ -33,6 +244,8 @@ def mandatory():
 
 
 def numeric():
+    @fast_check(pattern='[0-9 ]*', column_passes=lambda _values, joined_values: _is_ascii_digits(
+                joined_values.replace(' ', '').replace('\n', '')))
     def validate(value, **_kwargs):
         if value and value.replace(" ", "") == '':
             pass
@@ -43,6 +256,7 @@ def numeric():
 
 
 def latitude_longitude(max_precision: int, max_scale: int):
+    @fast_check(pattern=_decimal_pattern(max_precision, max_scale))
     def validate(value, **_kwargs):
         try:
             float(value)
@@ -71,6 +285,7 @@ def latitude_longitude(max_precision: int, max_scale: int):
 
 
 def in_set(valid_value_set: set):
+    @fast_check(valid_values=valid_value_set)
     def validate(value, **_kwargs):
         if value not in valid_value_set:
             raise Invalid(f'Value "{value}" is not in the valid set')
@@ -90,6 +305,9 @@ def set_equal(expected_set):
 
 
 def no_padding_whitespace():
+    # Not starting or ending with whitespace, \\s matching the same whitespace as str.strip
+    @fast_check(pattern='(?![^\\S\\n]).*(?<![^\\S\\n])',
+                column_passes=lambda values, _joined_values: tuple(map(str.strip, values)) == values)
     def validate(value, **_kwargs):
         if value != value.strip():
             raise Invalid(f'Value "{value}" contains padding whitespace')
@@ -98,6 +316,7 @@ def no_padding_whitespace():
 
 
 def no_pipe_character():
+    @fast_check(pattern='[^|\\n]*', column_passes=lambda _values, joined_values: '|' not in joined_values)
     def validate(value, **_kwargs):
         if str('|') in value:
             raise Invalid(f'Value "{value}" contains pipe character')
@@ -106,6 +325,9 @@ def no_pipe_character():
 
 
 def region_matches_treatment_code():
+    @fast_check(passes=lambda region, treatment_code: not (region.strip() and treatment_code.strip()
+                                                           and region[0] != treatment_code[-1]),
+                passes_columns=('TREATMENT_CODE',))
     def validate(region, **kwargs):
         if region.strip() and kwargs['row']['TREATMENT_CODE'].strip() and \
                 region[0] != kwargs['row']['TREATMENT_CODE'][-1]:
@@ -116,6 +338,9 @@ def region_matches_treatment_code():
 
 
 def ce_u_has_expected_capacity():
+    @fast_check(passes=lambda expected_capacity, address_type, address_level: not (
+                address_type == 'CE' and address_level == 'U') or _positive_integer(expected_capacity),
+                passes_columns=('ADDRESS_TYPE', 'ADDRESS_LEVEL'))
     def validate(expected_capacity, **kwargs):
         if kwargs['row']['ADDRESS_TYPE'] == 'CE' and kwargs['row']['ADDRESS_LEVEL'] == 'U' \
                 and (not expected_capacity.isdigit() or int(expected_capacity) == 0):
@@ -126,6 +351,10 @@ def ce_u_has_expected_capacity():
 
 
 def ce_e_has_expected_capacity():
+    @fast_check(passes=lambda expected_capacity, address_type, address_level, treatment_code: not (
+                address_type == 'CE' and address_level == 'E') or treatment_code in {'CE_LDCEE', 'CE_LDCEW'}
+                or _positive_integer(expected_capacity),
+                passes_columns=('ADDRESS_TYPE', 'ADDRESS_LEVEL', 'TREATMENT_CODE'))
     def validate(expected_capacity, **kwargs):
         if kwargs['row']['ADDRESS_TYPE'] == 'CE' and kwargs['row']['ADDRESS_LEVEL'] == 'E' and (
                 kwargs['row']['TREATMENT_CODE'] not in {'CE_LDCEE', 'CE_LDCEW'}) and (
@@ -138,6 +367,9 @@ def ce_e_has_expected_capacity():
 
 
 def alphanumeric_postcode():
+    @fast_check(pattern='[A-Za-z0-9 ]*[A-Za-z0-9][A-Za-z0-9 ]*',
+                column_passes=lambda values, joined_values: joined_values.isascii()
+                and all(map(str.isalnum, map(methodcaller('replace', ' ', ''), values))))
     def validate(postcode, **_kwargs):
         stripped_postcode = postcode.replace(" ", "")
         if not stripped_postcode.isalnum():
@@ -147,6 +379,9 @@ def alphanumeric_postcode():
 
 
 def alphanumeric_plus_hyphen_field_values():
+    @fast_check(pattern='[A-Za-z0-9-]*[A-Za-z0-9][A-Za-z0-9-]*',
+                column_passes=lambda values, joined_values: joined_values.isascii()
+                and all(map(str.isalnum, map(methodcaller('replace', '-', ''), values))))
     def validate(value, **_kwargs):
         stripped_field_value = value.replace("-", "")
         if not stripped_field_value.isalnum():
@@ -156,6 +391,7 @@ def alphanumeric_plus_hyphen_field_values():
 
 
 def latitude_longitude_range():
+    @fast_check(passes=lambda value: _float_in_range(value, -180, 180))
     def validate(value, **_kwargs):
         try:
             lat_long_float = float(value)
@@ -165,3 +401,24 @@ def latitude_longitude_range():
             raise Invalid(f'Latitude/Longitude value "{value}" is not in a range between -180 and 180')
 
     return validate
+
+
+def _float_in_range(value, minimum, maximum):
+    try:
+        return minimum <= float(value) <= maximum
+    except ValueError:
+        return False
+
+
+def _is_ascii_digits(value):
+    return value.isdigit() and value.isascii()
+
+
+def _positive_integer(value):
+    return value.isdigit() and int(value) != 0
+
+
+def _decimal_pattern(max_precision, max_scale):
+    # Matches the plain decimals within the precision and scale, one alternative per length of the integer part
+    return '|'.join(f'-?[0-9]{{{integer_length}}}\\.[0-9]{{1,{min(max_scale, max_precision - integer_length)}}}'
+                    for integer_length in range(1, max_precision))